@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from trading.model.candle_store import CandleStore
+from trading.model.candles import CANDLE_DTYPE
+
+
+def candles(dates, close):
+    array = np.zeros(len(dates), dtype=CANDLE_DTYPE)
+    array['date'] = dates
+    array['close'] = close
+    return array
+
+
+class CandleStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = CandleStore(os.path.join(self.directory, 'candles'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_sorts_and_dedups(self):
+        self.assertEqual(self.store.write('USDT_BTC', 300, candles([900, 300, 600, 300], [3.0, 1.0, 2.0, 1.5])), 3)
+        stored = self.store.read('USDT_BTC', 300)
+        self.assertEqual(stored['date'].tolist(), [300, 600, 900])
+        self.assertEqual(stored['close'].tolist(), [1.0, 2.0, 3.0])
+
+    def test_newer_write_replaces_stored_dates(self):
+        self.store.write('USDT_BTC', 300, candles([300, 600, 900], 1.0))
+        self.assertEqual(self.store.write('USDT_BTC', 300, candles([900, 1200], 2.0)), 4)
+        stored = self.store.read('USDT_BTC', 300)
+        self.assertEqual(stored['date'].tolist(), [300, 600, 900, 1200])
+        self.assertEqual(stored['close'].tolist(), [1.0, 1.0, 2.0, 2.0])
+
+    def test_placeholders_are_dropped(self):
+        self.assertEqual(self.store.write('USDT_BTC', 300, candles([0], 1.0)), 0)
+        self.assertIsNone(self.store.last_date('USDT_BTC', 300))
+
+    def test_read_range_and_pairs(self):
+        self.store.write('USDT_BTC', 300, candles(range(300, 3300, 300), 1.0))
+        self.store.write('USDT_ETH', 300, candles([300], 1.0))
+        self.store.write('USDT_ETH', 900, candles([900], 1.0))
+        self.assertEqual(self.store.read('USDT_BTC', 300, 600, 1500)['date'].tolist(), [600, 900, 1200, 1500])
+        self.assertEqual(self.store.last_date('USDT_BTC', 300), 3000)
+        self.assertEqual(self.store.pairs(300), ['USDT_BTC', 'USDT_ETH'])
+        self.assertEqual(len(self.store.read('USDT_LTC', 300)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import unittest
+
+import numpy as np
+
+from trading.esssencial.decode import ColumnDecoder, chart_decoder, trade_decoder
+from trading.model.candles import CANDLE_DTYPE, CANDLE_FIELDS
+
+
+def chart(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'date': 1483228800 + 300 * i, 'high': float(rng.uniform(100, 200)), 'low': float(rng.uniform(50, 100)),
+             'open': float(rng.uniform(50, 200)), 'close': float(rng.uniform(50, 200)), 'volume': float(rng.uniform(0, 1e6)),
+             'quoteVolume': float(rng.uniform(0, 1e4)), 'weightedAverage': float(rng.uniform(50, 200))} for i in range(count)]
+
+
+def decode(decoder, payload):
+    return decoder.decode(io.BytesIO(payload), len(payload))
+
+
+class ColumnDecoderTest(unittest.TestCase):
+    def assert_matches_json(self, records, array):
+        self.assertEqual(len(array), len(records))
+        for field in CANDLE_FIELDS:
+            self.assertEqual(array[field].tolist(), [float(record[field]) for record in records])
+
+    def test_matches_json(self):
+        records = chart(500)
+        payload = json.dumps(records).encode('utf-8')
+        self.assert_matches_json(json.loads(payload), decode(chart_decoder, payload))
+
+    def test_records_split_across_chunks(self):
+        records = chart(300, seed=1)
+        payload = json.dumps(records).encode('utf-8')
+        decoder = ColumnDecoder(CANDLE_DTYPE, 200)
+        decoder.chunk_size = 777
+        self.assert_matches_json(records, decode(decoder, payload))
+
+    def test_exponents_fall_back_to_json(self):
+        records = chart(20, seed=2)
+        records[3]['volume'] = 1.5e-07
+        records[7]['quoteVolume'] = 2e+21
+        payload = json.dumps(records).encode('utf-8')
+        self.assertIn(b'e-07', payload)
+        self.assert_matches_json(records, decode(chart_decoder, payload))
+
+    def test_missing_field_falls_back_to_json(self):
+        records = chart(5, seed=3)
+        del records[2]['weightedAverage']
+        array = decode(chart_decoder, json.dumps(records).encode('utf-8'))
+        self.assertEqual(array['weightedAverage'][2], 0.0)
+        self.assertEqual(array['close'].tolist(), [record['close'] for record in records])
+
+    def test_error_object_is_returned_as_a_dict(self):
+        self.assertEqual(decode(chart_decoder, b'{"error": "Invalid currency pair."}'), {'error': 'Invalid currency pair.'})
+
+    def test_empty_array(self):
+        self.assertEqual(len(decode(chart_decoder, b'[]')), 0)
+
+    def test_trades(self):
+        trades = [{'globalTradeID': 10 + i, 'tradeID': i, 'date': '2017-01-01 00:0' + str(i) + ':00',
+                   'type': 'buy' if i % 2 else 'sell', 'rate': '100.5', 'amount': '0.25', 'total': '25.125'}
+                  for i in range(5)]
+        array = decode(trade_decoder, json.dumps(trades).encode('utf-8'))
+        self.assertEqual(array['date'].tolist(), [1483228800 + 60 * i for i in range(5)])
+        self.assertEqual(array['type'].tolist(), [-1, 1, -1, 1, -1])
+        self.assertEqual(array['rate'].tolist(), [100.5] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from trading.model.candle_store import CandleStore
+from trading.model.candles import CANDLE_DTYPE
+from trading.model.downloader import HistoryDownloader
+from trading.tools.synthetic import SyntheticPoloniex
+
+START = 1483228800  # 2017-01-01 00:00 UTC
+
+
+def candles(dates):
+    array = np.zeros(len(dates), dtype=CANDLE_DTYPE)
+    array['date'] = dates
+    return array
+
+
+class GapsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = CandleStore(self.directory)
+        self.downloader = HistoryDownloader(SyntheticPoloniex(), self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def gaps(self, start, end):
+        return self.downloader.gaps('USDT_BTC', 300, datetime.utcfromtimestamp(start), datetime.utcfromtimestamp(end))
+
+    def test_empty_store(self):
+        self.assertEqual(self.gaps(START, START + 3000), [(START, START + 3000)])
+
+    def test_holes_and_edges(self):
+        self.store.write('USDT_BTC', 300, candles([START + 600, START + 900, START + 2100, START + 2400]))
+        self.assertEqual(self.gaps(START, START + 3000),
+                         [(START, START + 300), (START + 1200, START + 1800), (START + 2700, START + 3000)])
+
+    def test_complete(self):
+        self.store.write('USDT_BTC', 300, candles(range(START, START + 3300, 300)))
+        self.assertEqual(self.gaps(START, START + 3000), [])
+
+    def test_unaligned_bounds(self):
+        self.store.write('USDT_BTC', 300, candles(range(START, START + 1500, 300)))
+        self.assertEqual(self.gaps(START + 17, START + 1999), [(START + 1500, START + 1800)])
+
+    def test_ends_at_the_last_closed_candle(self):
+        closed = HistoryDownloader.last_closed(300)
+        self.store.write('USDT_BTC', 300, candles([closed - 300]))
+        first, last = self.downloader.gaps('USDT_BTC', 300, datetime.utcfromtimestamp(closed - 600))[-1]
+        self.assertIn(last, (closed, HistoryDownloader.last_closed(300)))
+
+    def test_last_closed(self):
+        self.assertEqual(HistoryDownloader.last_closed(300, START + 299), START - 300)
+        self.assertEqual(HistoryDownloader.last_closed(300, START + 300), START)
+
+
+if __name__ == '__main__':
+    unittest.main()
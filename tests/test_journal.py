@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from trading.esssencial.journal import Journal, JournalReader, HEADER, TICK, DECISION, FILL
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal', 'events.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, events, fsync='never'):
+        journal = Journal()
+        journal.open(self.path, fsync)
+        for type, payload, timestamp in events:
+            journal.record(type, payload, timestamp)
+        journal.close()
+
+    def test_round_trip(self):
+        events = [(TICK, {'pair': 'USDT_BTC', 'bid': 1000.5}, 1.0),
+                  (DECISION, {'buy': True, 'ema': [1, 2.5]}, 2.0),
+                  (FILL, {'order': '42', 'amount': 0.25}, 3.0)]
+        self.write(events)
+        self.assertEqual([(type, payload, timestamp) for type, timestamp, payload in JournalReader(self.path)], events)
+        self.assertEqual(JournalReader(self.path).end(), os.path.getsize(self.path))
+
+    def test_types_filter(self):
+        self.write([(TICK, {'n': i}, float(i)) for i in range(5)] + [(FILL, {'n': 5}, 5.0)])
+        self.assertEqual([payload for _, _, payload in JournalReader(self.path, [FILL])], [{'n': 5}])
+
+    def test_record_without_open_is_ignored(self):
+        Journal().record(TICK, {'n': 0})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_torn_tail_is_cut_off_before_appending(self):
+        self.write([(TICK, {'n': 0}, 0.0), (TICK, {'n': 1}, 1.0)])
+        complete = os.path.getsize(self.path)
+        with open(self.path, 'ab') as file:
+            file.write(HEADER.pack(100, TICK, 2.0) + b'{"n":')
+
+        self.assertEqual(JournalReader(self.path).end(), complete)
+        self.assertEqual([payload['n'] for _, _, payload in JournalReader(self.path)], [0, 1])
+
+        self.write([(TICK, {'n': 3}, 3.0)])
+        self.assertEqual([payload['n'] for _, _, payload in JournalReader(self.path)], [0, 1, 3])
+
+    def test_torn_header(self):
+        self.write([(TICK, {'n': 0}, 0.0)])
+        with open(self.path, 'ab') as file:
+            file.write(HEADER.pack(4, TICK, 1.0)[:5])
+        self.write([(TICK, {'n': 2}, 2.0)])
+        self.assertEqual([payload['n'] for _, _, payload in JournalReader(self.path)], [0, 2])
+
+    def test_unknown_fsync_policy(self):
+        self.assertRaises(ValueError, Journal().open, self.path, 'sometimes')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from trading.model.candle_store import CandleStore
+from trading.model.data_source import BacktestDataSource, LiveDataSource
+from trading.model.downloader import HistoryDownloader
+from trading.trade_algorithms import SimpleStrategy
+from trading.tools.benchmark import benchmark_currency
+from trading.tools.synthetic import SyntheticPoloniex
+
+PERIOD = 300
+TIMEZONES = ['UTC', 'Asia/Tokyo', 'Europe/Berlin', 'America/New_York']
+
+
+# the lookback windows are epoch seconds; naive datetimes are UTC whatever the host's timezone is
+class LookbackTimezoneTest(unittest.TestCase):
+    def setUp(self):
+        self.tz = os.environ.get('TZ')
+        self.currency = benchmark_currency()
+        self.lookback = SimpleStrategy.bars(5)
+
+    def tearDown(self):
+        if self.tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self.tz
+        time.tzset()
+
+    def exchange(self, end):
+        bars = 3000
+        return SyntheticPoloniex(seed=4, bars=bars, start=datetime.utcfromtimestamp(end - (bars - 1) * PERIOD),
+                                 balances={'USDT': 1000, 'BTC': 1})
+
+    def test_backtest_window(self):
+        for tz in TIMEZONES:
+            with self.subTest(tz=tz):
+                os.environ['TZ'] = tz
+                time.tzset()
+                closed = HistoryDownloader.last_closed(PERIOD)
+                source = BacktestDataSource(self.currency, self.exchange(closed + PERIOD), datetime.utcnow() - timedelta(days=31),
+                                            0, 5, lookback=self.lookback)
+                self.assertEqual(len(source.backtest_data), self.lookback + source.data_offset)
+                self.assertGreaterEqual(source.backtest_data[-1]['date'], closed)
+                self.assertLessEqual(source.backtest_data[-1]['date'], HistoryDownloader.last_closed(PERIOD))
+
+    def test_offline_window_ends_at_the_store(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = CandleStore(directory)
+            end = HistoryDownloader.last_closed(PERIOD) - 2 * 86400
+            pair = self.currency.currency_pair
+            store.write(pair, PERIOD, self.exchange(end).returnChartData(pair, PERIOD, columns=True))
+            for tz in TIMEZONES:
+                with self.subTest(tz=tz):
+                    os.environ['TZ'] = tz
+                    time.tzset()
+                    source = BacktestDataSource(self.currency, None, datetime.utcnow() - timedelta(days=31), 0, 5, store,
+                                                lookback=self.lookback)
+                    self.assertEqual(len(source.backtest_data), self.lookback + source.data_offset)
+                    self.assertEqual(source.backtest_data[-1]['date'], end)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_live_window(self):
+        for tz in TIMEZONES:
+            with self.subTest(tz=tz):
+                os.environ['TZ'] = tz
+                time.tzset()
+                closed = HistoryDownloader.last_closed(PERIOD)
+                source = LiveDataSource(self.currency, self.exchange(closed + PERIOD), None, 0, 5)
+                source.lookback = self.lookback
+                source.fetch_chart()
+                self.assertEqual(len(source.data), self.lookback)
+                self.assertIn(closed, source.data['date'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
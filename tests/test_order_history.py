@@ -0,0 +1,50 @@
+import unittest
+from datetime import datetime
+
+from trading.model.order_history import history_window, merge_trades
+
+
+def trade(date, number):
+    return {'date': date, 'tradeID': number}
+
+
+class HistoryWindowTest(unittest.TestCase):
+    now = datetime(2017, 3, 1, 12, 0, 0)
+
+    def test_without_cursor(self):
+        self.assertEqual(history_window(self.now, 60), ('2017-03-01 11:00:00', datetime(2017, 3, 1, 11, 0, 0)))
+
+    def test_starts_at_a_cursor_within_the_window(self):
+        first, start = history_window(self.now, 60, '2017-03-01 11:45:10')
+        self.assertEqual(first, '2017-03-01 11:00:00')
+        self.assertEqual(start, datetime(2017, 3, 1, 11, 45, 10))
+
+    def test_ignores_a_cursor_before_the_window(self):
+        self.assertEqual(history_window(self.now, 60, '2017-03-01 10:59:59'),
+                         ('2017-03-01 11:00:00', datetime(2017, 3, 1, 11, 0, 0)))
+
+
+class MergeTradesTest(unittest.TestCase):
+    def test_answered_trades_replace_the_known_ones_from_the_start(self):
+        known = [trade('2017-03-01 11:45:10', 3), trade('2017-03-01 11:30:00', 2), trade('2017-03-01 10:50:00', 1)]
+        first, start = history_window(datetime(2017, 3, 1, 12, 0, 0), 60, known[0]['date'])
+        answered = [trade('2017-03-01 11:50:00', 4), trade('2017-03-01 11:45:10', 3)]
+
+        merged = merge_trades(answered, known, first, start)
+        self.assertEqual([t['tradeID'] for t in merged], [4, 3, 2])
+
+    def test_nothing_known(self):
+        first, start = history_window(datetime(2017, 3, 1, 12, 0, 0), 60)
+        answered = [trade('2017-03-01 11:10:00', 1)]
+        self.assertEqual(merge_trades(answered, [], first, start), answered)
+
+    def test_nothing_answered(self):
+        known = [trade('2017-03-01 11:30:00', 2)]
+        first, start = history_window(datetime(2017, 3, 1, 12, 0, 0), 60, known[0]['date'])
+        self.assertEqual(merge_trades([], known, first, start), [])
+        first, start = history_window(datetime(2017, 3, 1, 12, 0, 0), 60, '2017-03-01 11:40:00')
+        self.assertEqual(merge_trades([], known, first, start), known)
+
+
+if __name__ == '__main__':
+    unittest.main()
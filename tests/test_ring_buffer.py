@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+
+from trading.model.candles import CANDLE_DTYPE
+from trading.model.ring_buffer import RingBuffer, CandleRing
+
+
+def candles(dates, close=1.0):
+    array = np.zeros(len(dates), dtype=CANDLE_DTYPE)
+    array['date'] = dates
+    array['close'] = close
+    return array
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraps_around_oldest_first(self):
+        ring = RingBuffer(4, np.float64)
+        for value in range(11):
+            ring.extend(np.array([value], dtype=np.float64))
+            expected = list(range(max(0, value - 3), value + 1))
+            self.assertEqual(ring.view().tolist(), expected)
+        self.assertEqual(len(ring), 4)
+
+    def test_view_is_a_contiguous_slice_of_the_storage(self):
+        ring = RingBuffer(3, np.float64)
+        ring.extend(np.arange(7, dtype=np.float64))
+        view = ring.view()
+        self.assertTrue(np.shares_memory(view, ring.storage))
+        self.assertEqual(view.tolist(), [4.0, 5.0, 6.0])
+
+    def test_extend_keeps_only_the_newest_capacity(self):
+        ring = RingBuffer(3, np.float64)
+        ring.extend(np.arange(10, dtype=np.float64))
+        self.assertEqual(ring.view().tolist(), [7.0, 8.0, 9.0])
+
+    def test_truncate_drops_the_newest(self):
+        ring = RingBuffer(5, np.float64)
+        ring.extend(np.arange(8, dtype=np.float64))
+        ring.truncate(2)
+        self.assertEqual(ring.view().tolist(), [3.0, 4.0, 5.0])
+        ring.extend(np.array([9.0]))
+        self.assertEqual(ring.view().tolist(), [3.0, 4.0, 5.0, 9.0])
+        ring.truncate(10)
+        self.assertEqual(len(ring), 0)
+
+
+class CandleRingTest(unittest.TestCase):
+    def test_merge_replaces_from_the_first_new_date(self):
+        ring = CandleRing(5)
+        ring.merge(candles([300, 600, 900, 1200]))
+        ring.merge(candles([900, 1200, 1500], close=2.0))
+        self.assertEqual(ring.view()['date'].tolist(), [300, 600, 900, 1200, 1500])
+        self.assertEqual(ring.view()['close'].tolist(), [1.0, 1.0, 2.0, 2.0, 2.0])
+
+    def test_merge_across_the_wrap(self):
+        ring = CandleRing(3)
+        ring.merge(candles([300, 600, 900]))
+        ring.merge(candles([1200, 1500]))
+        ring.merge(candles([1500, 1800], close=3.0))
+        self.assertEqual(ring.view()['date'].tolist(), [1200, 1500, 1800])
+        self.assertEqual(ring.view()['close'].tolist(), [1.0, 3.0, 3.0])
+        self.assertEqual(ring.last_date(), 1800)
+        self.assertEqual(ring.last()['close'], 3.0)
+
+    def test_merge_nothing(self):
+        ring = CandleRing(3)
+        ring.merge(candles([]))
+        self.assertEqual(ring.last_date(), 0)
+        self.assertIsNone(ring.last())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import math
+import unittest
+
+import numpy as np
+
+from trading.model.data_source import IDataSource
+from trading.model.vector_backtest import ema_series
+from trading.tools.benchmark import benchmark_currency
+
+
+class EmaSeriesTest(unittest.TestCase):
+    def test_matches_the_data_source_ema(self):
+        values = 100 + np.cumsum(np.random.default_rng(7).normal(0, 1, 300))
+        source = IDataSource(benchmark_currency())
+        for window in (3, 24, 48):
+            series = ema_series(values, window)
+            for t in range(len(values)):
+                if t < 2 * window - 1:
+                    self.assertTrue(math.isnan(series[t]))
+                else:
+                    self.assertAlmostEqual(series[t], source.ema(list(values[:t + 1]), window), places=9)
+
+    def test_rows_are_independent(self):
+        values = np.random.default_rng(8).uniform(1, 2, (3, 100))
+        series = ema_series(values, 10)
+        for row in range(3):
+            np.testing.assert_array_equal(series[row], ema_series(values[row], 10))
+
+    def test_too_short(self):
+        self.assertTrue(np.isnan(ema_series(np.ones(9), 5)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
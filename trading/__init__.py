@@ -1,12 +1,20 @@
 from trading.esssencial.api import Poloniex
 from trading.esssencial.logger import log
+from trading.esssencial.journal import Journal, JournalReader
 from trading.esssencial.mpl_finance import candlestick2_ohlc
 from trading.esssencial.plot import Plot
+from trading.model.account_dispatcher import AccountDispatcher
+from trading.model.candle_store import CandleStore
+from trading.model.downloader import HistoryDownloader
 from trading.model.data_source import IDataSource, BacktestDataSource, LiveDataSource
 from trading.model.order import Order
 from trading.model.order_history import OrderHistory
+from trading.model.paper_exchange import PaperExchange, PaperPoloniex
+from trading.model.performance import Performance
+from trading.model.vector_backtest import VectorBacktest
+from trading.model.monte_carlo import MonteCarlo, MonteCarloResult
 from trading.model.trade import Trade
 from trading.model.trade_currency import TradeCurrency
-from trading.trade_algorithms import ITradeAlgorithm, SniperBacktest, ANN, MyTradeAlgorithm, MACD, SimpleStrategy
+from trading.trade_algorithms import ITradeAlgorithm, SniperBacktest, ANN, MyTradeAlgorithm, MACD, SimpleStrategy, EmaBandStrategy
 
-__all__ = ['Poloniex', 'Order', 'OrderHistory', 'Trade', 'ITradeAlgorithm', 'SniperBacktest', 'ANN', 'MyTradeAlgorithm', 'MACD', 'TradeCurrency','Plot', 'log', 'IDataSource', 'BacktestDataSource', 'LiveDataSource', 'SimpleStrategy', 'candlestick2_ohlc']
+__all__ = ['Poloniex', 'Order', 'OrderHistory', 'Trade', 'ITradeAlgorithm', 'SniperBacktest', 'ANN', 'MyTradeAlgorithm', 'MACD', 'TradeCurrency','Plot', 'log', 'IDataSource', 'BacktestDataSource', 'LiveDataSource', 'SimpleStrategy', 'EmaBandStrategy', 'candlestick2_ohlc', 'Performance', 'VectorBacktest', 'MonteCarlo', 'MonteCarloResult', 'CandleStore', 'HistoryDownloader', 'AccountDispatcher']
@@ -17,6 +17,13 @@ from datetime import date, datetime
 import calendar
 import hmac,hashlib
 
+from trading.esssencial.compression import ResponseStream, ENCODINGS
+from trading.esssencial.decode import chart_decoder, trade_decoder
+from trading.esssencial.exporter import exporter, error_kind
+from trading.esssencial.instrumentation import instrumentation
+from trading.esssencial.journal import journal, RESPONSE
+from trading.model.candles import to_records
+
 def createTimeStamp(datestr, format="%Y-%m-%d %H:%M:%S"):
     if type(datestr) in [date, datetime]:
         return calendar.timegm(datestr.timetuple())
@@ -27,12 +34,24 @@ def createTimeStamp(datestr, format="%Y-%m-%d %H:%M:%S"):
     return None
 
 class Poloniex:
-    def __init__(self, APIKey, Secret, parseJson=True):
+    record_responses = True  # journal the parsed responses when the journal is open
+    timeout = 10
+    last_nonce = 0
+    compress = True          # ask for gzip/deflate bodies
+    expansion = 8            # typical inflated / compressed size of a json body, sizes the column arrays
+
+    def __init__(self, APIKey, Secret, parseJson=True, base_url='https://poloniex.com'):
         self.APIKey = APIKey
         self.Secret = Secret
 
         self.parseJson = parseJson
+        self.base_url = base_url.rstrip('/')
  
+    # the exchange's current time as a naive UTC datetime, the way createTimeStamp reads it and the trade dates are
+    # written. simulated exchanges have their own clock
+    def now(self):
+        return datetime.utcnow()
+
     def post_process(self, before):
         after = before
  
@@ -46,16 +65,40 @@ class Poloniex:
                            
         return after
  
-    def api(self, type, params):
+    # `decoder` streams the response into typed columns instead of parsing it into dicts
+    def api(self, type, params, decoder=None):
+        command = params.get('command', type)
+        exporter.inc('api_requests_total', (('endpoint', command),))
+        try:
+            with instrumentation.span('api', command):
+                ret = self.request(type, params, decoder)
+        except Exception as e:
+            exporter.inc('api_errors_total', (('endpoint', command), ('kind', error_kind(e))))
+            raise
+
+        if isinstance(ret, dict) and 'error' in ret:
+            rate_limited = 'per second' in str(ret['error'])
+            exporter.inc('api_errors_total', (('endpoint', command), ('kind', 'rate_limit' if rate_limited else 'error_body')))
+            if rate_limited:
+                exporter.inc('rate_limited_total', (('endpoint', command),))
+
+        if journal.enabled and self.parseJson and self.record_responses:
+            body = ret if decoder is None or isinstance(ret, dict) else to_records(ret, ret.dtype.names)
+            journal.record(RESPONSE, {'command': command, 'body': body,
+                                      'params': dict((k, v) for k, v in params.items() if k not in ('command', 'nonce') and v is not None)})
+        return ret
+
+    def request(self, type, params, decoder=None):
         try:
             params = dict((k,v) for k,v in params.iteritems() if v is not None)
         except AttributeError:
             params = dict((k,v) for k,v in params.items() if v is not None)
 
+        encoding = {'Accept-Encoding': ENCODINGS} if self.compress else {}
         if 'public' == type:
-            uri = 'https://poloniex.com/public?' + urlencode(params)
+            uri = self.base_url + '/public?' + urlencode(params)
 
-            ret = urlopen(Request(uri),timeout=10)
+            ret = urlopen(Request(uri, headers=encoding),timeout=self.timeout)
             # jsonRet = json.loads(ret.read())
 
         if 'private' == type:
@@ -66,26 +109,38 @@ class Poloniex:
                 'Sign': sign,
                 'Key': self.APIKey
             }
+            headers.update(encoding)
             
-            ret = urlopen(Request('https://poloniex.com/tradingApi', post_data.encode(), headers),timeout=10)
+            ret = urlopen(Request(self.base_url + '/tradingApi', post_data.encode(), headers),timeout=self.timeout)
             # jsonRet = json.loads(ret.read())
             # return self.post_process(jsonRet)
         
-        if self.parseJson:
-            return json.loads(ret.read().decode('utf-8'))
+        stream = ResponseStream(ret, ret.headers.get('Content-Encoding'))
+        length = int(ret.headers.get('Content-Length') or 0)
+        if decoder is not None:
+            result = decoder.decode(stream, length * self.expansion if stream.compressed else length)
+        elif self.parseJson:
+            result = json.loads(stream.read().decode('utf-8'))
         else:
-            return ret.read()
+            result = stream.read()
+
+        labels = (('endpoint', params.get('command', type)), ('encoding', stream.encoding or 'identity'))
+        exporter.inc('api_wire_bytes_total', labels, stream.wire)
+        exporter.inc('api_body_bytes_total', labels, stream.decoded)
+        return result
 
     def _private(self, command, params={}):
         params['command'] = command
-        params['nonce'] = int(time.time()*1000)
+        # two calls within the same millisecond would reuse a nonce, which the exchange rejects
+        self.last_nonce = max(int(time.time()*1000), self.last_nonce + 1)
+        params['nonce'] = self.last_nonce
 
         return self.api('private', params)
 
-    def _public(self, command, params={}):
+    def _public(self, command, params={}, decoder=None):
         params['command'] = command
         
-        return self.api('public', params)
+        return self.api('public', params, decoder)
 
     def returnTicker(self):
         return self._public("returnTicker")
@@ -96,20 +151,22 @@ class Poloniex:
     def returnOrderBook (self, currencyPair):
         return self._public("returnOrderBook", {'currencyPair': currencyPair})
  
-    def returnTradeHistory (self, currencyPair, start=None, end=None):
+    # columns=True returns a TRADE_DTYPE array instead of a list of dicts
+    def returnTradeHistory (self, currencyPair, start=None, end=None, columns=False):
         return self._public("returnTradeHistory", {
             'currencyPair': currencyPair,
             'start': createTimeStamp(start),
             'end': createTimeStamp(end)
-        })
+        }, trade_decoder if columns else None)
  
-    def returnChartData (self, currencyPair, period=300, start=None, end=None):
+    # columns=True returns a CANDLE_DTYPE array instead of a list of dicts
+    def returnChartData (self, currencyPair, period=300, start=None, end=None, columns=False):
         return self._public("returnChartData", {
             'currencyPair': currencyPair,
             'start': createTimeStamp(start),
             'end': createTimeStamp(end),
             'period': period
-        })
+        }, chart_decoder if columns else None)
  
  
     # Returns all of your balances.
@@ -130,6 +187,12 @@ class Poloniex:
     def returnOpenOrders(self,currencyPair):
         return self._private('returnOpenOrders',{"currencyPair":currencyPair})
  
+    # Returns your open orders of every market in one call
+    # Outputs:
+    # {"BTC_XCP": [{"orderNumber": ..., ...}], "BTC_ETH": [], ... }
+    def returnAllOpenOrders(self):
+        return self.returnOpenOrders('all')
+ 
  
     # Returns your trade history for a given market, specified by the "currencyPair" POST parameter
     # Inputs:
@@ -143,6 +206,13 @@ class Poloniex:
     def returnAccountTradeHistory(self,currencyPair,start):
         return self._private('returnTradeHistory',{"currencyPair":currencyPair,"start":createTimeStamp(start)})
  
+    # Returns your trade history of every market in one call, up to `limit` trades
+    # Outputs:
+    # {"BTC_XCP": [{"date": ..., ...}], ... }, markets without trades are left out and without any trades at all
+    # the exchange answers with an empty list
+    def returnAllAccountTradeHistory(self,start,limit=10000):
+        return self._private('returnTradeHistory',{"currencyPair":"all","start":createTimeStamp(start),"limit":limit})
+ 
     # Places a buy order in a given market. Required POST parameters are "currencyPair", "rate", and "amount". If successful, the method will return the order number.
     # Inputs:
     # currencyPair  The curreny pair
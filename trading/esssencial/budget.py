@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+# Token bucket shared by every thread calling the exchange: `rate` calls per second on average, bursts of up to
+# `burst`. acquire() blocks until a call is allowed, try_acquire() only says whether one is.
+class RateBudget:
+    rate = 6.0
+    burst = 6.0
+    tokens = 0.0
+    refilled = 0.0
+    lock = None
+
+    def __init__(self, rate=6.0, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def try_acquire(self, tokens=1.0):
+        with self.lock:
+            self.refill()
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
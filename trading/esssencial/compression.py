@@ -0,0 +1,65 @@
+import zlib
+
+ENCODINGS = 'gzip, deflate'
+
+
+# File-like view of a response body that inflates a gzip or deflate encoded body while it is read, so the json
+# and column decoders consume it chunk by chunk without the whole compressed body in memory first. Any other
+# encoding is passed through. `wire` counts the bytes read from the connection, `decoded` the bytes handed out.
+class ResponseStream:
+    chunk_size = 1 << 16
+    raw = None
+    encoding = ''
+    decompressor = None
+    buffer = None
+    wire = 0
+    decoded = 0
+    eof = False
+
+    def __init__(self, raw, encoding=''):
+        self.raw = raw
+        self.encoding = (encoding or '').strip().lower()
+        self.buffer = bytearray()
+        if self.encoding == 'gzip':
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+
+    @property
+    def compressed(self):
+        return self.decompressor is not None
+
+    def inflate(self, data):
+        if not self.compressed:
+            return data
+        try:
+            return self.decompressor.decompress(data)
+        except zlib.error:
+            # some servers send deflate without the zlib header
+            if self.encoding != 'deflate' or self.wire != len(data):
+                raise
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.decompressor.decompress(data)
+
+    def fill(self):
+        data = self.raw.read(self.chunk_size)
+        self.wire += len(data)
+        if data:
+            self.buffer += self.inflate(data)
+        else:
+            if self.compressed:
+                self.buffer += self.decompressor.flush()
+            self.eof = True
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            self.fill()
+
+        if size is None or size < 0 or size >= len(self.buffer):
+            data = bytes(self.buffer)
+            self.buffer = bytearray()
+        else:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        self.decoded += len(data)
+        return data
@@ -0,0 +1,110 @@
+import json
+import re
+from calendar import timegm
+from time import strptime
+
+import numpy as np
+
+from trading.model.candles import CANDLE_DTYPE, TRADE_DTYPE
+
+KEY = re.compile(b'"([A-Za-z]+)":')
+FRAME = b'[], \t\r\n'     # around the records of a block
+
+# everything but the characters of a decimal number becomes a space. exponents lose their `e` and turn into two
+# numbers, which the count check catches
+NUMBERS = bytes(c if chr(c) in '0123456789.-+' else 32 for c in range(256))
+
+
+# Decodes a json array of flat records straight from the response stream into one typed column per field,
+# without building a dict per record. The stream is read in chunks; every chunk's complete records are blanked
+# down to their numbers so numpy parses them in one pass, in the key order of the block's first record, into
+# a preallocated array. Blocks the number path cannot handle (a missing field, an unexpected string, exponents)
+# go through json instead.
+# A json object instead of an array is the exchange's error answer and is returned as a dict.
+class ColumnDecoder:
+    chunk_size = 1 << 20
+    dtype = None
+    record_size = 200   # bytes per record, for sizing the array from the content length
+
+    def __init__(self, dtype, record_size=200):
+        self.dtype = dtype
+        self.record_size = record_size
+
+    def decode(self, stream, length=0):
+        data = stream.read(self.chunk_size)
+        if data.lstrip()[:1] == b'{':
+            return json.loads((data + stream.read()).decode('utf-8'))
+
+        array = np.empty(max(length // self.record_size, 0) + 16, dtype=self.dtype)
+        count = 0
+        while data:
+            chunk = stream.read(self.chunk_size)
+            end = data.rfind(b'}') + 1 if chunk else len(data)
+            block, data = data[:end], data[end:] + chunk
+            if not block.strip(FRAME):
+                continue
+
+            records = self.decode_block(block)
+            if count + len(records) > len(array):
+                array = np.resize(array, max(len(array) * 2, count + len(records)))
+            array[count:count + len(records)] = records
+            count += len(records)
+        return array[:count]
+
+    def decode_block(self, block):
+        first = block[:block.find(b'}') + 1]
+        fields = [field.decode('ascii') for field in KEY.findall(first)]
+        try:
+            numbers, columns = self.prepare(block)
+            values = np.fromstring(numbers.translate(NUMBERS), sep=' ')
+        except ValueError:
+            values = columns = None
+
+        count = block.count(b'}')
+        if not fields or values is None or len(values) != count * len(fields) or \
+                any(len(column) != count for column in columns.values()):
+            return self.from_records(json.loads(b'[' + block.strip(FRAME) + b']'))
+
+        values = values.reshape(count, len(fields))
+        records = np.zeros(count, dtype=self.dtype)
+        for i, field in enumerate(fields):
+            if field in self.dtype.names and field not in columns:
+                records[field] = values[:, i]
+        for field, column in columns.items():
+            records[field] = column
+        return records
+
+    # (block with the non numeric values replaced by numbers, columns decoded separately)
+    def prepare(self, block):
+        return block, {}
+
+    def from_records(self, records):
+        array = np.zeros(len(records), dtype=self.dtype)
+        for field in self.dtype.names:
+            array[field] = [self.convert(field, record.get(field, 0)) for record in records]
+        return array
+
+    @staticmethod
+    def convert(field, value):
+        return float(value)
+
+
+class TradeDecoder(ColumnDecoder):
+    DATE = re.compile(b'"date":\\s*"([^"]*)"')
+
+    def prepare(self, block):
+        dates = np.array(self.DATE.findall(block)).astype('datetime64[s]').astype(np.int64)
+        block = self.DATE.sub(b'"date":0', block).replace(b'"buy"', b'1').replace(b'"sell"', b'-1')
+        return block, {'date': dates}
+
+    @staticmethod
+    def convert(field, value):
+        if field == 'date' and isinstance(value, str):
+            return timegm(strptime(value, '%Y-%m-%d %H:%M:%S'))
+        if field == 'type':
+            return 1 if value == 'buy' else -1
+        return float(value)
+
+
+chart_decoder = ColumnDecoder(CANDLE_DTYPE, 200)
+trade_decoder = TradeDecoder(TRADE_DTYPE, 150)
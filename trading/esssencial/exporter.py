@@ -0,0 +1,197 @@
+import os
+import socket
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Timer
+
+from trading.esssencial.instrumentation import BUCKETS, instrumentation
+from trading.esssencial.logger import log
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(key + '="' + value + '"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+# Counters and gauges of the running bot plus the instrumentation histograms, in prometheus text format.
+# The text is rendered on the exporter's own timer into `snapshot`; a scrape only reads that reference, so it
+# never waits on update_loop, and update_loop only holds the lock for a dict update.
+class MetricsExporter:
+    prefix = 'jungletrade_'
+    counters = None
+    gauges = None
+    help = None
+    lock = None
+    snapshot = ''
+    timer = None
+    server = None
+    path = ''
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, labels=(), amount=1.0):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def set(self, name, labels=(), value=0.0):
+        with self.lock:
+            self.gauges[(name, tuple(labels))] = value
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+
+        lines = []
+        for kind, series in (('counter', counters), ('gauge', gauges)):
+            last_name = None
+            for (name, labels), value in series:
+                if name != last_name:
+                    if name in self.help:
+                        lines.append('# HELP ' + self.prefix + name + ' ' + self.help[name])
+                    lines.append('# TYPE ' + self.prefix + name + ' ' + kind)
+                    last_name = name
+                lines.append(self.prefix + name + format_labels(labels) + ' ' + format_value(value))
+
+        lines.extend(self.render_histograms())
+        return '\n'.join(lines) + '\n'
+
+    def render_histograms(self):
+        with instrumentation.lock:
+            histograms = [(key, list(histogram.counts), histogram.count, histogram.total)
+                          for key, histogram in sorted(instrumentation.histograms.items())]
+
+        name = self.prefix + 'latency_seconds'
+        lines = []
+        if histograms:
+            lines.append('# HELP ' + name + ' Latency of the instrumented hot path spans.')
+            lines.append('# TYPE ' + name + ' histogram')
+        for (kind, span), counts, count, total in histograms:
+            labels = (('kind', kind), ('name', span))
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + [float('inf')], counts):
+                cumulative += bucket
+                lines.append(name + '_bucket' + format_labels(labels + (('le', format_value(bound)),)) + ' ' + str(cumulative))
+            lines.append(name + '_sum' + format_labels(labels) + ' ' + format_value(total))
+            lines.append(name + '_count' + format_labels(labels) + ' ' + str(count))
+        return lines
+
+    def publish(self):
+        self.snapshot = self.render()
+        if self.path:
+            self.write_file(self.path)
+
+    # the textfile collector must never see a half written file
+    def write_file(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        with os.fdopen(fd, 'w') as file:
+            file.write(self.snapshot)
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.snapshot.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever, name='metrics-http')
+        thread.daemon = True
+        thread.start()
+
+    # publish every `interval` seconds; port 0 disables the http endpoint, an empty path the text file
+    def start(self, interval, port=0, path=''):
+        self.path = path
+        self.try_publish()
+        if port:
+            self.serve(port)
+
+        def tick():
+            self.try_publish()
+            self.timer = Timer(interval, tick)
+            self.timer.daemon = True
+            self.timer.start()
+
+        self.timer = Timer(interval, tick)
+        self.timer.daemon = True
+        self.timer.start()
+
+    # a failed publish (e.g. the metrics file cannot be written) is logged and the next tick tries again
+    def try_publish(self):
+        try:
+            self.publish()
+        except Exception as e:
+            log('Publishing the metrics failed: ' + str(e.args), True)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+# classification of a failed api call for the error counter
+def error_kind(error):
+    if isinstance(error, socket.timeout) or 'timed out' in str(error):
+        return 'timeout'
+    if isinstance(error, socket.gaierror) or isinstance(getattr(error, 'reason', None), socket.gaierror):
+        return 'dns'
+    if hasattr(error, 'code'):
+        return 'http_' + str(error.code)
+    return type(error).__name__
+
+
+exporter = MetricsExporter()
+exporter.describe('api_requests_total', 'Poloniex API calls per endpoint.')
+exporter.describe('api_errors_total', 'Failed Poloniex API calls per endpoint and kind.')
+exporter.describe('rate_limited_total', 'API calls answered with a rate limit error.')
+exporter.describe('api_wire_bytes_total', 'Response body bytes received per endpoint and content encoding.')
+exporter.describe('api_body_bytes_total', 'Response body bytes after decompression per endpoint and content encoding.')
+exporter.describe('retry_wait_seconds_total', 'Seconds update_loop waited before retrying a failed cycle.')
+exporter.describe('cycles_total', 'update_loop runs per pair and result.')
+exporter.describe('cycle_lag_seconds', 'How late the last update_loop run started after it was due.')
+exporter.describe('evaluations_skipped_total', 'Strategy evaluations skipped because nothing they depend on changed.')
+exporter.describe('poll_interval_seconds', 'Seconds until the pair\'s next adaptive update.')
+exporter.describe('close_to_decision_seconds', 'Seconds from the last candle close to the end of the pair\'s update.')
+exporter.describe('balance', 'Last known balance per pair and currency.')
+exporter.describe('position_value', 'Alt balance of the pair valued at the highest bid.')
+exporter.describe('pair_memory_bytes', 'Bytes held for the pair\'s candle buffer and recent fills.')
@@ -0,0 +1,135 @@
+import threading
+from bisect import bisect_left
+from threading import Timer
+from time import perf_counter
+
+from trading.esssencial.logger import log
+
+# upper bounds of the latency buckets in seconds: 10us doubling up to ~22 minutes
+BUCKETS = [0.00001 * 2 ** i for i in range(28)]
+
+
+class Histogram:
+    counts = None
+    count = 0
+    total = 0.0
+    max = 0.0
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # upper bound of the bucket holding the q-th percentile, never above the largest observation
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = self.count * q / 100.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Span:
+    instrumentation = None
+    key = None
+    start = 0.0
+
+    def __init__(self, instrumentation, key):
+        self.instrumentation = instrumentation
+        self.key = key
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.instrumentation.observe(self.key[0], self.key[1], perf_counter() - self.start)
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+# Latency histograms of the live hot path, keyed by (kind, name):
+#   api        per poloniex command
+#   update     data source update() per pair
+#   decision   strategy work after update() per pair, up to its first order
+#   order      order placement per pair, fill wait included
+#   fill_wait  polling for the fill per pair
+#   cycle      one whole update_loop run per pair
+# while disabled span() hands out one shared no-op context manager, so instrumented code pays a single call
+class Instrumentation:
+    enabled = False
+    histograms = None
+    lock = None
+    summary_timer = None
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def span(self, kind, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, (kind, name))
+
+    def observe(self, kind, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self):
+        template = "{0:10}{1:28}{2:>8}{3:>12}{4:>12}{5:>12}{6:>12}"
+        lines = [template.format('kind', 'name', 'count', 'mean ms', 'p50 ms', 'p95 ms', 'max ms')]
+        with self.lock:
+            for (kind, name), histogram in sorted(self.histograms.items()):
+                lines.append(template.format(kind, name, histogram.count,
+                                             "{0:.1f}".format(histogram.total / histogram.count * 1000),
+                                             "{0:.1f}".format(histogram.percentile(50) * 1000),
+                                             "{0:.1f}".format(histogram.percentile(95) * 1000),
+                                             "{0:.1f}".format(histogram.max * 1000)))
+        return lines
+
+    # log the summary every `interval` seconds from a daemon timer
+    def start_summary(self, interval):
+        def dump():
+            for line in self.summary():
+                log(line, True)
+            self.start_summary(interval)
+
+        self.summary_timer = Timer(interval, dump)
+        self.summary_timer.daemon = True
+        self.summary_timer.start()
+
+    def stop_summary(self):
+        if self.summary_timer is not None:
+            self.summary_timer.cancel()
+            self.summary_timer = None
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,163 @@
+import atexit
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+# event types
+RESPONSE = 1    # raw api response: command, params, body
+TICK = 2        # what a data source update() ended up with: balances, bid/ask, last candle
+DECISION = 3    # strategy decision with the indicator values it was based on
+ORDER = 4       # order request as sent to the exchange
+FILL = 5        # filled order
+PREFETCH = 6    # a Prefetcher started fetching ahead of a candle close: pairs
+
+TYPES = {RESPONSE: 'response', TICK: 'tick', DECISION: 'decision', ORDER: 'order', FILL: 'fill', PREFETCH: 'prefetch'}
+
+# every record is <payload length uint32><type uint8><unix time float64> followed by compact json
+HEADER = struct.Struct('<IBd')
+
+FSYNC_POLICIES = ['always', 'interval', 'never']
+
+
+# Append-only event journal, the record of what the bot saw and did. Disabled until open() is called, so the
+# record() calls in the hot path cost one attribute check. fsync policy:
+#   always    flush and fsync every record
+#   interval  flush every record, fsync at most every fsync_interval seconds
+#   never     leave flushing to the file buffer and the os
+class Journal:
+    enabled = False
+    path = ''
+    fsync = 'interval'
+    fsync_interval = 1.0
+    file = None
+    lock = None
+    last_sync = 0.0
+    records = 0
+    clock = None    # where record() takes the time from, time.time unless replaying
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clock = time.time
+
+    def open(self, path, fsync='interval', fsync_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Unknown fsync policy: ' + str(fsync))
+
+        self.close()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # the length prefix of a record torn by a crash would swallow the records appended after it, so it is cut off
+        if os.path.exists(path):
+            end = JournalReader(path).end()
+            if end < os.path.getsize(path):
+                with open(path, 'r+b') as file:
+                    file.truncate(end)
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.file = open(path, 'ab')
+        self.last_sync = time.time()
+        self.enabled = True
+
+    def record(self, type, payload, timestamp=None):
+        if not self.enabled:
+            return
+
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        header = HEADER.pack(len(body), type, self.clock() if timestamp is None else timestamp)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(header + body)
+            self.records += 1
+
+            if self.fsync == 'never':
+                return
+            self.file.flush()
+            now = time.time()
+            if self.fsync == 'always' or now - self.last_sync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_sync = now
+
+    def close(self):
+        with self.lock:
+            self.enabled = False
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+
+# Streams (type, timestamp, payload) out of a journal. Only records of the requested types are decoded, the
+# others are skipped by their length prefix. A record cut off by a crash ends the stream, Journal.open() cuts it
+# off before appending.
+class JournalReader:
+    path = ''
+    types = None
+
+    def __init__(self, path, types=None):
+        self.path = path
+        self.types = None if types is None else set(types)
+
+    def __iter__(self):
+        for type, timestamp, body in self.raw():
+            yield type, timestamp, json.loads(body.decode('utf-8'))
+
+    # (type, timestamp, undecoded payload bytes) of the requested types
+    def raw(self):
+        if os.path.getsize(self.path) == 0:
+            return
+
+        with open(self.path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                size = len(buffer)
+                while offset + HEADER.size <= size:
+                    length, type, timestamp = HEADER.unpack_from(buffer, offset)
+                    start = offset + HEADER.size
+                    offset = start + length
+                    if offset > size:
+                        break
+                    if self.types is None or type in self.types:
+                        yield type, timestamp, buffer[start:offset]
+            finally:
+                buffer.close()
+
+    # offset after the last complete record, where a record torn by a crash starts
+    def end(self):
+        if os.path.getsize(self.path) == 0:
+            return 0
+
+        with open(self.path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                size = len(buffer)
+                while offset + HEADER.size <= size:
+                    length = HEADER.unpack_from(buffer, offset)[0]
+                    if offset + HEADER.size + length > size:
+                        break
+                    offset += HEADER.size + length
+                return offset
+            finally:
+                buffer.close()
+
+    # number of records per type name, without decoding any payload
+    def count(self):
+        counts = {}
+        for type, timestamp, body in self.raw():
+            name = TYPES.get(type, str(type))
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+journal = Journal()
+atexit.register(journal.close)
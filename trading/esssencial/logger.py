@@ -1,10 +1,165 @@
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+
+
+# Appends log lines from a background thread. log() only puts the line on a bounded queue; the writer drains it
+# in batches, rotates the file by size or age into gzip compressed backups (log.txt.1.gz is the newest) and
+# keeps the lines for a retry while the file cannot be written (locked, disk full, i/o error), backing off up to
+# max_retry_delay seconds. When the queue is full the line is dropped and counted instead of blocking the
+# caller, the writer then logs how many were lost.
+class LogWriter:
+    path = 'log.txt'
+    max_bytes = 10 * 1024 * 1024
+    max_age = 0
+    backups = 5
+    batch_size = 1000
+    flush_interval = 0.5
+    queue_size = 100000
+    max_pending = 1000000
+    max_retry_delay = 30.0
+
+    queue = None
+    thread = None
+    lock = None
+    file = None
+    opened_at = 0.0
+    dropped = 0
+    reported_drops = 0
+    pending = None
+    retry_delay = 0.0
+    retry_at = 0.0
+
+    def __init__(self, path='log.txt', max_bytes=10 * 1024 * 1024, max_age=0, backups=5):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.queue = queue.Queue(self.queue_size)
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def configure(self, max_bytes=None, max_age=None, backups=None):
+        self.max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        self.max_age = self.max_age if max_age is None else max_age
+        self.backups = self.backups if backups is None else backups
+
+    def write(self, line):
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='log-writer')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                lines = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                lines = []
+
+            while len(lines) < self.batch_size:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in lines
+            self.pending.extend(line for line in lines if line is not None)
+            if self.dropped != self.reported_drops:
+                self.pending.append(str(self.dropped - self.reported_drops) + ' log messages dropped')
+                self.reported_drops = self.dropped
+
+            try:
+                if self.pending and (stop or time.time() >= self.retry_at):
+                    self.flush_pending()
+            finally:
+                for _ in lines:
+                    self.queue.task_done()
+            if stop:
+                self.close_file()
+                return
+
+    def flush_pending(self):
+        try:
+            if self.file is None:
+                self.open_file()
+            self.file.write('\n'.join(self.pending) + '\n')
+            self.file.flush()
+            self.pending = []
+            self.retry_delay = 0.0
+            if self.should_rotate():
+                self.rotate()
+        except OSError:
+            # the file is locked by another process, the disk is full or failing: keep the lines for a later batch
+            try:
+                self.close_file()
+            except OSError:
+                self.file = None
+            self.retry_delay = min(max(2 * self.retry_delay, self.flush_interval), self.max_retry_delay)
+            self.retry_at = time.time() + self.retry_delay
+            if len(self.pending) > self.max_pending:
+                self.dropped += len(self.pending) - self.max_pending
+                self.reported_drops = self.dropped
+                self.pending = self.pending[-self.max_pending:]
+
+    def open_file(self):
+        self.file = open(self.path, 'a')
+        self.opened_at = time.time()
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def should_rotate(self):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self.opened_at >= self.max_age
+
+    def rotate(self):
+        self.close_file()
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path + '.' + str(i) + '.gz'
+            if os.path.exists(older):
+                os.replace(older, self.path + '.' + str(i + 1) + '.gz')
+
+        if self.backups > 0:
+            with open(self.path, 'rb') as source, gzip.open(self.path + '.1.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+        os.remove(self.path)
+
+    # wait until everything queued so far is on disk, or kept for a retry while the file cannot be written
+    def flush(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+
+writer = LogWriter()
+atexit.register(writer.close)
+
+
 def log(msg, preserve_line=False):
     end = '\n' if preserve_line else ''
     start = '\r'  # '\n' if preserve_line else '\r'
     print(start + str(msg), end=end)
 
-    try:
-        with open('log.txt', 'a') as file:
-            file.write(str(msg) + '\n')
-    except PermissionError:
-        log(msg, preserve_line)
+    writer.write(str(msg))
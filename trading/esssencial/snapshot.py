@@ -0,0 +1,30 @@
+import os
+import pickle
+import tempfile
+
+
+# write to a temporary file next to the target and swap it in, so a crash never leaves half a snapshot behind
+def save_snapshot(obj, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_snapshot(path):
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as file:
+        return pickle.load(file)
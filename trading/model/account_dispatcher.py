@@ -0,0 +1,104 @@
+import threading
+import time
+from datetime import timedelta
+
+from trading.esssencial.api import Poloniex
+from trading.model.order_history import OrderHistory, history_window, merge_trades
+
+
+# Fetches the private state of an account once for all of its pairs: balances, the open orders of every market
+# and the trade history of every market, three calls however many pairs are traded. The LiveDataSources sharing
+# a dispatcher read their pair's view of the last refresh. A refresh younger than `max_age` seconds is reused,
+# so the staggered pair cycles of one round share it; placing an order invalidates it.
+class AccountDispatcher:
+    poloniex = None
+    max_age = 0.0
+    minutes = 5         # trade history is fetched for the longest period any watching pair needs
+    balances = None
+    open_orders = None
+    history = None
+    cursor = None       # date of the newest known trade, the history is requested from then on
+    refreshed = None    # monotonic time of the last full refresh
+    refreshes = 0
+    lock = None
+
+    def __init__(self, poloniex, max_age=0.0):
+        assert isinstance(poloniex, Poloniex)
+        self.poloniex = poloniex
+        self.max_age = max_age
+        self.balances = {}
+        self.open_orders = {}
+        self.history = {}
+        self.lock = threading.RLock()
+
+    def watch(self, minutes):
+        with self.lock:
+            if minutes > self.minutes:
+                self.minutes = minutes
+                self.cursor = None
+                self.refreshed = None
+
+    def invalidate(self):
+        with self.lock:
+            self.refreshed = None
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and self.refreshed is not None and time.monotonic() - self.refreshed < self.max_age:
+                return False
+
+            balances = self.poloniex.returnBalances()
+            if 'error' in balances:
+                raise RuntimeError(balances['error'])
+            open_orders = self.poloniex.returnAllOpenOrders()
+            if 'error' in open_orders:
+                raise RuntimeError(open_orders['error'])
+
+            self.balances = balances
+            self.open_orders = open_orders
+            self.refresh_history()
+            self.refreshed = time.monotonic()
+            self.refreshes += 1
+            return True
+
+    # only the trade history, for polling fills. once it is known only the trades from the newest one on are requested
+    def refresh_history(self):
+        with self.lock:
+            first, start = history_window(self.poloniex.now(), self.minutes, self.cursor)
+            history = self.poloniex.returnAllAccountTradeHistory(start)
+            if isinstance(history, dict) and 'error' in history:
+                raise RuntimeError(history['error'])
+            # an account without any trades in the period gets an empty list instead of an empty dict
+            history = history if isinstance(history, dict) else {}
+            pairs = set(history) | set(self.history)
+            self.history = dict((pair, merge_trades(history.get(pair, []), self.history.get(pair, []), first, start))
+                                for pair in pairs)
+            dates = [str(trades[0]['date']) for trades in self.history.values() if len(trades)]
+            self.cursor = max(dates) if dates else None
+
+    # what a restart needs to continue from the known trades
+    def snapshot(self):
+        with self.lock:
+            return {'minutes': self.minutes, 'history': self.history, 'cursor': self.cursor}
+
+    def restore(self, snapshot):
+        with self.lock:
+            if snapshot['minutes'] < self.minutes:
+                return False
+            self.minutes = snapshot['minutes']
+            self.history = snapshot['history']
+            self.cursor = snapshot['cursor']
+            return True
+
+    def pair_open_orders(self, currency_pair):
+        with self.lock:
+            return list(self.open_orders.get(currency_pair, []))
+
+    # the pair's trades of the last `minutes`, newest first like the exchange answers them
+    def pair_history(self, currency_pair, minutes):
+        with self.lock:
+            since = (self.poloniex.now() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+            return [trade for trade in self.history.get(currency_pair, []) if str(trade['date']) >= since]
+
+    def order_history(self, currency_pair, minutes):
+        return OrderHistory(self.poloniex, minutes, currency_pair, self.pair_history(currency_pair, minutes))
@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import numpy as np
+
+from trading.model.candles import CANDLE_DTYPE, to_array
+
+
+# Local candle store: one typed .npy file per pair and period, sorted by date, so backtests can run from disk
+# without touching the exchange.
+class CandleStore:
+    directory = ''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, currency_pair, period):
+        return os.path.join(self.directory, currency_pair + '_' + str(int(period)) + '.npy')
+
+    def pairs(self, period):
+        suffix = '_' + str(int(period)) + '.npy'
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.directory) if name.endswith(suffix))
+
+    def read(self, currency_pair, period, start=None, end=None):
+        path = self.path(currency_pair, period)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+
+        candles = np.load(path, mmap_mode='r')
+        first = 0 if start is None else np.searchsorted(candles['date'], start, side='left')
+        last = len(candles) if end is None else np.searchsorted(candles['date'], end, side='right')
+        return np.array(candles[first:last])
+
+    def last_date(self, currency_pair, period):
+        path = self.path(currency_pair, period)
+        if not os.path.exists(path):
+            return None
+
+        candles = np.load(path, mmap_mode='r')
+        return int(candles['date'][-1]) if len(candles) else None
+
+    # merge candles into the stored ones; a candle with an already stored date replaces the old one
+    def write(self, currency_pair, period, candles):
+        candles = to_array(candles)
+        candles = candles[candles['date'] > 0]
+        stored = self.read(currency_pair, period)
+        if len(stored):
+            candles = np.concatenate((candles, stored))
+
+        # a stable sort by date keeps the newest copy first, np.unique then keeps that one
+        candles = candles[np.argsort(candles['date'], kind='stable')]
+        dates, first = np.unique(candles['date'], return_index=True)
+        candles = candles[first]
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.save(file, candles)
+            os.replace(tmp_path, self.path(currency_pair, period))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return len(candles)
@@ -0,0 +1,25 @@
+import numpy as np
+
+# field layout of a poloniex returnChartData record, kept as one typed column per field
+CANDLE_FIELDS = ['date', 'open', 'high', 'low', 'close', 'volume', 'quoteVolume', 'weightedAverage']
+CANDLE_DTYPE = np.dtype([('date', np.int64)] + [(field, np.float64) for field in CANDLE_FIELDS[1:]])
+
+# public returnTradeHistory records: date as unix time, type 1 for buy and -1 for sell
+TRADE_FIELDS = ['globalTradeID', 'tradeID', 'date', 'type', 'rate', 'amount', 'total']
+TRADE_DTYPE = np.dtype([('globalTradeID', np.int64), ('tradeID', np.int64), ('date', np.int64), ('type', np.int8),
+                        ('rate', np.float64), ('amount', np.float64), ('total', np.float64)])
+
+
+def to_array(records):
+    if isinstance(records, np.ndarray):
+        return records.astype(CANDLE_DTYPE, copy=False)
+
+    array = np.empty(len(records), dtype=CANDLE_DTYPE)
+    for field in CANDLE_FIELDS:
+        array[field] = [record[field] for record in records]
+    return array
+
+
+def to_records(array, fields=CANDLE_FIELDS):
+    columns = [array[field].tolist() for field in fields]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
@@ -1,12 +1,32 @@
-from datetime import datetime, timedelta
-from time import time
+from datetime import datetime
+import sys
+import time
+from time import perf_counter
 
+import numpy as np
+
+from trading.model.account_dispatcher import AccountDispatcher
 from trading.model.order import Order
 from trading.model.order_history import OrderHistory
 from trading.esssencial.plot import Plot
-from trading.esssencial.api import Poloniex
+from trading.esssencial.api import Poloniex, createTimeStamp
+from trading.esssencial.exporter import exporter
+from trading.esssencial.instrumentation import instrumentation
+from trading.esssencial.journal import journal, TICK, ORDER, FILL
+from trading.model.candle_store import CandleStore
+from trading.model.candles import to_array, to_records
+from trading.model.downloader import HistoryDownloader
+from trading.model.performance import RunningPerformance
+from trading.model.ring_buffer import CandleRing, RingBuffer
 from trading.model.trade_currency import TradeCurrency
 
+# what can change between two updates. strategies declare which of these their decision depends on and skip
+# evaluations in which none of them did
+CANDLE = 'candle'     # a new candle closed (and the next one started forming)
+PRICE = 'price'       # bid, ask or the forming candle moved
+BALANCE = 'balance'   # balances or the order history changed
+CHANGES = (CANDLE, PRICE, BALANCE)
+
 
 class IDataSource:
     currency = None
@@ -19,6 +39,11 @@ class IDataSource:
     highest_bid = 0.0
     lowest_ask = 0.0
     orders = []
+    updated_at = 0.0
+    decided_at = 0.0               # when the strategy placed its first order of the cycle, 0 while it has not
+    lookback = 0                   # candles the strategy needs before the current one, 0 keeps the default window
+    changes = frozenset(CHANGES)   # what changed in the last update
+    state = None                   # {change: value} after the last update
 
     def __init__(self, currency):
         assert isinstance(currency, TradeCurrency)
@@ -29,9 +54,53 @@ class IDataSource:
     def update(self):
         return False
 
+    # compares what the update ended up with to the previous update's
+    def detect_changes(self):
+        candle = self.last_candle()
+        orders = self.orders
+        state = {CANDLE: candle['date'] if candle is not None else 0,
+                 PRICE: (self.highest_bid, self.lowest_ask) + ((candle['close'], candle['weightedAverage']) if candle is not None else ()),
+                 BALANCE: (self.main_balance, self.alt_balance, len(orders), orders[0].number if len(orders) else '')}
+        previous = self.state
+        self.changes = frozenset(CHANGES if previous is None else [change for change in CHANGES if state[change] != previous[change]])
+        self.state = state
+
+    # journal what this update ended up with, the inputs of the decision that follows
+    def record_tick(self):
+        if not journal.enabled:
+            return
+        journal.record(TICK, {'pair': self.currency.currency_pair, 'main': self.main_balance, 'alt': self.alt_balance,
+                              'bid': self.highest_bid, 'ask': self.lowest_ask, 'candle': self.last_candle()})
+
+    # the newest candle as a dict, None before the first update
+    def last_candle(self):
+        if not len(self.data):
+            return None
+        candle = self.data[-1]
+        return candle if isinstance(candle, dict) else dict(zip(candle.dtype.names, candle.tolist()))
+
+    # one field of the candles as an array for indicator math, a view when the candles are kept in columns
+    def column(self, field):
+        if isinstance(self.data, np.ndarray):
+            return self.data[field]
+        return np.array([candle[field] for candle in self.data])
+
+    def record_order(self, type, rate, amount):
+        journal.record(ORDER, {'pair': self.currency.currency_pair, 'type': type, 'rate': rate, 'amount': amount})
+
+    def record_fill(self, order):
+        if order is not None:
+            journal.record(FILL, dict(order.to_dict(), pair=self.currency.currency_pair))
+
     def security(self, period, value, num_periods=2):
         raise NotImplementedError()
 
+    def snapshot(self):
+        raise NotImplementedError()
+
+    def restore(self, snapshot):
+        raise NotImplementedError()
+
     def buy(self, alt):
         raise NotImplementedError()
 
@@ -85,16 +154,54 @@ class BacktestDataSource(IDataSource):
     data = []
     data_offset = 0
     update_interval = 5
-
-    def __init__(self, currency, poloniex, start, data_offset, update_interval):
+    performance = None      # RunningPerformance of every replayed candle
+    equity_curve = None     # RingBuffer of the equity after each of the last equity_bars replayed candles
+    equity_bars = 30 * 24 * 12
+
+    # without a poloniex instance the backtest is offline: candles come from the store only and the
+    # starting balances are the simulated ones from the config. with both, the gaps of the stored history are
+    # downloaded in chunks by `downloader` and the backtest runs from the store. with the strategy's `lookback`
+    # only that many candles before the replayed ones are loaded, never from before `start`. the window ends at the
+    # last closed candle, offline at the newest stored one
+    def __init__(self, currency, poloniex, start, data_offset, update_interval, store=None, downloader=None, lookback=0):
         super().__init__(currency)
-        assert isinstance(poloniex, Poloniex)
+        assert poloniex is None or isinstance(poloniex, Poloniex)
+        assert store is None or isinstance(store, CandleStore)
+        assert poloniex is not None or store is not None
+        assert downloader is None or isinstance(downloader, HistoryDownloader)
 
         self.backtest_ticker = 0
         self.update_interval = update_interval
-        balances = poloniex.returnBalances()
-        self.backtest_data = poloniex.returnChartData(currencyPair=self.currency.currency_pair, period=self.update_interval * 60, start=start)
+        self.lookback = lookback
+        self.orders = []
+        self.equity_curve = RingBuffer(self.equity_bars, np.float64)
+        period = self.update_interval * 60
         self.data_offset = 288 # 1 day sample
+        if lookback:
+            end = (store.last_date(self.currency.currency_pair, period) or 0) if poloniex is None else HistoryDownloader.last_closed(period)
+            start = datetime.utcfromtimestamp(max(createTimeStamp(start), end - (lookback + self.data_offset - 1) * period))
+
+        if poloniex is None:
+            self.backtest_data = to_records(store.read(self.currency.currency_pair, period, createTimeStamp(start)))
+            if len(self.backtest_data) == 0:
+                raise RuntimeError('No stored candles for ' + self.currency.currency_pair)
+            balances = {self.symbol_main: self.currency.backtest_main_balance, self.symbol_alt: self.currency.backtest_alt_balance}
+        else:
+            balances = poloniex.returnBalances()
+            if store is not None:
+                downloader = downloader if downloader is not None else HistoryDownloader(poloniex, store)
+                downloader.backfill(self.currency.currency_pair, period, start)
+                self.backtest_data = to_records(store.read(self.currency.currency_pair, period, createTimeStamp(start)))
+                if len(self.backtest_data) == 0:
+                    raise RuntimeError('No candles downloaded for ' + self.currency.currency_pair)
+            else:
+                candles = poloniex.returnChartData(currencyPair=self.currency.currency_pair, period=period, start=start, columns=True)
+                if isinstance(candles, dict):
+                    raise RuntimeError(candles['error'])
+                self.backtest_data = to_records(candles[candles['date'] <= HistoryDownloader.last_closed(period)])
+
+        if lookback:
+            self.backtest_data = self.backtest_data[-(lookback + self.data_offset):]
         self.data = self.backtest_data[:(len(self.backtest_data)-self.data_offset)]
 
         self.highest_bid = self.lowest_ask = self.data[-1]['close']
@@ -102,36 +209,98 @@ class BacktestDataSource(IDataSource):
         self.alt_balance_init = float(balances[self.symbol_alt])
         self.main_balance = float(balances[self.symbol_main])
         self.alt_balance = float(balances[self.symbol_alt])
+        self.performance = RunningPerformance(self.main_balance_init, self.alt_balance_init, period)
 
     def update(self):
+        # the strategy has decided on the previous candle, its balances now include that candle's fill
+        if self.performance.bars < self.backtest_ticker:
+            self.record_balances()
         if self.backtest_ticker >= self.data_offset:
             return False
         else:
             self.backtest_ticker += 1
 
-        self.data = self.backtest_data[:(len(self.backtest_data)-self.data_offset+self.backtest_ticker)]
+        end = len(self.backtest_data) - self.data_offset + self.backtest_ticker
+        self.data = self.backtest_data[max(end - self.lookback, 0) if self.lookback else 0:end]
         self.highest_bid = self.lowest_ask = self.data[-1]['close']
+        self.detect_changes()
+        self.record_tick()
 
         return True
 
+    # scores every replayed candle after the strategy traded on it. the orders are kept for the trading history
+    # window like a live pair sees them, so a backtest extended every night stays the same size
+    def record_balances(self):
+        candle = self.data[-1]
+        self.performance.add_bar(self.main_balance, self.alt_balance, candle['close'])
+        self.equity_curve.extend(np.array([self.performance.last_equity]))
+        first = candle['date'] - self.currency.trading_history_in_minutes * 60
+        while len(self.orders) and self.orders[-1].date < first:
+            self.orders.pop()
+
+    # append candles that closed after the last replayed one, so a finished backtest can be continued
+    # from its final state. returns the number of new candles queued for update(). with a lookback only the
+    # candles the next updates can still read are kept, so a backtest extended every night stays the same size
+    def extend(self, candles):
+        last_date = self.backtest_data[-1]['date'] if len(self.backtest_data) else 0
+        closed = HistoryDownloader.last_closed(int(self.update_interval * 60))
+        new_candles = [candle for candle in candles if last_date < candle['date'] <= closed]
+        if len(new_candles) == 0:
+            return 0
+
+        self.backtest_data = self.backtest_data + new_candles
+        self.data_offset += len(new_candles)
+        if self.lookback:
+            self.backtest_data = self.backtest_data[-(self.lookback + self.data_offset - self.backtest_ticker):]
+        return len(new_candles)
+
+    def fetch_new(self, poloniex, store=None):
+        assert isinstance(poloniex, Poloniex)
+        period = self.update_interval * 60
+        start = datetime.utcfromtimestamp(self.backtest_data[-1]['date'] + period)
+        candles = poloniex.returnChartData(currencyPair=self.currency.currency_pair, period=period, start=start, columns=True)
+        if isinstance(candles, dict):
+            raise RuntimeError(candles['error'])
+
+        # poloniex answers a range without closed candles with a single zero-dated placeholder, and the newest
+        # candle is still forming
+        candles = candles[(candles['date'] > 0) & (candles['date'] <= HistoryDownloader.last_closed(period))]
+        if store is not None and len(candles):
+            store.write(self.currency.currency_pair, period, candles)
+        return self.extend(to_records(candles))
+
+    def load_new(self, store):
+        assert isinstance(store, CandleStore)
+        period = self.update_interval * 60
+        candles = store.read(self.currency.currency_pair, period, self.backtest_data[-1]['date'] + period)
+        return self.extend(to_records(candles))
+
     def buy(self, alt):
         main = alt * self.lowest_ask
+        self.record_order('buy', self.lowest_ask, alt)
         if (self.main_balance - main) >= self.currency.min_main:
             order = Order({'type': 'buy', 'orderNumber': '', 'rate': self.lowest_ask, 'total': main, 'amount': alt, 'fee': main * 0.0025}, self.currency.currency_pair)
+            order.date = self.data[-1]['date']
             self.main_balance += order.total - order.fee
             self.alt_balance += order.amount
             self.orders.insert(0, order)
+            self.performance.add_fill(order.total, order.fee, order.amount)
+            self.record_fill(order)
             return order
 
         return None
 
     def sell(self, alt):
+        self.record_order('sell', self.highest_bid, alt)
         if (self.alt_balance - alt) >= self.currency.min_main:
             main = alt * self.highest_bid
             order = Order({'type': 'sell', 'orderNumber': '', 'rate': self.highest_bid, 'total': main, 'amount': alt, 'fee': main * 0.0025}, self.currency.currency_pair)
-            self.main_balance += order.total
+            order.date = self.data[-1]['date']
+            self.main_balance += order.total - order.fee
             self.alt_balance += order.amount
             self.orders.insert(0, order)
+            self.performance.add_fill(order.total, order.fee, order.amount)
+            self.record_fill(order)
             return order
 
         return None
@@ -153,55 +322,186 @@ class LiveDataSource(IDataSource):
     sell_order = None
     orderHistory = None
     exchange = None
+    account = None     # shared AccountDispatcher, None queries balances and history per pair
+    prefetcher = None  # shares one ticker call between the pairs updated after a candle close
+    open_orders = []   # the pair's open orders, only known with an account dispatcher
+    poll_interval = 1  # seconds between order history polls while waiting for a fill
+    candles = None     # CandleRing holding the strategy's lookback, data is a view of it
 
-    def __init__(self, currency, exchange, start, data_offset, update_interval):
+    def __init__(self, currency, exchange, start, data_offset, update_interval, account=None):
         super().__init__(currency)
         assert isinstance(exchange, Poloniex)
+        assert account is None or isinstance(account, AccountDispatcher)
         self.exchange = exchange
         self.update_interval = update_interval
+        self.account = account
+        self.open_orders = []
+        if account is not None:
+            account.watch(max(currency.trading_history_in_minutes, 60))
+
+    # settings of the same pair changed while running, the next update trades with them
+    def swap_currency(self, currency):
+        assert isinstance(currency, TradeCurrency) and currency.currency_pair == self.currency.currency_pair
+        if self.account is not None:
+            self.account.watch(max(currency.trading_history_in_minutes, 60))
+        self.currency = currency
 
     def update(self):
-        balances = self.exchange.returnBalances()
+        with instrumentation.span('update', self.currency.currency_pair):
+            self.fetch()
+        self.updated_at = perf_counter()
+        self.decided_at = 0.0
+        return True
+
+    def fetch(self):
+        if self.account is not None:
+            self.account.refresh()
+            balances = self.account.balances
+            self.open_orders = self.account.pair_open_orders(self.currency.currency_pair)
+        else:
+            balances = self.exchange.returnBalances()
         if 'error' in balances:
             raise RuntimeError(balances['error'])
         else:
             self.main_balance = float(balances[self.symbol_main])
             self.alt_balance = float(balances[self.symbol_alt])
 
-        ticker = self.exchange.returnTicker()
+        ticker = self.prefetcher.ticker() if self.prefetcher is not None else self.exchange.returnTicker()
         if 'error' in ticker:
             raise RuntimeError(ticker['error'])
         else:
             self.highest_bid = float(ticker[self.currency.currency_pair]['highestBid'])
             self.lowest_ask = float(ticker[self.currency.currency_pair]['lowestAsk'])
 
-        start = datetime.now() - timedelta(hours=24)
+        pair = self.currency.currency_pair
+        exporter.set('balance', (('pair', pair), ('currency', self.symbol_main)), self.main_balance)
+        exporter.set('balance', (('pair', pair), ('currency', self.symbol_alt)), self.alt_balance)
+        exporter.set('position_value', (('pair', pair),), self.alt_balance * self.highest_bid)
 
-        self.data = self.exchange.returnChartData(currencyPair=self.currency.currency_pair, period=self.update_interval * 60, start=start)
+        self.fetch_chart()
 
         minutes = self.currency.trading_history_in_minutes
-        history = OrderHistory(self.exchange, minutes, self.currency.currency_pair)
+        if self.account is not None:
+            history = self.account.order_history(self.currency.currency_pair, minutes)
+        elif self.orderHistory is None or self.orderHistory.minutes != max(minutes, 5):
+            history = self.orderHistory = OrderHistory(self.exchange, minutes, self.currency.currency_pair)
+        else:
+            history = self.orderHistory
+            history.update()
         self.orders = history.orders
+        exporter.set('pair_memory_bytes', (('pair', pair),), self.memory())
+        self.detect_changes()
+        self.record_tick()
+
+    # the strategy's lookback of candles, 24 hours of them without one. once they are known only the candles from
+    # the last one on are requested, which replace the last one (it may have been still forming) and everything after it.
+    # the candles live in a ring of that capacity, so a session's memory stays flat however long it runs
+    def fetch_chart(self):
+        capacity = self.capacity()
+        if self.candles is None or self.candles.capacity != capacity:
+            self.candles = CandleRing(capacity)
+        # `capacity` closed candles up to the exchange's clock, the forming one comes on top
+        period = int(self.update_interval * 60)
+        last_closed = HistoryDownloader.last_closed(period, createTimeStamp(self.exchange.now()))
+        start = datetime.utcfromtimestamp(last_closed - (capacity - 1) * period)
+        since = start
+        if len(self.candles) and self.candles.last_date() > createTimeStamp(start):
+            since = datetime.utcfromtimestamp(self.candles.last_date())
+
+        chart = self.exchange.returnChartData(currencyPair=self.currency.currency_pair, period=self.update_interval * 60,
+                                              start=since, columns=True)
+        if isinstance(chart, dict):
+            raise RuntimeError(chart['error'])
+
+        # poloniex answers a range without candles with a single zero-dated placeholder
+        chart = to_array(chart[chart['date'] > 0])
+        if since is start:
+            self.candles.clear()
+        self.candles.merge(chart)
+        self.data = self.candles.view()
+
+    def capacity(self):
+        return int(self.lookback or 24 * 60 // self.update_interval)
+
+    # what a restart needs to continue where this session stopped: the candles and the pair's known trades, the
+    # newest of which is where the next trade history request starts
+    def snapshot(self):
+        return {'pair': self.currency.currency_pair, 'update_interval': self.update_interval,
+                'candles': self.candles.view().copy() if self.candles is not None else None,
+                'trades': self.orderHistory.trades if self.orderHistory is not None else None}
+
+    # the next update then only requests the candles and trades since the snapshot
+    def restore(self, snapshot):
+        if snapshot['pair'] != self.currency.currency_pair or snapshot['update_interval'] != self.update_interval:
+            return False
+        if snapshot['candles'] is not None:
+            self.candles = CandleRing(self.capacity())
+            self.candles.merge(snapshot['candles'])
+            self.data = self.candles.view()
+        if snapshot['trades'] is not None and self.account is None:
+            self.orderHistory = OrderHistory(self.exchange, self.currency.trading_history_in_minutes,
+                                             self.currency.currency_pair, snapshot['trades'])
+            self.orders = self.orderHistory.orders
         return True
 
+    # bytes held for the pair: the candle ring and the kept fills
+    def memory(self):
+        candles = self.candles.nbytes if self.candles is not None else 0
+        return candles + sum(sys.getsizeof(order) + sys.getsizeof(vars(order)) for order in self.orders)
+
+    # pulls the forming candle ahead of its close, so the update after the close only needs the final one
+    def prefetch(self):
+        with instrumentation.span('prefetch', self.currency.currency_pair):
+            self.fetch_chart()
+
+    # the decision ends where the order placement and the fill wait start
+    def decided(self):
+        if not self.decided_at:
+            self.decided_at = perf_counter()
+
     def buy(self, amount):
-        order = self.exchange.buy(currencyPair=self.currency_pair, rate=self.lowest_ask, amount=amount)
+        self.decided()
+        with instrumentation.span('order', self.currency.currency_pair):
+            return self.place_buy(amount)
+
+    # the filled order from the last hour of trade history, None while it has not propagated
+    def find_order(self, order_number):
+        if self.account is None:
+            return OrderHistory(self.exchange, minutes=60, currency_pair=self.currency.currency_pair).get_order(order_number)
+        self.account.refresh_history()
+        return self.account.order_history(self.currency.currency_pair, 60).get_order(order_number)
+
+    def place_buy(self, amount):
+        self.record_order('buy', self.lowest_ask, amount)
+        order = self.exchange.buy(currencyPair=self.currency.currency_pair, rate=self.lowest_ask, amount=amount)
+        if self.account is not None:
+            self.account.invalidate()
         if 'error' in order:
             raise RuntimeError(order['error'])
         else:
             order_number = order['orderNumber']  # wait until the trade propagates before returning.
             order = None
             loops = 0
-            while order is None and loops < 300:
-                time.sleep(1)
-                order = OrderHistory(self.exchange, minutes=60, currency_pair=self.currency_pair).get_order(order_number)
-                loops += 1
+            with instrumentation.span('fill_wait', self.currency.currency_pair):
+                while order is None and loops < 300:
+                    time.sleep(self.poll_interval)
+                    order = self.find_order(order_number)
+                    loops += 1
 
             self.buy_order = order
+            self.record_fill(order)
             return self.buy_order
 
     def sell(self, amount):
-        order = self.exchange.sell(currencyPair=self.currency_pair, rate=self.highest_bid, amount=amount)
+        self.decided()
+        with instrumentation.span('order', self.currency.currency_pair):
+            return self.place_sell(amount)
+
+    def place_sell(self, amount):
+        self.record_order('sell', self.highest_bid, amount)
+        order = self.exchange.sell(currencyPair=self.currency.currency_pair, rate=self.highest_bid, amount=amount)
+        if self.account is not None:
+            self.account.invalidate()
         if 'error' in order:
             raise RuntimeError(order['error'])
         else:
@@ -210,12 +510,14 @@ class LiveDataSource(IDataSource):
             # wait until the trade propagates before returning.
             order = None
             loops = 0
-            while order is None and loops < 300:
-                time.sleep(1)
-                order = OrderHistory(self.exchange, minutes=60, currency_pair=self.currency_pair).get_order(order_number)
-                loops += 1
+            with instrumentation.span('fill_wait', self.currency.currency_pair):
+                while order is None and loops < 300:
+                    time.sleep(self.poll_interval)
+                    order = self.find_order(order_number)
+                    loops += 1
 
             self.sell_order = order
+            self.record_fill(order)
             return self.sell_order
 
     def plot_result(self):
@@ -0,0 +1,154 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from trading.esssencial.api import Poloniex, createTimeStamp
+from trading.esssencial.budget import RateBudget
+from trading.esssencial.logger import log
+from trading.model.candle_store import CandleStore
+from trading.model.candles import TRADE_DTYPE
+
+
+# Downloads long candle and trade histories as many small requests instead of one that times out. The range is
+# split into chunks of `chunk_candles` candles (`chunk_seconds` for trades), `workers` chunks are fetched at the
+# same time within the shared rate budget, and a chunk that fails or answers with an error body is retried on
+# its own after an exponential backoff. Candles are merged into the store once all chunks are in, so a failed
+# chunk only leaves a gap, which the next backfill() finds and fetches again.
+class HistoryDownloader:
+    workers = 4
+    chunk_candles = 5000
+    chunk_seconds = 86400
+    trade_limit = 50000     # most trades poloniex answers with, a full chunk is split in two and fetched again
+    retries = 4
+    backoff = 1.0
+
+    poloniex = None
+    store = None
+    budget = None
+    failed = None           # (pair, start, end) of the chunks still missing after the last download
+
+    def __init__(self, poloniex, store=None, workers=4, budget=None, chunk_candles=5000):
+        assert isinstance(poloniex, Poloniex)
+        assert store is None or isinstance(store, CandleStore)
+        self.poloniex = poloniex
+        self.store = store
+        self.workers = workers
+        self.budget = budget if budget is not None else RateBudget()
+        self.chunk_candles = chunk_candles
+        self.failed = []
+
+    # [(start, end)] inclusive unix times covering the range, every chunk `span` seconds long
+    @staticmethod
+    def chunks(start, end, span, step=1):
+        ranges = []
+        while start <= end:
+            ranges.append((start, min(start + span - step, end)))
+            start += span
+        return ranges
+
+    def call(self, fetch, *args):
+        for attempt in range(self.retries + 1):
+            self.budget.acquire()
+            try:
+                result = fetch(*args)
+                if not isinstance(result, dict):
+                    return result
+                error = result.get('error', result)
+            except Exception as e:
+                error = e
+
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        raise RuntimeError(error)
+
+    def fetch_candles(self, pair, period, start, end):
+        return self.call(lambda: self.poloniex.returnChartData(currencyPair=pair, period=period, start=datetime.utcfromtimestamp(start),
+                                                               end=datetime.utcfromtimestamp(end), columns=True))
+
+    def fetch_trades(self, pair, start, end):
+        trades = self.call(lambda: self.poloniex.returnTradeHistory(pair, datetime.utcfromtimestamp(start),
+                                                                    datetime.utcfromtimestamp(end), columns=True))
+        if len(trades) < self.trade_limit or end <= start:
+            return trades
+        middle = (start + end) // 2
+        return np.concatenate((self.fetch_trades(pair, start, middle), self.fetch_trades(pair, middle + 1, end)))
+
+    # runs fetch over the chunks, returns the arrays of the ones that arrived and keeps the others in `failed`
+    def run(self, pair, fetch, chunks):
+        def fetch_chunk(chunk):
+            try:
+                return fetch(*chunk)
+            except Exception as e:
+                log('Download of ' + pair + ' ' + str(chunk) + ' failed: ' + str(e))
+                return None
+
+        with ThreadPoolExecutor(max(1, min(self.workers, len(chunks)))) as pool:
+            results = list(pool.map(fetch_chunk, chunks))
+        self.failed = [(pair,) + chunk for chunk, result in zip(chunks, results) if result is None]
+        return [result for result in results if result is not None and len(result)]
+
+    # downloads the candles between start and end into the store and returns how many were stored
+    def download(self, pair, period, start, end=None):
+        period = int(period)
+        start = int(createTimeStamp(start)) // period * period
+        end = int(createTimeStamp(end if end is not None else datetime.utcnow()))
+        chunks = self.chunks(start, end, self.chunk_candles * period, period)
+        return self.merge(pair, period, self.run(pair, lambda first, last: self.fetch_candles(pair, period, first, last), chunks))
+
+    # trades between start and end, oldest first, one row per trade
+    def download_trades(self, pair, start, end=None):
+        start = int(createTimeStamp(start))
+        end = int(createTimeStamp(end if end is not None else datetime.utcnow()))
+        results = self.run(pair, lambda first, last: self.fetch_trades(pair, first, last), self.chunks(start, end, self.chunk_seconds))
+        if not results:
+            return np.empty(0, dtype=TRADE_DTYPE)
+
+        trades = np.concatenate(results)
+        trades = trades[np.argsort(trades['tradeID'], kind='stable')]
+        return trades[np.unique(trades['tradeID'], return_index=True)[1]]
+
+    # date of the newest candle that has closed at `now` (epoch seconds, the current time by default), the one after
+    # it is still forming
+    @staticmethod
+    def last_closed(period, now=None):
+        now = time.time() if now is None else now
+        return int(now) // period * period - period
+
+    def merge(self, pair, period, results):
+        if not results:
+            return 0
+        candles = np.concatenate(results)
+        # poloniex answers a range without closed candles with a single zero-dated placeholder. the forming candle
+        # is left out, stored it would count as present and never be fetched again once it closed
+        candles = candles[(candles['date'] > 0) & (candles['date'] <= self.last_closed(period))]
+        if len(candles) and self.store is not None:
+            self.store.write(pair, period, candles)
+        return len(candles)
+
+    # [(start, end)] inclusive ranges of missing closed candles between start and end in the stored history
+    def gaps(self, pair, period, start, end=None):
+        assert self.store is not None
+        period = int(period)
+        start = int(createTimeStamp(start)) // period * period
+        end = int(createTimeStamp(end if end is not None else datetime.utcnow())) // period * period
+        end = min(end, self.last_closed(period))
+        dates = self.store.read(pair, period, start, end)['date']
+        if not len(dates):
+            return [(start, end)] if start <= end else []
+
+        bounds = np.concatenate(([start - period], dates, [end + period]))
+        missing = np.nonzero(np.diff(bounds) > period)[0]
+        return [(int(bounds[i]) + period, int(bounds[i + 1]) - period) for i in missing]
+
+    # fetches every gap of the stored history between start and end, returns the number of candles stored
+    def backfill(self, pair, period, start, end=None):
+        period = int(period)
+        gaps = self.gaps(pair, period, start, end)
+        chunks = [chunk for first, last in gaps for chunk in self.chunks(first, last, self.chunk_candles * period, period)]
+        if not chunks:
+            self.failed = []
+            return 0
+        return self.merge(pair, period, self.run(pair, lambda first, last: self.fetch_candles(pair, period, first, last), chunks))
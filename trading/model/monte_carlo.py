@@ -0,0 +1,136 @@
+import multiprocessing
+
+import numpy as np
+
+from trading.model.candles import to_array
+from trading.model.trade_currency import TradeCurrency
+from trading.model.vector_backtest import VectorBacktest
+
+# base candle columns of the pair, handed to every worker once by the pool initializer instead of with each task
+_base_close = None
+_base_weighted_average = None
+
+
+def _init_worker(close, weighted_average):
+    global _base_close, _base_weighted_average
+    _base_close = close
+    _base_weighted_average = weighted_average
+
+
+def _run_task(task):
+    monte_carlo, index, count, seed = task
+    rng = np.random.default_rng([seed, index])
+    return monte_carlo.simulate(rng, count, _base_close, _base_weighted_average)
+
+
+class MonteCarloResult:
+    profit = None
+    max_drawdown = None
+    total_return = None
+
+    def __init__(self, profit, max_drawdown, total_return):
+        self.profit = profit
+        self.max_drawdown = max_drawdown
+        self.total_return = total_return
+
+    def summary(self, percentiles=(5, 25, 50, 75, 95)):
+        return {
+            'paths': len(self.profit),
+            'profitable': float(np.mean(self.profit > 0)),
+            'profit': dict(zip(percentiles, np.percentile(self.profit, percentiles))),
+            'max_drawdown': dict(zip(percentiles, np.percentile(self.max_drawdown, percentiles))),
+            'total_return': dict(zip(percentiles, np.nanpercentile(self.total_return, percentiles)))
+        }
+
+
+# Robustness check of a strategy: every path is a perturbed copy of the pair's candle history, run through the
+# vectorized backtest. A path starts up to max_shift bars later than the history, its close-to-close returns are
+# block bootstrapped (block_size 0 keeps the historical order) and it pays its own fee and slippage.
+class MonteCarlo:
+    strategy = 'EmaBandStrategy'
+    currency = None
+    replay_bars = 288
+    block_size = 48
+    max_shift = 288
+    fee = 0.0025
+    fee_jitter = 0.0005
+    max_slippage = 0.001
+    period = 300
+    main_init = 0.0
+    alt_init = 0.0
+    paths_per_task = 100
+    processes = None
+
+    close = None
+    weighted_average = None
+
+    def __init__(self, candles, currency, main_init, alt_init, strategy='EmaBandStrategy', period=300, processes=None):
+        assert isinstance(currency, TradeCurrency)
+        candles = to_array(candles)
+        self.close = np.ascontiguousarray(candles['close'])
+        self.weighted_average = np.ascontiguousarray(candles['weightedAverage'])
+        self.currency = currency
+        self.main_init = main_init
+        self.alt_init = alt_init
+        self.strategy = strategy
+        self.period = period
+        self.processes = processes
+
+        # fail here rather than in every worker
+        VectorBacktest(strategy)
+        if len(self.close) - self.max_shift <= self.replay_bars + self.block_size:
+            raise ValueError('Not enough candles for a Monte Carlo run of ' + currency.currency_pair)
+
+    # the base columns travel through the pool initializer, not with the pickled settings of every task
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('close', None)
+        state.pop('weighted_average', None)
+        return state
+
+    def run(self, paths, seed=0):
+        tasks = []
+        for index, first in enumerate(range(0, paths, self.paths_per_task)):
+            tasks.append((self, index, min(self.paths_per_task, paths - first), seed))
+
+        pool = multiprocessing.Pool(self.processes, initializer=_init_worker, initargs=(self.close, self.weighted_average))
+        try:
+            results = pool.map(_run_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        return MonteCarloResult(*[np.concatenate(column) for column in zip(*results)])
+
+    def simulate(self, rng, count, close, weighted_average):
+        close_paths, weighted_average_paths = self.generate(rng, count, close, weighted_average)
+
+        fee = np.clip(rng.uniform(self.fee - self.fee_jitter, self.fee + self.fee_jitter, count), 0, None)
+        slippage = rng.uniform(0, self.max_slippage, count)
+        start = close_paths.shape[-1] - self.replay_bars
+
+        performance = VectorBacktest(self.strategy).run(close_paths, weighted_average_paths, self.currency.ann_order_size,
+                                                        self.main_init, self.alt_init, start, fee, slippage, self.period)
+        return performance.profit, performance.max_drawdown, performance.total_return
+
+    def generate(self, rng, count, close, weighted_average):
+        length = len(close) - self.max_shift
+        shifts = rng.integers(0, self.max_shift + 1, count)
+
+        if self.block_size <= 0:
+            source = shifts[:, None] + np.arange(length)
+            return close[source], weighted_average[source]
+
+        # returns[i] is the log return from bar i to bar i + 1; blocks are drawn from each path's own window
+        returns = np.diff(np.log(close))
+        blocks = -(-(length - 1) // self.block_size)
+        starts = rng.integers(0, length - self.block_size, (count, blocks)) + shifts[:, None]
+        steps = (starts[:, :, None] + np.arange(self.block_size)).reshape(count, -1)[:, :length - 1]
+
+        log_path = np.concatenate((np.zeros((count, 1)), np.cumsum(returns[steps], axis=-1)), axis=-1)
+        close_paths = close[shifts][:, None] * np.exp(log_path)
+
+        # every generated bar keeps the weighted average / close ratio of the bar its return came from
+        source = np.concatenate((shifts[:, None], steps + 1), axis=-1)
+        weighted_average_paths = close_paths * (weighted_average / close)[source]
+        return close_paths, weighted_average_paths
@@ -5,6 +5,7 @@ class Order:
     amount = 0.0    # LTC
     currency_pair = 'BTC_LTC'
     fee = 0.0
+    date = 0        # unix time of the backtest candle it filled on
 
     def __init__(self, order, currency_pair):
         assert isinstance(order, dict)
@@ -46,3 +47,8 @@ class Order:
 
     def is_sell(self):
         return self.total > 0
+
+    # the order in the exchange's trade history format, amounts unsigned
+    def to_dict(self):
+        return {'type': self.type(), 'orderNumber': self.number, 'rate': self.rate, 'total': abs(self.total),
+                'amount': abs(self.amount), 'fee': self.fee}
@@ -2,29 +2,61 @@ from trading.esssencial.api import Poloniex
 from trading.model.order import Order
 from datetime import datetime, timedelta
 
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# the window of `minutes` before now as (first date kept, start of the request): the request starts at `cursor`,
+# the date of the newest trade already known, as long as that lies within the window
+def history_window(now, minutes, cursor=None):
+    start = now - timedelta(minutes=minutes)
+    first = start.strftime(DATE_FORMAT)
+    if cursor is not None and cursor >= first:
+        start = datetime.strptime(cursor, DATE_FORMAT)
+    return first, start
+
+
+# trades answered from `start` on (newest first) replace the known ones from that date on, the older known ones stay
+# as long as they are within the window
+def merge_trades(trades, known, first, start):
+    since = start.strftime(DATE_FORMAT)
+    return list(trades) + [trade for trade in known if first <= str(trade['date']) < since]
+
 
 class OrderHistory:
     poloniex = None
     orders = []
+    trades = []     # the raw trade history, newest first
+    cursor = None   # date of the newest known trade, later updates only request trades from then on
     currency_pair = ''
     minutes = 0
 
-    def __init__(self, poloniex, minutes, currency_pair='BTC_LTC'):
+    # `history` is the pair's trade history when it was already fetched, e.g. by an AccountDispatcher
+    def __init__(self, poloniex, minutes, currency_pair='BTC_LTC', history=None):
         assert isinstance(poloniex, Poloniex)
         self.poloniex = poloniex
         self.minutes = max(minutes, 5)
         self.currency_pair = currency_pair
-        self.update()
+        self.orders = []
+        self.trades = []
+        if history is None:
+            self.update()
+        else:
+            self.load(history)
 
     def update(self):
-        self.orders.clear()
-        start = datetime.now() - timedelta(minutes=self.minutes)
+        first, start = history_window(self.poloniex.now(), self.minutes, self.cursor)
         history = self.poloniex.returnAccountTradeHistory(self.currency_pair, start)
         if 'error' in history:
             raise RuntimeError(history['error'])
         else:
-            for order in history:
-                self.orders.insert(0, Order(order, self.currency_pair))
+            self.load(merge_trades(history, self.trades, first, start))
+
+    def load(self, history):
+        self.trades = list(history)
+        self.cursor = str(self.trades[0]['date']) if len(self.trades) else None
+        self.orders = []
+        for order in self.trades:
+            self.orders.insert(0, Order(order, self.currency_pair))
 
     def get_order(self, order_number):
         assert isinstance(order_number, str)
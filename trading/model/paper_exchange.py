@@ -0,0 +1,414 @@
+from bisect import insort
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from trading.esssencial.api import Poloniex, createTimeStamp
+from trading.esssencial.decode import trade_decoder
+from trading.model.candles import to_records
+
+# orders are plain lists, indexed by these fields
+NUMBER, ACCOUNT, PAIR, SIDE, PRICE, AMOUNT, REMAINING, PLACED = range(8)
+
+# quantities below this count as filled
+DUST = 1e-12
+
+
+class BookSide:
+    levels = None   # price -> deque of resting orders, oldest first
+    keys = None     # ascending sort keys of the prices, the best price is the last one
+    sign = 1
+
+    def __init__(self, sign):
+        self.levels = {}
+        self.keys = []
+        self.sign = sign
+
+    def best(self):
+        return self.keys[-1] * self.sign if self.keys else None
+
+    def add(self, order):
+        level = self.levels.get(order[PRICE])
+        if level is None:
+            level = self.levels[order[PRICE]] = deque()
+            insort(self.keys, order[PRICE] * self.sign)
+        level.append(order)
+
+    def remove(self, order):
+        level = self.levels[order[PRICE]]
+        level.remove(order)
+        if not level:
+            self.drop(order[PRICE])
+
+    def drop(self, price):
+        del self.levels[price]
+        self.keys.remove(price * self.sign)
+
+    # take up to `amount` (None for no limit) from the levels at or better than `price`, in price-time priority.
+    # returns the (resting order, quantity, price) fills, filled orders leave the book
+    def take(self, price, amount):
+        fills = []
+        keys = self.keys
+        limit = price * self.sign
+        while keys and keys[-1] >= limit and (amount is None or amount > DUST):
+            level_price = keys[-1] * self.sign
+            level = self.levels[level_price]
+            while level and (amount is None or amount > DUST):
+                order = level[0]
+                quantity = order[REMAINING] if amount is None else min(amount, order[REMAINING])
+                fills.append((order, quantity, level_price))
+                order[REMAINING] -= quantity
+                if amount is not None:
+                    amount -= quantity
+                if order[REMAINING] <= DUST:
+                    level.popleft()
+            if not level:
+                del self.levels[level_price]
+                keys.pop()
+        return fills
+
+    def depth(self, count):
+        return [[self.keys[i] * self.sign, sum(order[REMAINING] for order in self.levels[self.keys[i] * self.sign])]
+                for i in range(len(self.keys) - 1, max(len(self.keys) - 1 - count, -1), -1)]
+
+
+class OrderBook:
+    bids = None
+    asks = None
+
+    def __init__(self):
+        self.bids = BookSide(1)
+        self.asks = BookSide(-1)
+
+    def side(self, side):
+        return self.bids if side == 'buy' else self.asks
+
+    def opposite(self, side):
+        return self.asks if side == 'buy' else self.bids
+
+
+class PaperAccount:
+    name = ''
+    balances = None     # available, without what open orders hold
+    held = None
+    trades = None       # (time, pair, order number, side, price, quantity, fee rate)
+
+    def __init__(self, name, balances):
+        self.name = name
+        self.balances = dict((currency, float(amount)) for currency, amount in balances.items())
+        self.held = {}
+        self.trades = []
+
+
+# In-memory paper trading exchange: one limit order book per pair, price-time priority, partial fills, maker
+# and taker fees. The market itself is driven by recorded trades (market_trade) or candles (feed_candles and
+# advance), which move the external quote and fill the resting orders they cross. An incoming order first
+# takes the book's levels up to the external quote, then the external quote itself (unlimited depth) if its
+# limit reaches it, and rests with what is left. PaperPoloniex puts an account of it behind the Poloniex interface.
+class PaperExchange:
+    maker_fee = 0.0015
+    taker_fee = 0.0025
+    spread = 0.001
+    period = 300
+    history = 200
+
+    books = None
+    accounts = None
+    orders = None
+    last = None
+    candles = None
+    cursor = None
+    market_trades = None
+    next_number = 1
+    clock = 0.0
+
+    def __init__(self, maker_fee=0.0015, taker_fee=0.0025, spread=0.001):
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.spread = spread
+        self.books = {}
+        self.accounts = {}
+        self.orders = {}
+        self.last = {}
+        self.candles = {}
+        self.cursor = {}
+        self.market_trades = {}
+
+    def book(self, pair):
+        book = self.books.get(pair)
+        if book is None:
+            book = self.books[pair] = OrderBook()
+            self.market_trades[pair] = deque(maxlen=self.history)
+        return book
+
+    def add_account(self, name, balances):
+        self.accounts[name] = PaperAccount(name, balances)
+        return self.accounts[name]
+
+    def client(self, name):
+        return PaperPoloniex(self, name)
+
+    # external quote around the last market trade
+    def quote(self, pair):
+        last = self.last.get(pair)
+        if last is None:
+            return None, None
+        return last * (1 - self.spread / 2), last * (1 + self.spread / 2)
+
+    def ticker(self, pair):
+        book = self.book(pair)
+        bid, ask = self.quote(pair)
+        best_bid = book.bids.best()
+        best_ask = book.asks.best()
+        if best_bid is not None and (bid is None or best_bid > bid):
+            bid = best_bid
+        if best_ask is not None and (ask is None or best_ask < ask):
+            ask = best_ask
+        return bid or 0.0, ask or 0.0, self.last.get(pair, 0.0)
+
+    def place(self, name, pair, side, rate, amount):
+        account = self.accounts[name]
+        main, alt = pair.split('_')
+        if side == 'buy':
+            currency, cost = main, rate * amount
+        else:
+            currency, cost = alt, amount
+        if account.balances.get(currency, 0.0) < cost - DUST:
+            return None, 'Not enough ' + currency + '.'
+
+        account.balances[currency] -= cost
+        account.held[currency] = account.held.get(currency, 0.0) + cost
+
+        number = self.next_number
+        self.next_number += 1
+        order = [number, name, pair, side, rate, amount, amount, self.clock]
+        book = self.book(pair)
+
+        # the book's levels up to the external quote, then the quote
+        bid, ask = self.quote(pair)
+        external = ask if side == 'buy' else bid
+        limit = rate if external is None else (min(rate, external) if side == 'buy' else max(rate, external))
+        for resting, quantity, price in book.opposite(side).take(limit, amount):
+            self.fill(resting, quantity, price, True)
+            self.fill(order, quantity, price, False)
+            if resting[REMAINING] <= DUST:
+                self.orders.pop(resting[NUMBER], None)
+
+        if order[REMAINING] > DUST and external is not None and (rate >= external if side == 'buy' else rate <= external):
+            self.fill(order, order[REMAINING], external, False)
+
+        if order[REMAINING] > DUST:
+            book.side(side).add(order)
+            self.orders[number] = order
+        return order, None
+
+    def cancel(self, name, number):
+        order = self.orders.get(number)
+        if order is None or order[ACCOUNT] != name:
+            return False
+        del self.orders[number]
+        self.book(order[PAIR]).side(order[SIDE]).remove(order)
+        self.release(order)
+        return True
+
+    def release(self, order):
+        account = self.accounts[order[ACCOUNT]]
+        main, alt = order[PAIR].split('_')
+        currency, amount = (main, order[REMAINING] * order[PRICE]) if order[SIDE] == 'buy' else (alt, order[REMAINING])
+        account.held[currency] -= amount
+        account.balances[currency] += amount
+
+    # settle `quantity` of `order` at `price`; buy fees are paid in the alt, sell fees in the main currency.
+    # resting (maker) orders were already reduced by the book side that matched them
+    def fill(self, order, quantity, price, maker):
+        account = self.accounts[order[ACCOUNT]]
+        main, alt = order[PAIR].split('_')
+        fee = self.maker_fee if maker else self.taker_fee
+        if order[SIDE] == 'buy':
+            account.held[main] -= order[PRICE] * quantity
+            account.balances[main] += (order[PRICE] - price) * quantity
+            account.balances[alt] = account.balances.get(alt, 0.0) + quantity * (1 - fee)
+        else:
+            account.held[alt] -= quantity
+            account.balances[main] = account.balances.get(main, 0.0) + price * quantity * (1 - fee)
+        if not maker:
+            order[REMAINING] -= quantity
+        account.trades.append((self.clock, order[PAIR], order[NUMBER], order[SIDE], price, quantity, fee))
+
+    # a trade of the outside market at `rate`: it fills the resting orders it crosses, up to `amount` per side
+    # (None for no limit), and becomes the new last price
+    def market_trade(self, pair, rate, amount=None, timestamp=None):
+        if timestamp is not None:
+            self.clock = timestamp
+        book = self.book(pair)
+        for side in (book.bids, book.asks):
+            if side.keys:
+                for resting, quantity, price in side.take(rate, amount):
+                    self.fill(resting, quantity, price, True)
+                    if resting[REMAINING] <= DUST:
+                        self.orders.pop(resting[NUMBER], None)
+        self.last[pair] = rate
+        self.market_trades[pair].append((self.clock, rate, amount))
+
+    # candle history of a pair; the first `warmup` candles are visible right away, advance() plays the rest
+    def feed_candles(self, pair, candles, warmup=288):
+        self.book(pair)
+        self.candles[pair] = candles
+        self.cursor[pair] = min(warmup, len(candles))
+        if self.cursor[pair]:
+            last = candles[self.cursor[pair] - 1]
+            self.last[pair] = float(last['close'])
+            self.clock = max(self.clock, float(last['date'] + self.period))
+
+    # play the next candle of every fed pair as open, low/high, high/low, close trades. false when all are done
+    def advance(self):
+        played = False
+        for pair, candles in self.candles.items():
+            index = self.cursor[pair]
+            if index >= len(candles):
+                continue
+            candle = candles[index]
+            volume = float(candle['quoteVolume']) / 4
+            if candle['close'] >= candle['open']:
+                path = (candle['open'], candle['low'], candle['high'], candle['close'])
+            else:
+                path = (candle['open'], candle['high'], candle['low'], candle['close'])
+            for i, price in enumerate(path):
+                self.market_trade(pair, float(price), volume, float(candle['date'] + self.period * (i + 1) / 4.0))
+            self.cursor[pair] = index + 1
+            played = True
+        return played
+
+    # the played candles of `period` seconds, a multiple of the fed ones, which are aggregated like the exchange
+    # does: the last one is still forming until all of its fed candles were played
+    def chart(self, pair, start=None, end=None, period=300):
+        period = int(period)
+        if period % self.period:
+            raise ValueError('Chart period ' + str(period) + ' is not a multiple of ' + str(self.period))
+        candles = self.candles[pair][:self.cursor[pair]]
+        first = 0 if start is None else np.searchsorted(candles['date'], start // period * period, side='left')
+        last = len(candles) if end is None else np.searchsorted(candles['date'], end // period * period + period, side='left')
+        candles = candles[first:last]
+        if period == self.period or not len(candles):
+            return candles
+        return self.aggregate(candles, period)
+
+    @staticmethod
+    def aggregate(candles, period):
+        buckets = candles['date'] // period * period
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(candles)])) - 1
+
+        result = np.empty(len(starts), dtype=candles.dtype)
+        result['date'] = buckets[starts]
+        result['open'] = candles['open'][starts]
+        result['close'] = candles['close'][ends]
+        result['high'] = np.maximum.reduceat(candles['high'], starts)
+        result['low'] = np.minimum.reduceat(candles['low'], starts)
+        result['volume'] = np.add.reduceat(candles['volume'], starts)
+        quote_volume = np.add.reduceat(candles['quoteVolume'], starts)
+        result['quoteVolume'] = quote_volume
+        traded = np.add.reduceat(candles['weightedAverage'] * candles['quoteVolume'], starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['weightedAverage'] = np.where(quote_volume > 0, traded / quote_volume, result['close'])
+        return result
+
+
+# one account of a PaperExchange behind the Poloniex interface, for LiveDataSource, OrderHistory and Trade
+class PaperPoloniex(Poloniex):
+    exchange = None
+    name = ''
+
+    def __init__(self, exchange, name):
+        super().__init__('', '')
+        assert isinstance(exchange, PaperExchange)
+        self.exchange = exchange
+        self.name = name
+
+    def now(self):
+        return datetime.utcfromtimestamp(self.exchange.clock)
+
+    def returnTicker(self):
+        ticker = {}
+        for pair in self.exchange.books:
+            bid, ask, last = self.exchange.ticker(pair)
+            ticker[pair] = {'last': repr(last), 'highestBid': repr(bid), 'lowestAsk': repr(ask), 'isFrozen': '0'}
+        return ticker
+
+    def returnChartData(self, currencyPair, period=300, start=None, end=None, columns=False):
+        if currencyPair not in self.exchange.candles:
+            return {'error': 'Invalid currency pair.'}
+        candles = self.exchange.chart(currencyPair, createTimeStamp(start), createTimeStamp(end), period)
+        return candles.copy() if columns else to_records(candles)
+
+    def returnTradeHistory(self, currencyPair, start=None, end=None, columns=False):
+        trades = []
+        for timestamp, rate, amount in self.exchange.market_trades.get(currencyPair, ()):
+            trades.insert(0, {'date': datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+                              'type': 'buy', 'rate': repr(rate), 'amount': repr(amount or 0.0),
+                              'total': repr(rate * (amount or 0.0))})
+        return trade_decoder.from_records(trades) if columns else trades
+
+    def returnOrderBook(self, currencyPair, depth=50):
+        book = self.exchange.book(currencyPair)
+        return {'bids': book.bids.depth(depth), 'asks': book.asks.depth(depth), 'isFrozen': '0'}
+
+    def returnBalances(self):
+        account = self.exchange.accounts[self.name]
+        return dict((currency, "{0:.8f}".format(amount)) for currency, amount in account.balances.items())
+
+    # currencyPair 'all' answers every market like the exchange, {pair: [orders]}
+    def returnOpenOrders(self, currencyPair):
+        if currencyPair == 'all':
+            return dict((pair, self.returnOpenOrders(pair)) for pair in self.exchange.books)
+        return [{'orderNumber': str(order[NUMBER]), 'type': order[SIDE], 'rate': "{0:.8f}".format(order[PRICE]),
+                 'amount': "{0:.8f}".format(order[REMAINING]), 'total': "{0:.8f}".format(order[PRICE] * order[REMAINING])}
+                for order in self.exchange.orders.values() if order[ACCOUNT] == self.name and order[PAIR] == currencyPair]
+
+    # the account's fills of the pair, newest first, merged per order like the exchange reports them
+    def returnAccountTradeHistory(self, currencyPair, start):
+        start = createTimeStamp(start) or 0
+        orders = {}
+        for timestamp, pair, number, side, price, quantity, fee in self.exchange.accounts[self.name].trades:
+            if pair != currencyPair or timestamp < start:
+                continue
+            trade = orders.get(number)
+            if trade is None:
+                trade = orders[number] = {'orderNumber': str(number), 'type': side, 'category': 'exchange',
+                                          'date': timestamp, 'amount': 0.0, 'total': 0.0, 'fee': fee}
+            trade['date'] = timestamp
+            trade['amount'] += quantity
+            trade['total'] += price * quantity
+
+        trades = []
+        for trade in sorted(orders.values(), key=lambda trade: trade['date'], reverse=True):
+            trade['rate'] = trade['total'] / trade['amount']
+            trade['date'] = datetime.utcfromtimestamp(trade['date']).strftime('%Y-%m-%d %H:%M:%S')
+            trades.append(trade)
+        return trades
+
+    def returnAllAccountTradeHistory(self, start, limit=10000):
+        history = {}
+        for pair in set(trade[1] for trade in self.exchange.accounts[self.name].trades):
+            trades = self.returnAccountTradeHistory(pair, start)[:limit]
+            if trades:
+                history[pair] = trades
+        return history if history else []
+
+    def buy(self, currencyPair, rate, amount):
+        return self.place(currencyPair, 'buy', rate, amount)
+
+    def sell(self, currencyPair, rate, amount):
+        return self.place(currencyPair, 'sell', rate, amount)
+
+    def place(self, pair, side, rate, amount):
+        order, error = self.exchange.place(self.name, pair, side, float(rate), float(amount))
+        if error is not None:
+            return {'error': error}
+        return {'orderNumber': str(order[NUMBER])}
+
+    def cancel(self, currencyPair, orderNumber):
+        if self.exchange.cancel(self.name, int(orderNumber)):
+            return {'success': 1}
+        return {'success': 0, 'error': 'Invalid order number, or you are not the person who placed the order.'}
@@ -0,0 +1,233 @@
+import numpy as np
+
+from trading.model.order import Order
+
+
+# Performance metrics of one backtest, or of many at once: every input may carry a leading "runs" axis
+# (shape (runs, bars) and (runs, fills)) and every metric is then an array with one value per run.
+# positions are valued from the candle closes, so no ticker request is needed to score a run.
+class Performance:
+    equity = None
+    returns = None
+    profit = 0.0
+    main_profit = 0.0
+    alt_profit = 0.0
+    total_return = 0.0
+    sharpe = 0.0
+    sortino = 0.0
+    max_drawdown = 0.0
+    exposure = 0.0
+    turnover = 0.0
+    traded = 0.0
+    fees = 0.0
+    fills = 0
+    winning = 0     # round trips, see RunningPerformance.add_fill
+    losing = 0
+
+    def __init__(self, main, alt, close, main_init, alt_init, fill_totals=None, fill_fees=None, period=300):
+        main = np.asarray(main, dtype=np.float64)
+        alt = np.asarray(alt, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        main_init = np.asarray(main_init, dtype=np.float64)
+        alt_init = np.asarray(alt_init, dtype=np.float64)
+
+        self.equity = self.equity_curve(main, alt, close)
+        self.returns = self.period_returns(self.equity)
+
+        # same definition the backtest report always used: the alt difference is valued at the last close
+        last_close = close[..., -1]
+        self.main_profit = main[..., -1] - main_init
+        self.alt_profit = alt[..., -1] - alt_init
+        self.profit = self.alt_profit * last_close + self.main_profit
+
+        start_equity = main_init + alt_init * close[..., 0]
+        self.total_return = self.equity[..., -1] / np.where(start_equity != 0, start_equity, np.nan) - 1
+
+        periods_per_year = 365 * 24 * 60 * 60 / float(period)
+        self.sharpe = self.sharpe_ratio(self.returns, periods_per_year)
+        self.sortino = self.sortino_ratio(self.returns, periods_per_year)
+        self.max_drawdown = self.drawdown(self.equity).max(axis=-1)
+
+        # share of the equity held in the alt currency, averaged over the run
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.exposure = np.nan_to_num(np.abs(alt * close) / self.equity).mean(axis=-1)
+
+        if fill_totals is None:
+            fill_totals = np.zeros(main.shape[:-1] + (0,))
+        if fill_fees is None:
+            fill_fees = np.zeros_like(fill_totals)
+        fill_totals = np.asarray(fill_totals, dtype=np.float64)
+        fill_fees = np.asarray(fill_fees, dtype=np.float64)
+
+        self.traded = np.abs(fill_totals).sum(axis=-1)
+        self.fees = fill_fees.sum(axis=-1)
+        self.fills = np.count_nonzero(fill_totals, axis=-1)
+        mean_equity = self.equity.mean(axis=-1)
+        self.turnover = self.traded / np.where(mean_equity != 0, mean_equity, np.nan)
+
+    # the metrics of a backtest data source, kept up to date bar by bar however often it was extended
+    @classmethod
+    def from_source(cls, source):
+        assert source.performance.bars > 0
+        return source.performance
+
+    @staticmethod
+    def fill_arrays(orders):
+        totals = np.empty(len(orders))
+        fees = np.empty(len(orders))
+        for i, order in enumerate(orders):
+            assert isinstance(order, Order)
+            totals[i] = order.total
+            fees[i] = order.fee
+        return totals, fees
+
+    @staticmethod
+    def equity_curve(main, alt, close):
+        return main + alt * close
+
+    @staticmethod
+    def period_returns(equity):
+        previous = equity[..., :-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(equity, axis=-1) / previous
+        return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    @staticmethod
+    def drawdown(equity):
+        peak = np.maximum.accumulate(equity, axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.nan_to_num(1 - equity / peak)
+
+    @staticmethod
+    def sharpe_ratio(returns, periods_per_year):
+        if returns.shape[-1] == 0:
+            return np.zeros(returns.shape[:-1])
+        std = returns.std(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = returns.mean(axis=-1) / std * np.sqrt(periods_per_year)
+        return np.where(std > 0, ratio, 0.0)
+
+    @staticmethod
+    def sortino_ratio(returns, periods_per_year):
+        if returns.shape[-1] == 0:
+            return np.zeros(returns.shape[:-1])
+        downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=-1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = returns.mean(axis=-1) / downside * np.sqrt(periods_per_year)
+        return np.where(downside > 0, ratio, 0.0)
+
+
+# Performance of a backtest that keeps running: every bar and fill updates a few running sums, so scoring a backtest
+# extended with new bars costs O(new bars). The metrics are the ones Performance computes over the same bars and
+# fills, only the equity and return series are not kept.
+class RunningPerformance(Performance):
+    period = 300
+    bars = 0
+    main = 0.0
+    alt = 0.0
+    close = 0.0
+    start_equity = 0.0
+    last_equity = 0.0
+    peak = 0.0
+    return_mean = 0.0       # running mean and sum of squared deviations of the returns (welford)
+    return_deviations = 0.0
+    downside_squares = 0.0
+    exposure_sum = 0.0
+    equity_sum = 0.0
+    last_fill = None        # (total, price per alt unit fees included) of the previous fill
+
+    def __init__(self, main_init, alt_init, period=300):
+        self.main_init = float(main_init)
+        self.alt_init = float(alt_init)
+        self.main = self.main_init
+        self.alt = self.alt_init
+        self.period = period
+        self.max_drawdown = 0.0
+        self.traded = 0.0
+        self.fees = 0.0
+        self.fills = 0
+
+    # a fill on the other side of the previous one closes a round trip, which won when it sold above or bought back
+    # below the previous fill's price, fees included
+    def add_fill(self, total, fee, amount):
+        self.traded += abs(total)
+        self.fees += fee
+        self.fills += total != 0
+        if not amount:
+            return
+
+        price = (abs(total) + (fee if total < 0 else -fee)) / abs(amount)
+        if self.last_fill is not None and (total > 0) != (self.last_fill[0] > 0):
+            won = price > self.last_fill[1] if total > 0 else price < self.last_fill[1]
+            self.winning += won
+            self.losing += not won
+        self.last_fill = (total, price)
+
+    # balances after the strategy traded on the bar, valued at its close
+    def add_bar(self, main, alt, close):
+        equity = main + alt * close
+        if self.bars == 0:
+            self.start_equity = self.main_init + self.alt_init * close
+            self.peak = equity
+        else:
+            returned = (equity - self.last_equity) / self.last_equity if self.last_equity else 0.0
+            returned = returned if np.isfinite(returned) else 0.0
+            count = self.bars
+            delta = returned - self.return_mean
+            self.return_mean += delta / count
+            self.return_deviations += delta * (returned - self.return_mean)
+            self.downside_squares += min(returned, 0.0) ** 2
+            self.peak = max(self.peak, equity)
+
+        drawdown = 1 - equity / self.peak if self.peak else 0.0
+        self.max_drawdown = max(self.max_drawdown, drawdown if np.isfinite(drawdown) else 0.0)
+        exposure = abs(alt * close) / equity if equity else 0.0
+        self.exposure_sum += exposure if np.isfinite(exposure) else 0.0
+        self.equity_sum += equity
+        self.bars += 1
+        self.main, self.alt, self.close, self.last_equity = main, alt, close, equity
+
+    @property
+    def main_profit(self):
+        return self.main - self.main_init
+
+    @property
+    def alt_profit(self):
+        return self.alt - self.alt_init
+
+    @property
+    def profit(self):
+        return self.alt_profit * self.close + self.main_profit
+
+    @property
+    def total_return(self):
+        return self.last_equity / self.start_equity - 1 if self.start_equity else np.nan
+
+    @property
+    def sharpe(self):
+        returns = self.bars - 1
+        std = np.sqrt(self.return_deviations / returns) if returns > 0 else 0.0
+        return self.return_mean / std * np.sqrt(self.periods_per_year()) if std > 0 else 0.0
+
+    @property
+    def sortino(self):
+        returns = self.bars - 1
+        downside = np.sqrt(self.downside_squares / returns) if returns > 0 else 0.0
+        return self.return_mean / downside * np.sqrt(self.periods_per_year()) if downside > 0 else 0.0
+
+    @property
+    def win_rate(self):
+        trades = self.winning + self.losing
+        return self.winning / float(trades) if trades else 0.0
+
+    @property
+    def exposure(self):
+        return self.exposure_sum / self.bars if self.bars else 0.0
+
+    @property
+    def turnover(self):
+        mean_equity = self.equity_sum / self.bars if self.bars else 0.0
+        return self.traded / mean_equity if mean_equity else np.nan
+
+    def periods_per_year(self):
+        return 365 * 24 * 60 * 60 / float(self.period)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from trading.esssencial.api import Poloniex
+from trading.esssencial.journal import journal, PREFETCH
+from trading.esssencial.logger import log
+from trading.model.account_dispatcher import AccountDispatcher
+
+
+# Moves the bulk of the live pairs' fetching ahead of the candle close. `lead` seconds before a candle of `period`
+# seconds closes, prefetch() refreshes the shared account state and pulls every pair's chart including the forming
+# candle. The updates run `settle` seconds after the close: one ticker call serves all of them and each pair only
+# requests the candles from its last one on, so the time from close to decision is one small request per pair.
+class Prefetcher:
+    period = 300
+    lead = 20.0
+    settle = 2.0
+    ticker_max_age = 10.0   # updates between closes, e.g. adaptive ones, get a ticker at most this old
+    poloniex = None
+    account = None
+    sources = None
+    last_ticker = None
+    ticker_time = 0.0
+    lock = None
+
+    def __init__(self, poloniex, period=300, lead=20.0, settle=2.0, account=None):
+        assert isinstance(poloniex, Poloniex)
+        assert account is None or isinstance(account, AccountDispatcher)
+        self.poloniex = poloniex
+        self.period = period
+        self.lead = lead
+        self.settle = settle
+        self.account = account
+        self.sources = []
+        self.lock = threading.Lock()
+
+    def add(self, source):
+        source.prefetcher = self
+        self.sources.append(source)
+
+    def remove(self, source):
+        if source in self.sources:
+            self.sources.remove(source)
+
+    # unix time of the last candle close
+    def last_close(self, now=None):
+        now = time.time() if now is None else now
+        return now // self.period * self.period
+
+    def since_close(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.last_close(now)
+
+    # seconds until the updates after the next close are due
+    def until_update(self, now=None):
+        now = time.time() if now is None else now
+        return self.last_close(now) + self.period + self.settle - now
+
+    # seconds until the next prefetch is due
+    def until_prefetch(self, now=None):
+        now = time.time() if now is None else now
+        due = self.last_close(now) + self.period - self.lead
+        return due - now if due > now else due + self.period - now
+
+    def prefetch(self):
+        journal.record(PREFETCH, {'pairs': [source.currency.currency_pair for source in self.sources]})
+        if self.account is not None:
+            try:
+                self.account.refresh(force=True)
+            except Exception as e:
+                log('Prefetching the account failed: ' + str(e.args))
+        for source in self.sources:
+            try:
+                source.prefetch()
+            except Exception as e:
+                log('Prefetching ' + source.currency.currency_pair + ' failed: ' + str(e.args))
+
+    # the ticker of all markets, fetched once for the updates after a candle close
+    def ticker(self):
+        with self.lock:
+            now = time.time()
+            if self.last_ticker is None or self.ticker_time < self.last_close(now) + self.settle or \
+                    now - self.ticker_time > self.ticker_max_age:
+                ticker = self.poloniex.returnTicker()
+                if 'error' in ticker:
+                    return ticker
+                self.last_ticker = ticker
+                self.ticker_time = time.time()
+            return self.last_ticker
@@ -0,0 +1,74 @@
+import numpy as np
+
+from trading.model.candles import CANDLE_DTYPE, CANDLE_FIELDS
+
+
+# Fixed capacity buffer of typed records that keeps the newest `capacity` of them. Every record is written twice,
+# `capacity` slots apart, so the buffered records are always one contiguous slice of the storage: view() is a
+# numpy view ready for indicator math, oldest first, without copying or reordering. Memory stays at two times
+# capacity records however many are appended.
+class RingBuffer:
+    capacity = 0
+    storage = None
+    start = 0       # storage index of the oldest record
+    size = 0
+
+    def __init__(self, capacity, dtype=CANDLE_DTYPE):
+        assert capacity > 0
+        self.capacity = int(capacity)
+        self.storage = np.zeros(2 * self.capacity, dtype=dtype)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.storage.nbytes
+
+    def view(self):
+        return self.storage[self.start:self.start + self.size]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    def extend(self, records):
+        records = records[-self.capacity:]
+        for record in records:
+            end = (self.start + self.size) % self.capacity
+            self.storage[end] = record
+            self.storage[end + self.capacity] = record
+            if self.size < self.capacity:
+                self.size += 1
+            else:
+                self.start = (self.start + 1) % self.capacity
+
+    # drops the last records until only the ones before `count` from the end are left
+    def truncate(self, count):
+        self.size = max(self.size - count, 0)
+
+
+# ring of candles sorted by date
+class CandleRing(RingBuffer):
+    def __init__(self, capacity):
+        super().__init__(capacity, CANDLE_DTYPE)
+
+    def last_date(self):
+        return int(self.storage['date'][self.start + self.size - 1]) if self.size else 0
+
+    # newer candles replace the buffered ones from their first date on, e.g. a candle that was still forming
+    def merge(self, candles):
+        if not len(candles):
+            return
+        dates = self.view()['date']
+        self.truncate(len(dates) - int(np.searchsorted(dates, candles['date'][0], side='left')))
+        self.extend(candles)
+
+    # the newest candle as a dict like the exchange returns it
+    def last(self):
+        if not self.size:
+            return None
+        candle = self.storage[self.start + self.size - 1]
+        return dict(zip(CANDLE_FIELDS, candle.tolist()))
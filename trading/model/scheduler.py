@@ -0,0 +1,87 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+from trading.esssencial.exporter import exporter
+from trading.model.prefetch import Prefetcher
+
+
+# Polls each live pair as often as a decision is likely instead of every update_interval. A pair is polled again
+# before its price can plausibly reach the strategy's trigger: with the trigger `distance` away and a volatility
+# of `sigma` per candle (recent log returns), the price moves about sigma * sqrt(t / period) in t seconds, so the
+# next update is due when that reaches distance / `safety`. Pairs far inside their band wait long, pairs near a
+# trigger or in a volatility spike come back quickly, all within [min_interval, max_interval]. Strategies that
+# cannot tell their distance keep `interval`.
+# When the intervals of all pairs together would need more than `budget` api calls per minute (each update costing
+# `cost` calls) every interval is stretched by the same factor, so the calls go where decisions are likely.
+# With a Prefetcher, intervals of a candle or more end right after a candle close.
+class AdaptiveScheduler:
+    interval = 300.0
+    min_interval = 30.0
+    max_interval = 1800.0
+    budget = 60.0
+    cost = 2.0
+    safety = 3.0
+    window = 24         # candles of returns the volatility is measured over
+    prefetcher = None
+    intervals = None    # desired interval per pair, before the budget stretch
+    lock = None
+
+    def __init__(self, interval=300.0, budget=60.0, min_interval=30.0, max_interval=1800.0, cost=2.0, prefetcher=None):
+        assert prefetcher is None or isinstance(prefetcher, Prefetcher)
+        self.interval = interval
+        self.budget = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cost = cost
+        self.prefetcher = prefetcher
+        self.intervals = {}
+        self.lock = threading.Lock()
+
+    # log return standard deviation per candle over the last `window` candles, None without enough of them
+    def volatility(self, closes):
+        if len(closes) < 3:
+            return None
+        closes = np.asarray(closes[-self.window - 1:], dtype=np.float64)
+        closes = closes[closes > 0]
+        if len(closes) < 3:
+            return None
+        return float(np.std(np.diff(np.log(closes))))
+
+    def desired(self, algorithm):
+        distance = algorithm.trigger_distance()
+        sigma = self.volatility(algorithm.data_source.column('close'))
+        if distance is None or sigma is None or math.isnan(distance):
+            return self.interval
+        if sigma <= 0:
+            return self.max_interval
+
+        period = algorithm.data_source.update_interval * 60
+        interval = period * (distance / (self.safety * sigma)) ** 2
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    # factor all intervals are stretched by to stay within the budget
+    def stretch(self):
+        demand = sum(self.cost * 60.0 / interval for interval in self.intervals.values())
+        return max(1.0, demand / self.budget) if self.budget else 1.0
+
+    # a pair that stopped trading no longer counts against the budget
+    def remove(self, pair):
+        with self.lock:
+            self.intervals.pop(pair, None)
+
+    # seconds until the algorithm's next update
+    def delay(self, algorithm):
+        pair = algorithm.data_source.currency.currency_pair
+        with self.lock:
+            self.intervals[pair] = self.desired(algorithm)
+            interval = self.intervals[pair] * self.stretch()
+        exporter.set('poll_interval_seconds', (('pair', pair),), interval)
+
+        if self.prefetcher is None or interval < self.prefetcher.period:
+            return interval
+        now = time.time()
+        due = self.prefetcher.last_close(now + interval) + self.prefetcher.settle
+        return due - now if due > now else self.prefetcher.until_update(now)
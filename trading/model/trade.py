@@ -1,11 +1,14 @@
 import time
 
 from trading import Poloniex, OrderHistory
+from trading.esssencial.instrumentation import instrumentation
+from trading.esssencial.journal import journal, ORDER, FILL
 
 
 class Trade:
     buy_order = None
     sell_order = None
+    poll_interval = 1  # seconds between order history polls while waiting for a fill
 
     def __init__(self, buy=None, sell=None):
         self.buy_order = buy
@@ -14,6 +17,7 @@ class Trade:
     def buy(self, poloniex, rate, amount, currency_pair='BTC_LTC'):
         assert isinstance(poloniex, Poloniex)
 
+        journal.record(ORDER, {'pair': currency_pair, 'type': 'buy', 'rate': rate, 'amount': amount})
         order = poloniex.buy(currencyPair=currency_pair, rate=rate, amount=amount)
         if 'error' in order:
             raise RuntimeError(order['error'])
@@ -23,17 +27,21 @@ class Trade:
             # wait until the trade propagates before returning.
             order = None
             loops = 0
-            while order is None and loops < 300:
-                time.sleep(1)
-                order = OrderHistory(poloniex, minutes=60, currency_pair=currency_pair).get_order(order_number)
-                loops += 1
+            with instrumentation.span('fill_wait', currency_pair):
+                while order is None and loops < 300:
+                    time.sleep(self.poll_interval)
+                    order = OrderHistory(poloniex, minutes=60, currency_pair=currency_pair).get_order(order_number)
+                    loops += 1
 
             self.buy_order = order
+            if order is not None:
+                journal.record(FILL, dict(order.to_dict(), pair=currency_pair))
             return self.buy_order
 
     def sell(self, poloniex, rate, amount, currency_pair='BTC_LTC'):
         assert isinstance(poloniex, Poloniex)
 
+        journal.record(ORDER, {'pair': currency_pair, 'type': 'sell', 'rate': rate, 'amount': amount})
         order = poloniex.sell(currencyPair=currency_pair, rate=rate, amount=amount)
         if 'error' in order:
             raise RuntimeError(order['error'])
@@ -43,12 +51,15 @@ class Trade:
             # wait until the trade propagates before returning.
             order = None
             loops = 0
-            while order is None and loops < 300:
-                time.sleep(1)
-                order = OrderHistory(poloniex, minutes=60, currency_pair=currency_pair).get_order(order_number)
-                loops += 1
+            with instrumentation.span('fill_wait', currency_pair):
+                while order is None and loops < 300:
+                    time.sleep(self.poll_interval)
+                    order = OrderHistory(poloniex, minutes=60, currency_pair=currency_pair).get_order(order_number)
+                    loops += 1
 
             self.sell_order = order
+            if order is not None:
+                journal.record(FILL, dict(order.to_dict(), pair=currency_pair))
             return self.sell_order
 
     def complete(self):
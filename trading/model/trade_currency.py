@@ -1,3 +1,6 @@
+import math
+
+
 class TradeCurrency:
     alt_percent = 0.0
     main_percent = 0.0
@@ -12,6 +15,8 @@ class TradeCurrency:
     initial_sell_rate = 0.0
     ann_order_size = 0.0
     ann_threshold = 0.0
+    backtest_main_balance = 0.0
+    backtest_alt_balance = 0.0
 
     def __init__(self, currency_pair,
                  alt_percent,
@@ -25,7 +30,9 @@ class TradeCurrency:
                  initial_buy_rate,
                  initial_sell_rate,
                  ann_order_size,
-                 ann_threshold):
+                 ann_threshold,
+                 backtest_main_balance=0.0,
+                 backtest_alt_balance=0.0):
 
         self.alt_percent = alt_percent
         self.main_percent = main_percent
@@ -40,6 +47,8 @@ class TradeCurrency:
         self.initial_sell_rate = initial_sell_rate
         self.ann_order_size = ann_order_size
         self.ann_threshold = ann_threshold
+        self.backtest_main_balance = backtest_main_balance
+        self.backtest_alt_balance = backtest_alt_balance
 
     @classmethod
     def from_tc(cls, tc):
@@ -56,6 +65,22 @@ class TradeCurrency:
                             initial_buy_rate=tc.initial_buy_rate,
                             initial_sell_rate=tc.initial_sell_rate,
                             ann_order_size=tc.ann_order_size,
-                            ann_threshold=tc.ann_threshold)
+                            ann_threshold=tc.ann_threshold,
+                            backtest_main_balance=tc.backtest_main_balance,
+                            backtest_alt_balance=tc.backtest_alt_balance)
         return ntc
 
+    # raises ValueError for settings the strategies cannot trade with, e.g. a mistyped value in the config
+    def validate(self):
+        symbols = self.currency_pair.split('_')
+        if len(symbols) != 2 or not all(symbols):
+            raise ValueError('Invalid currency pair ' + repr(self.currency_pair))
+        for name, value in vars(self).items():
+            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+                raise ValueError(self.currency_pair + ' ' + name + ' is not a number')
+        for name in ('alt_percent', 'main_percent', 'new_order_threshold'):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(self.currency_pair + ' ' + name + ' must be between 0 and 100 percent')
+        for name in ('min_main', 'min_alt', 'trading_history_in_minutes', 'ann_order_size'):
+            if getattr(self, name) < 0:
+                raise ValueError(self.currency_pair + ' ' + name + ' must not be negative')
@@ -0,0 +1,125 @@
+import numpy as np
+
+from trading.model.candles import to_array
+from trading.model.performance import Performance
+
+
+# vectorized twin of IDataSource.ema: value t equals ema(values[:t + 1], window), nan until 2 * window bars exist.
+# works along the last axis, so a (paths, bars) array is handled in one pass
+def ema_series(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    out = np.full(values.shape, np.nan)
+    if n < 2 * window:
+        return out
+
+    c = 2.0 / (window + 1)
+    decay = 1 - c
+    t = np.arange(2 * window - 1, n)
+
+    # the sma of values[t - 2w + 1 .. t - w] seeds the ema, like data[-window * 2:-window] does
+    cumulative = np.concatenate((np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1)), axis=-1)
+    seed = (cumulative[..., t - window + 1] - cumulative[..., t - 2 * window + 1]) / window
+
+    ema = seed * decay ** window
+    for lag in range(window):
+        ema += c * decay ** (window - 1 - lag) * values[..., t - window + 1 + lag]
+    out[..., 2 * window - 1:] = ema
+    return out
+
+
+# EmaBandStrategy: buy below the ema24/ema48 band, sell above it. +1 is a buy signal, -1 a sell signal
+def ema_band_signals(close, weighted_average):
+    ema24 = ema_series(weighted_average, 24)
+    ema48 = ema_series(weighted_average, 48)
+
+    signals = np.zeros(np.shape(close), dtype=np.int8)
+    with np.errstate(invalid='ignore'):
+        signals[close < np.fmin(ema24, ema48)] = 1
+        signals[close > np.fmax(ema24, ema48)] = -1
+    return signals
+
+
+# only a signal opposite to the previous order trades, the same rule as
+# "self.current_order is None or self.current_order.is_sell()" in the strategies
+def alternate(signals):
+    n = signals.shape[-1]
+    index = np.where(signals != 0, np.arange(n), -1)
+    index = np.maximum.accumulate(index, axis=-1)
+    state = np.take_along_axis(signals, np.maximum(index, 0), axis=-1)
+    state[index < 0] = 0
+
+    previous = np.zeros_like(state)
+    previous[..., 1:] = state[..., :-1]
+    return np.where((signals != 0) & (signals != previous), signals, 0).astype(np.int8)
+
+
+# Runs a strategy over whole candle columns at once instead of bar by bar. Orders are ann_order_size units
+# filled at the close, like BacktestDataSource, plus an optional slippage. The min_main/min_alt reserve
+# checks are not modelled, so balances may go negative where the loop backtest would have skipped an order.
+# every strategy here must order exactly like its loop version, check() compares the two on the same candles.
+# strategies that place no orders (SimpleStrategy only records its signals) have no twin, their runs would all be flat
+class VectorBacktest:
+    strategies = {
+        'EmaBandStrategy': ema_band_signals
+    }
+
+    # bars of history a signal needs before the first traded bar
+    warmup = {
+        'EmaBandStrategy': 2 * 48
+    }
+
+    strategy = ''
+
+    def __init__(self, strategy='EmaBandStrategy'):
+        if strategy not in self.strategies:
+            raise NotImplementedError('No vectorized version of ' + strategy + ', only of ' + ', '.join(sorted(self.strategies)))
+        self.strategy = strategy
+
+    def signals(self, close, weighted_average):
+        return self.strategies[self.strategy](close, weighted_average)
+
+    # close/weighted_average are (bars,) or (paths, bars); fee and slippage may hold one value per path.
+    # only bars from `start` on are traded and scored, the bars before it are indicator warm-up
+    def run(self, close, weighted_average, order_size, main_init, alt_init, start, fee=0.0025, slippage=0.0, period=300):
+        # bars older than the warm-up cannot change a signal, so they are never looked at
+        first = max(0, start - self.warmup[self.strategy])
+        close = np.asarray(close, dtype=np.float64)[..., first:]
+        weighted_average = np.asarray(weighted_average, dtype=np.float64)[..., first:]
+        signals = self.signals(close, weighted_average)[..., start - first:]
+        close = close[..., start - first:]
+
+        trades = alternate(signals)
+        fee = self.per_path(fee, close)
+        slippage = self.per_path(slippage, close)
+
+        rate = close * (1 + slippage * trades)
+        totals = -trades * order_size * rate
+        fees = np.abs(totals) * fee
+
+        main = main_init + np.cumsum(totals - fees, axis=-1)
+        alt = alt_init + np.cumsum(trades * float(order_size), axis=-1)
+        return Performance(main, alt, close, main_init, alt_init, totals, fees, period)
+
+    # runs the twin over the candles a finished loop backtest replayed and raises if it did not fill the same orders
+    # and end with the same balances
+    def check(self, source):
+        candles = to_array(source.backtest_data)
+        start = len(candles) - source.data_offset
+        vector = self.run(candles['close'], candles['weightedAverage'], source.currency.ann_order_size,
+                          source.main_balance_init, source.alt_balance_init, start, 0.0025, 0.0, source.update_interval * 60)
+        loop = Performance.from_source(source)
+
+        if int(vector.fills) != int(loop.fills) or not np.isclose(vector.main_profit, loop.main_profit) \
+                or not np.isclose(vector.alt_profit, loop.alt_profit):
+            raise ValueError('The vectorized ' + self.strategy + ' does not trade like the loop backtest on '
+                             + source.currency.currency_pair + ': ' + str(int(vector.fills)) + ' fills, profit '
+                             + str(float(vector.profit)) + ' against ' + str(int(loop.fills)) + ' fills, profit '
+                             + str(float(loop.profit)))
+
+    @staticmethod
+    def per_path(value, close):
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim > 0 and close.ndim > 1:
+            value = value.reshape(value.shape + (1,))
+        return value
@@ -0,0 +1,292 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from trading.esssencial import logger
+from trading.esssencial.compression import ResponseStream
+from trading.esssencial.decode import chart_decoder
+from trading.model.candles import to_records
+from trading.model.data_source import IDataSource, BacktestDataSource
+from trading.model.order import Order
+from trading.model.paper_exchange import PaperExchange, NUMBER, ACCOUNT, REMAINING
+from trading.model.performance import Performance
+from trading.model.trade_currency import TradeCurrency
+from trading.model.vector_backtest import VectorBacktest, ema_series
+from trading.trade_algorithms import SimpleStrategy, EmaBandStrategy, MyTradeAlgorithm, ANN
+from trading.tools.synthetic import SyntheticMarket, SyntheticPoloniex
+
+# Offline benchmark suite on synthetic candles. `run` writes a machine readable result file, `compare` reports
+# every benchmark that got slower than a baseline by more than the threshold and exits with 1 if any did.
+#   python -m trading.tools.benchmark run --output benchmarks/baseline.json
+#   python -m trading.tools.benchmark run --output benchmarks/current.json
+#   python -m trading.tools.benchmark compare benchmarks/baseline.json benchmarks/current.json
+
+strategies = [SimpleStrategy, MyTradeAlgorithm, ANN]
+history_lengths = [2016, 8928, 35712]
+replay_bars = 288
+
+
+def benchmark_currency():
+    return TradeCurrency(currency_pair='USDT_BTC', alt_percent=0.05, main_percent=0.1, min_buy_profit=0.0,
+                         min_sell_profit=0.0, new_order_threshold=0.0, min_main=-1e12, min_alt=-1e12,
+                         trading_history_in_minutes=43200, initial_buy_rate=0, initial_sell_rate=0,
+                         ann_order_size=0.01, ann_threshold=0.014)
+
+
+def backtest_source(bars, seed):
+    exchange = SyntheticPoloniex(seed=seed, bars=bars, balances={'USDT': 100000, 'BTC': 100})
+    return BacktestDataSource(benchmark_currency(), exchange, None, 0, 5)
+
+
+# best of `repeat` rounds of `number` calls, as calls per second
+def rate(func, number, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def result(value, unit, higher_is_better=True):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def indicator_benchmarks(seed):
+    source = backtest_source(576 + replay_bars, seed)
+    values = [candle['weightedAverage'] for candle in source.data]
+    source.update()
+    ann = ANN(source, 0)
+
+    return {
+        'indicator.sma_48': result(rate(lambda: IDataSource.sma(values, 48), 20000), 'calls/s'),
+        'indicator.ema_24': result(rate(lambda: source.ema(values, 24), 20000), 'calls/s'),
+        'indicator.ema_48': result(rate(lambda: source.ema(values, 48), 20000), 'calls/s'),
+        'indicator.ann': result(rate(ann.ann, 2000), 'calls/s'),
+        'indicator.ema_series_48': result(rate(lambda: ema_series(values, 48), 2000) * len(values), 'bars/s')
+    }
+
+
+# latency of a single strategy update(), which includes the BacktestDataSource.update() it triggers
+def strategy_benchmarks(seed):
+    results = {}
+    for strategy in strategies:
+        source = backtest_source(8928, seed)
+        algorithm = strategy(source, 0)
+        latencies = []
+        while True:
+            start = time.perf_counter()
+            running = algorithm.update()
+            latencies.append(time.perf_counter() - start)
+            if not running:
+                break
+
+        latencies = np.array(latencies[:-1]) * 1e6
+        name = 'update.' + strategy.__name__
+        results[name + '.p50'] = result(float(np.percentile(latencies, 50)), 'us', False)
+        results[name + '.p95'] = result(float(np.percentile(latencies, 95)), 'us', False)
+    return results
+
+
+def backtest_benchmarks(seed):
+    results = {}
+    for bars in history_lengths:
+        source = backtest_source(bars, seed)
+        algorithm = EmaBandStrategy(source, 0)
+        start = time.perf_counter()
+        while algorithm.update():
+            continue
+        results['backtest.loop.' + str(bars)] = result(replay_bars / (time.perf_counter() - start), 'bars/s')
+
+        vector = VectorBacktest('EmaBandStrategy')
+        vector.check(source)
+
+        candles = SyntheticMarket(seed=seed).generate(bars)
+        elapsed = 1 / rate(lambda: vector.run(candles['close'], candles['weightedAverage'], 0.01, 100000, 100, 0), 5, 3)
+        results['backtest.vector.' + str(bars)] = result(bars / elapsed, 'bars/s')
+    return results
+
+
+def decode_benchmarks(seed):
+    records = to_records(SyntheticMarket(seed=seed).generate(8928))
+    payload = json.dumps(records).encode('utf-8')
+    elapsed = 1 / rate(lambda: json.loads(payload.decode('utf-8')), 5, 3)
+    streamed = 1 / rate(lambda: chart_decoder.decode(io.BytesIO(payload), len(payload)), 5, 3)
+    compressed = gzip.compress(payload, 6)
+    inflated = 1 / rate(lambda: chart_decoder.decode(ResponseStream(io.BytesIO(compressed), 'gzip'), len(payload)), 5, 3)
+    return {
+        'decode.chart_json': result(len(payload) / elapsed / 1e6, 'MB/s'),
+        'decode.chart_json_bars': result(len(records) / elapsed, 'bars/s'),
+        'decode.chart_columns': result(len(payload) / streamed / 1e6, 'MB/s'),
+        'decode.chart_gzip_columns': result(len(payload) / inflated / 1e6, 'MB/s'),
+        'decode.chart_gzip_ratio': result(len(payload) / len(compressed), 'x')
+    }
+
+
+def order_log_benchmarks(seed):
+    rng = np.random.default_rng(seed)
+    trades = []
+    for i in range(5000):
+        amount = rng.uniform(0.01, 1)
+        rate_ = rng.uniform(1000, 2000)
+        trades.append({'type': 'buy' if i % 2 else 'sell', 'orderNumber': str(i), 'rate': str(rate_),
+                       'total': str(amount * rate_), 'amount': str(amount), 'fee': '0.0025'})
+
+    def parse():
+        orders = []
+        for trade in trades:
+            orders.insert(0, Order(trade, 'USDT_BTC'))
+        return orders
+
+    orders = parse()
+    results = {
+        'orders.parse': result(rate(parse, 5, 3) * len(trades), 'orders/s'),
+        'orders.fill_arrays': result(rate(lambda: Performance.fill_arrays(orders), 20, 3) * len(orders), 'orders/s')
+    }
+
+    # log() hands the line to the background writer, which is pointed at a scratch file for the run
+    stdout = sys.stdout
+    default_writer = logger.writer
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            logger.writer = logger.LogWriter(os.path.join(directory, 'log.txt'))
+            sys.stdout = open(os.devnull, 'w')
+            results['log.message'] = result(rate(lambda: logger.log('An error occurred: benchmark'), 2000, 3), 'messages/s')
+            logger.writer.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            logger.writer = default_writer
+    return results
+
+
+# order events (placements, cancels, market trades) the paper exchange handles per second
+def matching_benchmarks(seed):
+    rng = np.random.default_rng(seed)
+    count = 100000
+    accounts = rng.integers(0, 10, count).astype(str)
+    sides = np.where(rng.random(count) < 0.5, 'buy', 'sell')
+    prices = np.round(100 + rng.normal(0, 0.1, count), 2)
+    amounts = rng.uniform(0.1, 2, count)
+    trades = np.round(100 + rng.normal(0, 0.05, count // 10), 2)
+
+    def run():
+        exchange = PaperExchange()
+        exchange.market_trade('USDT_BTC', 100.0, None, 0)
+        for i in range(10):
+            exchange.add_account(str(i), {'USDT': 1e12, 'BTC': 1e12})
+        resting = []
+        for i in range(count):
+            order, error = exchange.place(accounts[i], 'USDT_BTC', sides[i], float(prices[i]), float(amounts[i]))
+            if order[REMAINING] > 0:
+                resting.append(order)
+            if i % 3 == 0 and resting:
+                order = resting.pop()
+                exchange.cancel(order[ACCOUNT], order[NUMBER])
+            if i % 10 == 0:
+                exchange.market_trade('USDT_BTC', float(trades[i // 10]), 5.0)
+
+    events = count + count // 3 + count // 10
+    return {'matching.events': result(rate(run, 1, 3) * events, 'events/s')}
+
+
+suites = {
+    'indicators': indicator_benchmarks,
+    'strategies': strategy_benchmarks,
+    'backtest': backtest_benchmarks,
+    'decode': decode_benchmarks,
+    'orders': order_log_benchmarks,
+    'matching': matching_benchmarks
+}
+
+
+def run(selected, seed):
+    results = {}
+    for name in selected:
+        print('running ' + name + '...')
+        results.update(suites[name](seed))
+
+    return {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'seed': seed,
+        'results': results
+    }
+
+
+# relative change of every benchmark, positive is better
+def compare(baseline, current, threshold):
+    rows = []
+    for name in sorted(current['results']):
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]
+        new = current['results'][name]
+        if old['value'] == 0 or new['value'] == 0:
+            continue
+
+        if new['higher_is_better']:
+            change = new['value'] / old['value'] - 1
+        else:
+            change = old['value'] / new['value'] - 1
+        rows.append((name, old['value'], new['value'], new['unit'], change, change < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for indicators, strategies and backtests.')
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--output', default=os.path.join('benchmarks', 'current.json'))
+    run_parser.add_argument('--suite', action='append', choices=sorted(suites), help='default: all suites')
+    run_parser.add_argument('--seed', type=int, default=0)
+
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='tolerated slowdown (default: 10%%)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        report = run(args.suite or sorted(suites), args.seed)
+        directory = os.path.dirname(args.output)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+        for name in sorted(report['results']):
+            print("{0:40}{1:>16.2f} {2}".format(name, report['results'][name]['value'], report['results'][name]['unit']))
+
+    elif args.command == 'compare':
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+
+        rows = compare(baseline, current, args.threshold)
+        for name, old, new, unit, change, regression in rows:
+            print("{0:40}{1:>16.2f}{2:>16.2f} {3:10}{4:>+8.1f}%{5}".format(name, old, new, unit, change * 100, '  REGRESSION' if regression else ''))
+
+        regressions = [row for row in rows if row[-1]]
+        print(str(len(regressions)) + ' regression(s) beyond ' + "{0:.0f}".format(args.threshold * 100) + '%')
+        sys.exit(1 if regressions else 0)
+
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+import gzip
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from trading.esssencial.exporter import ThreadingHTTPServer
+from trading.model.candles import to_records
+from trading.tools.synthetic import SyntheticPoloniex
+
+
+class FakeAccount:
+    key = ''
+    secret = ''
+    balances = None
+    open_orders = None
+    trades = None   # (pair, unix time, trade history entry)
+    last_nonce = 0
+    lock = None
+
+    def __init__(self, key, secret, balances):
+        self.key = key
+        self.secret = secret
+        self.balances = dict((currency, float(amount)) for currency, amount in balances.items())
+        self.open_orders = []
+        self.trades = []
+        self.lock = threading.Lock()
+
+
+# Local stand-in for the poloniex `public` and `tradingApi` endpoints, for load tests of the live path without
+# money or network. Candles come from synthetic markets ending now, private calls are checked against the
+# account's secret and nonce like the exchange does, and orders fill at their own rate after `fill_delay`
+# seconds (or stay open with 1 - fill_probability). Faults, drawn per request:
+#   latency, jitter    seconds added before every answer
+#   error_rate         {"error": ...} body
+#   http_error_rate    502 status
+#   timeout_rate       answer only after `hang` seconds, past the client's timeout
+#   rate_limit         calls per second per api key (per address for public calls), 0 disables
+# bodies are gzipped for clients that accept it unless `compress` is off
+class FakePoloniexServer:
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    http_error_rate = 0.0
+    timeout_rate = 0.0
+    hang = 15.0
+    rate_limit = 0
+    fill_delay = 0.0
+    fill_probability = 1.0
+    fee = 0.0025
+    spread = 0.001
+    period = 300
+    compress = True
+
+    default_balance = 1000.0
+    markets = None
+    currencies = None
+    accounts = None
+    clients = None
+    counts = None
+    rng = None
+    lock = None
+    server = None
+    next_order = 1
+
+    def __init__(self, pairs, bars=2016, seed=0, default_balance=1000.0):
+        self.accounts = {}
+        self.clients = {}
+        self.counts = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.default_balance = default_balance
+
+        # histories end at the current candle so the bot's "last 24 hours" requests find data
+        start = datetime.utcfromtimestamp(int(time.time()) // self.period * self.period - (bars - 1) * self.period)
+        exchange = SyntheticPoloniex(seed=seed, bars=bars, start=start)
+        self.markets = dict((pair, exchange.candles(pair, self.period)) for pair in pairs)
+        self.currencies = sorted(set(currency for pair in pairs for currency in pair.split('_')))
+
+    def add_account(self, key, secret, balances=None):
+        if balances is None:
+            balances = dict((currency, self.default_balance) for currency in self.currencies)
+        self.accounts[key] = FakeAccount(key, secret, balances)
+        return self.accounts[key]
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://' + host + ':' + str(port)
+
+    def start(self, port=0, host='127.0.0.1'):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path != '/public':
+                    self.send_error(404)
+                    return
+                fake.answer(self, dict(parse_qsl(parts.query)), self.client_address[0], fake.public)
+
+            def do_POST(self):
+                if self.path != '/tradingApi':
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                key = self.headers.get('Key', '')
+                sign = self.headers.get('Sign', '')
+                fake.answer(self, dict(parse_qsl(body.decode('utf-8'))), key,
+                            lambda params: fake.private(key, sign, body, params))
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+        self.server = Server((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever, name='fake-poloniex')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def answer(self, handler, params, client, handle):
+        self.count('requests')
+        with self.lock:
+            draw = self.rng.random()
+            delay = self.latency + self.rng.uniform(0, self.jitter) if self.latency or self.jitter else 0.0
+
+        if delay:
+            time.sleep(delay)
+
+        if draw < self.timeout_rate:
+            self.count('timeouts')
+            time.sleep(self.hang)
+            result = {'error': 'Request timed out.'}
+        elif draw < self.timeout_rate + self.http_error_rate:
+            self.count('http_errors')
+            handler.send_error(502)
+            return
+        elif draw < self.timeout_rate + self.http_error_rate + self.error_rate:
+            self.count('error_bodies')
+            result = {'error': 'Internal error. Please try again.'}
+        elif not self.allow(client):
+            self.count('rate_limited')
+            result = {'error': 'Please do not make more than ' + str(self.rate_limit) + ' API calls per second.'}
+        else:
+            result = handle(params)
+
+        body = json.dumps(result).encode('utf-8')
+        compressed = self.compress and 'gzip' in handler.headers.get('Accept-Encoding', '')
+        if compressed:
+            body = gzip.compress(body, 6)
+        try:
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/json')
+            if compressed:
+                handler.send_header('Content-Encoding', 'gzip')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up waiting
+            pass
+
+    # token bucket per client, refilled at rate_limit per second
+    def allow(self, client):
+        if not self.rate_limit:
+            return True
+        now = time.time()
+        with self.lock:
+            tokens, refilled = self.clients.get(client, (float(self.rate_limit), now))
+            tokens = min(float(self.rate_limit), tokens + (now - refilled) * self.rate_limit)
+            allowed = tokens >= 1
+            self.clients[client] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def ticker(self, pair):
+        close = float(self.markets[pair]['close'][-1])
+        return {'last': repr(close), 'highestBid': repr(close * (1 - self.spread / 2)),
+                'lowestAsk': repr(close * (1 + self.spread / 2)), 'percentChange': '0.0',
+                'baseVolume': '0.0', 'quoteVolume': '0.0', 'isFrozen': '0'}
+
+    def public(self, params):
+        command = params.get('command')
+        if command == 'returnTicker':
+            return dict((pair, self.ticker(pair)) for pair in self.markets)
+
+        pair = params.get('currencyPair')
+        if command in ('returnChartData', 'returnTradeHistory', 'returnOrderBook') and pair not in self.markets:
+            return {'error': 'Invalid currency pair.'}
+
+        candles = self.markets.get(pair)
+        if command == 'returnChartData':
+            first = np.searchsorted(candles['date'], int(float(params.get('start', 0))), side='left')
+            last = np.searchsorted(candles['date'], int(float(params.get('end', 9999999999))), side='right')
+            period = int(params.get('period', self.period)) // self.period
+            return to_records(candles[first:last][::max(period, 1)])
+
+        if command == 'returnTradeHistory':
+            trades = []
+            for candle in to_records(candles[-200:]):
+                trades.insert(0, {'globalTradeID': candle['date'], 'tradeID': candle['date'], 'type': 'buy',
+                                  'date': datetime.utcfromtimestamp(candle['date']).strftime('%Y-%m-%d %H:%M:%S'),
+                                  'rate': repr(candle['close']), 'amount': repr(candle['quoteVolume']),
+                                  'total': repr(candle['volume'])})
+            return trades
+
+        if command == 'returnOrderBook':
+            ticker = self.ticker(pair)
+            return {'asks': [[ticker['lowestAsk'], 1.0]], 'bids': [[ticker['highestBid'], 1.0]], 'isFrozen': '0', 'seq': 0}
+
+        return {'error': 'Invalid command.'}
+
+    def private(self, key, sign, body, params):
+        self.count('private')
+        account = self.accounts.get(key)
+        if account is None or not hmac.compare_digest(hmac.new(account.secret.encode(), body, hashlib.sha512).hexdigest(), sign):
+            return {'error': 'Invalid API key/secret pair.'}
+
+        with account.lock:
+            nonce = int(params.get('nonce', 0))
+            if nonce <= account.last_nonce:
+                return {'error': 'Nonce must be greater than ' + str(account.last_nonce) + '. You provided ' + str(nonce) + '.'}
+            account.last_nonce = nonce
+
+            self.settle(account)
+            command = params.get('command')
+            pair = params.get('currencyPair')
+            if command == 'returnBalances':
+                return dict((currency, "{0:.8f}".format(amount)) for currency, amount in account.balances.items())
+            if command == 'returnOpenOrders':
+                if pair == 'all':
+                    return dict((market, [self.open_order(order) for order in account.open_orders if order['pair'] == market])
+                                for market in self.markets)
+                return [self.open_order(order) for order in account.open_orders if order['pair'] == pair]
+            if command == 'returnTradeHistory':
+                start = int(float(params.get('start', 0)))
+                trades = [(trade_pair, trade) for trade_pair, filled, trade in reversed(account.trades)
+                          if (pair == 'all' or trade_pair == pair) and filled >= start][:int(params.get('limit', 10000))]
+                if pair != 'all':
+                    return [trade for trade_pair, trade in trades]
+                # like the exchange: {pair: [trades]} of the markets with trades, an empty list without any
+                history = {}
+                for trade_pair, trade in trades:
+                    history.setdefault(trade_pair, []).append(trade)
+                return history if history else []
+            if command in ('buy', 'sell'):
+                return self.place(account, command, pair, float(params['rate']), float(params['amount']))
+            if command == 'cancelOrder':
+                orders = [order for order in account.open_orders if order['number'] == params.get('orderNumber')]
+                if not orders:
+                    return {'success': 0, 'error': 'Invalid order number, or you are not the person who placed the order.'}
+                account.open_orders.remove(orders[0])
+                return {'success': 1}
+            return {'error': 'Invalid command.'}
+
+    def place(self, account, type, pair, rate, amount):
+        if pair not in self.markets:
+            return {'error': 'Invalid currency pair.'}
+        main, alt = pair.split('_')
+        if type == 'buy' and account.balances.get(main, 0.0) < rate * amount:
+            return {'error': 'Not enough ' + main + '.'}
+        if type == 'sell' and account.balances.get(alt, 0.0) < amount:
+            return {'error': 'Not enough ' + alt + '.'}
+
+        with self.lock:
+            number = str(self.next_order)
+            self.next_order += 1
+            fills = self.rng.random() < self.fill_probability
+
+        order = {'number': number, 'type': type, 'pair': pair, 'rate': rate, 'amount': amount,
+                 'fill_at': time.time() + self.fill_delay if fills else None}
+        account.open_orders.append(order)
+        self.settle(account)
+        return {'orderNumber': number, 'resultingTrades': [trade for pair, filled, trade in account.trades if trade['orderNumber'] == number]}
+
+    # fill every open order that is due
+    def settle(self, account):
+        now = time.time()
+        for order in [order for order in account.open_orders if order['fill_at'] is not None and order['fill_at'] <= now]:
+            account.open_orders.remove(order)
+            main, alt = order['pair'].split('_')
+            total = order['rate'] * order['amount']
+            if order['type'] == 'buy':
+                account.balances[main] -= total
+                account.balances[alt] = account.balances.get(alt, 0.0) + order['amount'] * (1 - self.fee)
+            else:
+                account.balances[alt] -= order['amount']
+                account.balances[main] = account.balances.get(main, 0.0) + total * (1 - self.fee)
+
+            account.trades.append((order['pair'], int(now), {
+                'globalTradeID': order['number'], 'tradeID': order['number'], 'orderNumber': order['number'],
+                'date': datetime.utcfromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S'), 'type': order['type'],
+                'category': 'exchange', 'rate': "{0:.8f}".format(order['rate']), 'amount': "{0:.8f}".format(order['amount']),
+                'total': "{0:.8f}".format(total), 'fee': "{0:.8f}".format(self.fee)}))
+            self.count('fills')
+
+    @staticmethod
+    def open_order(order):
+        return {'orderNumber': order['number'], 'type': order['type'], 'rate': "{0:.8f}".format(order['rate']),
+                'amount': "{0:.8f}".format(order['amount']), 'total': "{0:.8f}".format(order['rate'] * order['amount'])}
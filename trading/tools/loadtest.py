@@ -0,0 +1,246 @@
+import argparse
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+
+import numpy as np
+
+from trading.esssencial.api import Poloniex
+from trading.esssencial.exporter import exporter, error_kind
+from trading.esssencial.instrumentation import instrumentation
+from trading.model.account_dispatcher import AccountDispatcher
+from trading.model.data_source import LiveDataSource
+from trading.model.trade import Trade
+from trading.model.trade_currency import TradeCurrency
+from trading.trade_algorithms import SimpleStrategy
+from trading.tools.benchmark import benchmark_currency
+from trading.tools.fake_exchange import FakePoloniexServer
+
+# Drives LiveDataSource, SimpleStrategy, OrderHistory and Trade against a local FakePoloniexServer with many
+# pairs and reports throughput, latency and what went wrong:
+#   python -m trading.tools.loadtest --pairs 300 --cycles 3 --workers 16 --latency 0.02 --error-rate 0.01
+
+
+# a client whose name lookups fail now and then, the one fault the server cannot produce itself. private calls
+# are sent one at a time so workers sharing the client cannot overtake each other's nonces
+class FlakyPoloniex(Poloniex):
+    dns_failure_rate = 0.0
+    rng = None
+    private_lock = None
+
+    def __init__(self, APIKey, Secret, base_url, dns_failure_rate=0.0, seed=0):
+        super().__init__(APIKey, Secret, base_url=base_url)
+        self.dns_failure_rate = dns_failure_rate
+        self.rng = random.Random(seed)
+        self.private_lock = threading.Lock()
+
+    def request(self, type, params, decoder=None):
+        if self.dns_failure_rate and self.rng.random() < self.dns_failure_rate:
+            raise URLError(socket.gaierror(socket.EAI_NONAME, 'Name or service not known'))
+        return super().request(type, params, decoder)
+
+    def _private(self, command, params={}):
+        with self.private_lock:
+            return super()._private(command, params)
+
+
+class LoadTest:
+    server = None
+    algorithms = None
+    locks = None
+    order_rate = 0.0
+    order_size = 0.001
+    workers = 8
+    latencies = None
+    failures = None
+    orders = 0
+    filled = 0
+    elapsed = 0.0
+    lock = None
+    rng = None
+
+    # shared_account trades every pair from one key through an AccountDispatcher that refreshes at most every
+    # account_max_age seconds, instead of one key and per pair private calls for each pair
+    def __init__(self, server, pairs, workers=8, order_rate=0.0, order_size=0.001, dns_failure_rate=0.0,
+                 timeout=10, seed=0, shared_account=False, account_max_age=1.0):
+        assert isinstance(server, FakePoloniexServer)
+        self.server = server
+        self.workers = workers
+        self.order_rate = order_rate
+        self.order_size = order_size
+        self.algorithms = {}
+        self.locks = {}
+        self.latencies = []
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+
+        account = None
+        if shared_account:
+            server.add_account('key', 'secret')
+            shared = FlakyPoloniex('key', 'secret', server.url, dns_failure_rate, seed)
+            shared.timeout = timeout
+            account = AccountDispatcher(shared, account_max_age)
+
+        for i, pair in enumerate(pairs):
+            if shared_account:
+                client = shared
+            else:
+                key = 'key-' + str(i)
+                secret = 'secret-' + str(i)
+                server.add_account(key, secret)
+                client = FlakyPoloniex(key, secret, server.url, dns_failure_rate, seed * 100003 + i)
+                client.timeout = timeout
+
+            currency = TradeCurrency.from_tc(benchmark_currency())
+            currency.currency_pair = pair
+            source = LiveDataSource(currency, client, None, 0, 5, account)
+            source.poll_interval = 0.05
+            self.algorithms[pair] = SimpleStrategy(source, 0)
+            self.locks[pair] = threading.Lock()
+
+    def cycle(self, pair):
+        algorithm = self.algorithms[pair]
+        with self.locks[pair]:
+            start = time.perf_counter()
+            try:
+                algorithm.update()
+                with self.lock:
+                    place = self.rng.random() < self.order_rate
+                    side = self.rng.random() < 0.5
+                if place:
+                    self.order(algorithm.data_source, side)
+            except Exception as e:
+                with self.lock:
+                    kind = error_kind(e)
+                    self.failures[kind] = self.failures.get(kind, 0) + 1
+            latency = time.perf_counter() - start
+
+        with self.lock:
+            self.latencies.append(latency)
+
+    # buys go through LiveDataSource like the bot's, sells through Trade
+    def order(self, source, buy):
+        with self.lock:
+            self.orders += 1
+        if buy:
+            order = source.buy(self.order_size)
+        else:
+            trade = Trade()
+            trade.poll_interval = source.poll_interval
+            order = trade.sell(source.exchange, source.highest_bid, self.order_size, source.currency.currency_pair)
+        if order is not None:
+            with self.lock:
+                self.filled += 1
+
+    def run(self, cycles):
+        tasks = [pair for _ in range(cycles) for pair in self.algorithms]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.workers) as pool:
+            list(pool.map(self.cycle, tasks))
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    def report(self):
+        template = "{0:28}{1:>14}{2:>14}{3:>14}{4:>14}"
+        latencies = np.array(self.latencies) * 1000
+        requests = self.server.counts.get('requests', 0)
+        private = self.server.counts.get('private', 0)
+        lines = [template.format('', 'count', 'per second', '', ''),
+                 template.format('cycles', len(latencies), "{0:.1f}".format(len(latencies) / self.elapsed), '', ''),
+                 template.format('requests', requests, "{0:.1f}".format(requests / self.elapsed), '', ''),
+                 template.format('private / cycle', private, "{0:.2f}".format(private / max(len(latencies), 1)), '', ''),
+                 template.format('orders / filled', self.orders, self.filled, '', ''),
+                 '',
+                 template.format('latency ms', 'p50', 'p95', 'p99', 'max')]
+        if len(latencies):
+            lines.append(template.format('cycle', *["{0:.1f}".format(value) for value in
+                                                    np.percentile(latencies, [50, 95, 99, 100])]))
+        with instrumentation.lock:
+            for (kind, name), histogram in sorted(instrumentation.histograms.items()):
+                if kind == 'api':
+                    lines.append(template.format('api ' + name, *["{0:.1f}".format(histogram.percentile(q) * 1000)
+                                                                  for q in (50, 95, 99)] + ["{0:.1f}".format(histogram.max * 1000)]))
+
+        errors = {}
+        transfer = {}
+        with exporter.lock:
+            for (name, labels), value in exporter.counters.items():
+                if name == 'api_errors_total':
+                    kind = dict(labels)['kind']
+                    errors[kind] = errors.get(kind, 0) + int(value)
+                if name in ('api_wire_bytes_total', 'api_body_bytes_total'):
+                    endpoint = dict(labels)['endpoint']
+                    wire, body = transfer.get(endpoint, (0, 0))
+                    transfer[endpoint] = (wire + int(value), body) if name == 'api_wire_bytes_total' else (wire, body + int(value))
+        lines.append('')
+        lines.append(template.format('transfer kB', 'wire', 'body', 'ratio', ''))
+        for endpoint in sorted(transfer):
+            wire, body = transfer[endpoint]
+            lines.append(template.format('  ' + endpoint, wire // 1024, body // 1024,
+                                         "{0:.1f}".format(body / wire) if wire else '', ''))
+        lines.append('')
+        lines.append(template.format('api errors', '', '', '', ''))
+        for kind in sorted(errors):
+            lines.append(template.format('  ' + kind, errors[kind], '', '', ''))
+        lines.append(template.format('failed cycles', sum(self.failures.values()), '', '', ''))
+        for kind in sorted(self.failures):
+            lines.append(template.format('  ' + kind, self.failures[kind], '', '', ''))
+        lines.append(template.format('server faults', '', '', '', ''))
+        for name in ('timeouts', 'http_errors', 'error_bodies', 'rate_limited'):
+            lines.append(template.format('  ' + name, self.server.counts.get(name, 0), '', '', ''))
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the live path against a local fake Poloniex.')
+    parser.add_argument('--pairs', type=int, default=100)
+    parser.add_argument('--cycles', type=int, default=3, help='update cycles per pair')
+    parser.add_argument('--workers', type=int, default=8, help='cycles running at the same time')
+    parser.add_argument('--bars', type=int, default=2016, help='candle history per pair')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server waits before answering')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds more')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of {"error": ...} answers')
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='share of 502 answers')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='share of answers later than --timeout')
+    parser.add_argument('--dns-rate', type=float, default=0.0, help='share of calls failing the name lookup')
+    parser.add_argument('--rate-limit', type=int, default=0, help='calls per second per key, 0 disables')
+    parser.add_argument('--order-rate', type=float, default=0.0, help='share of cycles that place an order')
+    parser.add_argument('--fill-delay', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=2.0, help='client timeout in seconds')
+    parser.add_argument('--shared-account', action='store_true', help='one key for all pairs behind an AccountDispatcher')
+    parser.add_argument('--account-max-age', type=float, default=1.0, help='seconds a shared account refresh is reused')
+    parser.add_argument('--no-compress', action='store_true', help='send and ask for uncompressed bodies')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    pairs = ['USDT_X' + str(i).zfill(4) for i in range(args.pairs)]
+    server = FakePoloniexServer(pairs, bars=args.bars, seed=args.seed)
+    server.latency = args.latency
+    server.jitter = args.jitter
+    server.error_rate = args.error_rate
+    server.http_error_rate = args.http_error_rate
+    server.timeout_rate = args.timeout_rate
+    server.hang = args.timeout + 1
+    server.rate_limit = args.rate_limit
+    server.fill_delay = args.fill_delay
+    server.compress = not args.no_compress
+    server.start()
+
+    instrumentation.enabled = True
+    try:
+        test = LoadTest(server, pairs, args.workers, args.order_rate, dns_failure_rate=args.dns_rate,
+                        timeout=args.timeout, seed=args.seed, shared_account=args.shared_account,
+                        account_max_age=args.account_max_age)
+        print('running ' + str(args.cycles) + ' cycles of ' + str(args.pairs) + ' pairs on ' + server.url)
+        for line in test.run(args.cycles).report():
+            print(line)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import cProfile
+import inspect
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from trading import trade_algorithms
+from trading.trade_algorithms import ITradeAlgorithm
+
+
+# (file, first line, function name) of every method of every strategy class, the key cProfile reports under
+def strategy_functions():
+    functions = {}
+    for name, cls in inspect.getmembers(trade_algorithms, inspect.isclass):
+        if not issubclass(cls, ITradeAlgorithm) or cls is ITradeAlgorithm:
+            continue
+        for attribute in cls.__dict__.values():
+            function = getattr(attribute, '__func__', attribute)
+            code = getattr(function, '__code__', None)
+            if code is not None:
+                functions[(code.co_filename, code.co_firstlineno, code.co_name)] = name
+    return functions
+
+
+# Profiles a whole backtest run without touching the strategies.
+#   deterministic  cProfile for exact per-function call counts and times
+#   sampling       only the stack sampler, much lower overhead on long runs
+#   allocations    the stack sampler plus tracemalloc, which slows every allocation down so the other modes skip it
+# every mode samples the main thread's stack for a flamegraph compatible collapsed stack file. The allocation
+# report diffs a tracemalloc snapshot taken at the start against one taken at the end, so even a short run lists
+# the bytes and blocks each line left behind, and snapshots in between keep the most each line held while running
+# (per tick lists, slices). Reports are written to `directory`.
+class BacktestProfiler:
+    modes = ['deterministic', 'sampling', 'allocations']
+
+    mode = 'deterministic'
+    directory = 'profile'
+    interval = 0.005
+    snapshot_interval = 0.5
+    top = 40
+
+    profile = None
+    stacks = None
+    allocations = None      # {(file, line): (bytes, blocks)} left behind by the run
+    held = None             # {(file, line): bytes} the most a line held at one snapshot
+    first_snapshot = None
+    samples = 0
+    snapshots = 0
+    started = 0.0
+    elapsed = 0.0
+    running = False
+    sampler = None
+    target = None
+    owners = None
+
+    def __init__(self, mode='deterministic', directory='profile', interval=0.005):
+        if mode not in self.modes:
+            raise ValueError('Unknown profile mode: ' + str(mode))
+        self.mode = mode
+        self.directory = directory
+        self.interval = interval
+        self.stacks = Counter()
+        self.allocations = {}
+        self.held = Counter()
+        self.owners = strategy_functions()
+
+    # file:Class.method for strategy methods on every python version, file:qualified name otherwise
+    def frame_name(self, code):
+        owner = self.owners.get((code.co_filename, code.co_firstlineno, code.co_name))
+        name = owner + '.' + code.co_name if owner is not None else getattr(code, 'co_qualname', code.co_name)
+        return os.path.basename(code.co_filename) + ':' + name
+
+    def start(self):
+        self.target = threading.get_ident()
+        self.running = True
+        if self.mode == 'allocations':
+            tracemalloc.start(1)
+            self.first_snapshot = self.snapshot()
+        self.sampler = threading.Thread(target=self.sample, name='profiler-sampler')
+        self.sampler.daemon = True
+        self.sampler.start()
+
+        self.started = time.perf_counter()
+        if self.mode == 'deterministic':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.elapsed = time.perf_counter() - self.started
+        self.running = False
+        self.sampler.join()
+        if self.first_snapshot is not None:
+            last_snapshot = self.snapshot()
+            self.hold(last_snapshot)
+            for statistic in last_snapshot.compare_to(self.first_snapshot, 'lineno'):
+                if statistic.size_diff > 0:
+                    frame = statistic.traceback[0]
+                    self.allocations[(frame.filename, frame.lineno)] = (statistic.size_diff, statistic.count_diff)
+            self.first_snapshot = None
+            tracemalloc.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        self.report()
+        return False
+
+    def sample(self):
+        next_snapshot = time.perf_counter() + self.snapshot_interval
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+            if self.first_snapshot is not None and time.perf_counter() >= next_snapshot:
+                self.hold(self.snapshot())
+                next_snapshot = time.perf_counter() + self.snapshot_interval
+
+            time.sleep(self.interval)
+
+    # the profiler's, tracemalloc's and the import machinery's allocations are not the run's
+    @staticmethod
+    def snapshot():
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__),
+                                                          tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')))
+
+    def hold(self, snapshot):
+        for statistic in snapshot.statistics('lineno'):
+            frame = statistic.traceback[0]
+            key = (frame.filename, frame.lineno)
+            self.held[key] = max(self.held[key], statistic.size)
+        self.snapshots += 1
+
+    def report(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self.write(os.path.join(self.directory, 'stacks.collapsed'),
+                   [stack + ' ' + str(count) for stack, count in sorted(self.stacks.items())])
+        self.write(os.path.join(self.directory, 'functions.txt'), self.function_report())
+        strategies = self.strategy_report()
+        self.write(os.path.join(self.directory, 'strategies.txt'), strategies)
+        allocations = self.allocation_report() if self.mode == 'allocations' else []
+        if allocations:
+            self.write(os.path.join(self.directory, 'allocations.txt'), allocations)
+
+        print('\nProfile (' + self.mode + ', ' + "{0:.2f}".format(self.elapsed) + 's) written to ' + self.directory)
+        for line in strategies[:8] + allocations[:8]:
+            print(line)
+
+    @staticmethod
+    def write(path, lines):
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def function_report(self):
+        if self.profile is not None:
+            lines = []
+
+            class Stream:
+                def write(self, text):
+                    lines.append(text)
+
+            stats = pstats.Stats(self.profile, stream=Stream())
+            stats.sort_stats('cumulative').print_stats(self.top)
+            stats.sort_stats('tottime').print_stats(self.top)
+            return ''.join(lines).splitlines()
+
+        # self and total sample counts per function
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        template = "{0:>8}{1:>8}{2:>8}{3:>8}  {4}"
+        lines = [template.format('self', 'self%', 'total', 'total%', 'function')]
+        for name, count in total.most_common(self.top):
+            lines.append(template.format(own[name], "{0:.1f}".format(own[name] * 100.0 / max(self.samples, 1)), count,
+                                         "{0:.1f}".format(count * 100.0 / max(self.samples, 1)), name))
+        return lines
+
+    def strategy_report(self):
+        template = "{0:24}{1:>12}{2:>12}{3:>10}"
+        lines = [template.format('strategy', 'own s', 'total s', 'calls')]
+        if self.profile is not None:
+            functions = self.owners
+            own = Counter()
+            total = Counter()
+            calls = Counter()
+            for key, (primitive, ncalls, tottime, cumtime, callers) in pstats.Stats(self.profile).stats.items():
+                if key in functions:
+                    strategy = functions[key]
+                    own[strategy] += tottime
+                    calls[strategy] += ncalls
+                    if key[2] == 'update':
+                        total[strategy] += cumtime
+            for strategy in sorted(total, key=total.get, reverse=True):
+                lines.append(template.format(strategy, "{0:.3f}".format(own[strategy]), "{0:.3f}".format(total[strategy]), calls[strategy]))
+            return lines
+
+        # sampling: a sample belongs to the strategy class of its innermost strategy frame
+        names = set(self.owners.values())
+        seconds = Counter()
+        for stack, count in self.stacks.items():
+            for frame in reversed(stack.split(';')):
+                owner = frame.split(':', 1)[1].split('.')[0]
+                if owner in names:
+                    seconds[owner] += count * self.elapsed / max(self.samples, 1)
+                    break
+        for strategy, total in seconds.most_common():
+            lines.append(template.format(strategy, '', "{0:.3f}".format(total), ''))
+        return lines
+
+    # bytes and blocks each line left behind at the end of the run and the most it held at any snapshot
+    def allocation_report(self):
+        template = "{0:>14}{1:>10}{2:>14}  {3}"
+        lines = [template.format('left bytes', 'blocks', 'peak bytes', 'line')]
+        keys = set(self.allocations) | set(self.held)
+        for key in sorted(keys, key=lambda key: max(self.allocations.get(key, (0, 0))[0], self.held[key]), reverse=True)[:self.top]:
+            size, count = self.allocations.get(key, (0, 0))
+            lines.append(template.format(size, count, self.held[key], os.path.basename(key[0]) + ':' + str(key[1])))
+        return lines
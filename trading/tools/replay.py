@@ -0,0 +1,211 @@
+import json
+from datetime import datetime
+from time import perf_counter
+
+from trading.esssencial.api import Poloniex
+from trading.esssencial.journal import JournalReader, RESPONSE, DECISION, PREFETCH
+from trading.esssencial.logger import log
+from trading.model.account_dispatcher import AccountDispatcher
+from trading.model.prefetch import Prefetcher
+
+ALL = 'all'             # currencyPair of the account wide calls an AccountDispatcher makes
+PREFETCHED = 'prefetch' # command of the marker in front of the responses of a Prefetcher.prefetch()
+
+
+# (timestamp, command, params, body) of every recorded api response, in the order they were received. `path` is
+# either an event journal or a capture file with one {"time", "command", "params", "body"} json object per line.
+# a journal's prefetches show up as a PREFETCHED command without body
+def load_responses(path):
+    if path.endswith('.jsonl'):
+        responses = []
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    capture = json.loads(line)
+                    responses.append((capture['time'], capture['command'], capture.get('params', {}), capture['body']))
+        return responses
+
+    return [(timestamp, payload['command'], payload['params'], payload['body']) if type == RESPONSE else
+            (timestamp, PREFETCHED, {}, payload['pairs'])
+            for type, timestamp, payload in JournalReader(path, [RESPONSE, PREFETCH])]
+
+
+# Poloniex that answers every call with the next recorded response instead of going to the exchange. Calls are
+# matched by command and currency pair, time parameters are ignored. A call the recording has no answer for at
+# this point fails like the live call did (the live session only records responses it received), and `clock`
+# is the original receive time of the last response served. now() is the recorded time as well, so what a replayed
+# update requests does not depend on when it is replayed.
+class ReplayExchange(Poloniex):
+    record_responses = False
+    responses = None
+    position = 0
+    clock = 0.0
+    misses = 0
+
+    def __init__(self, responses):
+        super().__init__('', '')
+        self.responses = responses
+        self.position = 0
+        self.clock = responses[0][0] if len(responses) else 0.0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_responses(path))
+
+    def request(self, type, params, decoder=None):
+        if self.position >= len(self.responses):
+            raise EOFError('Replay finished')
+
+        timestamp, command, recorded, body = self.responses[self.position]
+        if command != params.get('command') or recorded.get('currencyPair') != params.get('currencyPair'):
+            self.misses += 1
+            raise RuntimeError('No recorded ' + str(params.get('command')) + ' response, next is ' + command)
+
+        self.position += 1
+        self.clock = timestamp
+        if decoder is not None and isinstance(body, list):
+            return decoder.from_records(body)
+        return body
+
+    def finished(self):
+        return self.position >= len(self.responses)
+
+    # when the next response was received, the last one's once all were served
+    def now(self):
+        timestamp = self.responses[self.position][0] if self.position < len(self.responses) else self.clock
+        return datetime.utcfromtimestamp(timestamp)
+
+    # command of the next recorded response, None once all were served
+    def next_command(self):
+        return self.responses[self.position][1] if self.position < len(self.responses) else None
+
+    # pair of the update cycle the next response belongs to: cycles run under one lock, so their responses are
+    # contiguous and the first one naming a pair gives it away. account wide calls name all pairs and none of them
+    def next_pair(self):
+        for i in range(self.position, len(self.responses)):
+            pair = self.responses[i][2].get('currencyPair')
+            if pair is not None and pair != ALL:
+                return pair
+        return None
+
+    def pairs(self):
+        return sorted(set(params['currencyPair'] for timestamp, command, params, body in self.responses
+                          if params.get('currencyPair', ALL) != ALL))
+
+    # True when the session shared its account state through an AccountDispatcher
+    def account_wide(self):
+        return any(params.get('currencyPair') == ALL for timestamp, command, params, body in self.responses)
+
+
+# AccountDispatcher over a ReplayExchange that refreshes where the recorded session did instead of by age, which
+# the replay, running as fast as it goes, would never reach
+class ReplayAccount(AccountDispatcher):
+    def __init__(self, exchange):
+        assert isinstance(exchange, ReplayExchange)
+        super().__init__(exchange)
+
+    def refresh(self, force=False):
+        if not force and self.poloniex.next_command() != 'returnBalances':
+            return False
+        return super().refresh(True)
+
+
+# Prefetcher over a ReplayExchange: prefetch() fetches the pairs in the recorded order and ticker() is fetched
+# again where the recorded session fetched it, instead of by the time of day
+class ReplayPrefetcher(Prefetcher):
+    def __init__(self, exchange, period=300, lead=20.0, settle=2.0, account=None):
+        assert isinstance(exchange, ReplayExchange)
+        super().__init__(exchange, period, lead, settle, account)
+
+    def prefetch(self):
+        exchange = self.poloniex
+        if self.account is not None and exchange.next_command() == 'returnBalances':
+            try:
+                self.account.refresh(force=True)
+            except Exception as e:
+                log('Prefetching the account failed: ' + str(e.args))
+
+        sources = dict((source.currency.currency_pair, source) for source in self.sources)
+        while exchange.next_command() == 'returnChartData' and exchange.next_pair() in sources:
+            source = sources.pop(exchange.next_pair())
+            try:
+                source.prefetch()
+            except Exception as e:
+                log('Prefetching ' + source.currency.currency_pair + ' failed: ' + str(e.args))
+
+    def ticker(self):
+        with self.lock:
+            if self.last_ticker is None or self.poloniex.next_command() == 'returnTicker':
+                ticker = self.poloniex.returnTicker()
+                if 'error' in ticker:
+                    return ticker
+                self.last_ticker = ticker
+            return self.last_ticker
+
+
+# Runs the algorithms' update cycles in the recorded order as fast as they go. `algorithms` maps every recorded
+# pair to an algorithm on a LiveDataSource over `exchange`, the recorded prefetches run through `prefetcher`.
+class Replay:
+    exchange = None
+    algorithms = None
+    prefetcher = None
+    cycles = 0
+    errors = 0
+    skipped = 0
+    elapsed = 0.0
+
+    def __init__(self, exchange, algorithms, prefetcher=None):
+        assert isinstance(exchange, ReplayExchange)
+        assert prefetcher is None or isinstance(prefetcher, ReplayPrefetcher)
+        missing = set(exchange.pairs()) - set(algorithms)
+        if missing:
+            raise ValueError('No algorithm for recorded pairs: ' + ', '.join(sorted(missing)))
+
+        self.exchange = exchange
+        self.algorithms = algorithms
+        self.prefetcher = prefetcher
+        for algorithm in algorithms.values():
+            algorithm.data_source.poll_interval = 0
+
+    def run(self):
+        start = perf_counter()
+        while not self.exchange.finished():
+            if self.exchange.next_command() == PREFETCHED:
+                self.exchange.position += 1
+                if self.prefetcher is not None:
+                    self.prefetcher.prefetch()
+                continue
+
+            pair = self.exchange.next_pair()
+            if pair is None:
+                break
+
+            position = self.exchange.position
+            try:
+                self.algorithms[pair].update()
+            except Exception:
+                self.errors += 1
+            self.cycles += 1
+
+            # nothing of this cycle was served, drop the response it stumbled over
+            if self.exchange.position == position:
+                self.exchange.position += 1
+                self.skipped += 1
+
+        self.elapsed = perf_counter() - start
+        return self
+
+
+# (pair, date, action, indicators) of every decision in a journal
+def decisions(path):
+    return [(payload['pair'], payload['date'], payload['action'], payload['indicators'])
+            for type, timestamp, payload in JournalReader(path, [DECISION])]
+
+
+# indices of the decisions that differ between two journals, plus the count difference
+def compare_decisions(recorded_path, replayed_path):
+    recorded = decisions(recorded_path)
+    replayed = decisions(replayed_path)
+    different = [i for i, (a, b) in enumerate(zip(recorded, replayed)) if a != b]
+    return different, len(replayed) - len(recorded)
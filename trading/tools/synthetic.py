@@ -0,0 +1,204 @@
+import argparse
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from trading.esssencial.api import Poloniex, createTimeStamp
+from trading.model.candle_store import CandleStore
+from trading.model.candles import CANDLE_DTYPE, to_records
+from trading.model.downloader import HistoryDownloader
+
+
+# Synthetic candles in the shape of poloniex returnChartData, for load and scale tests without the exchange.
+# models:
+#   gbm     geometric brownian motion, `volatility` is the standard deviation of the log return per bar
+#   jump    gbm plus poisson distributed jumps (merton), `jump_intensity` jumps per bar on average
+#   regime  gbm whose volatility switches between calm and `regime_volatilities` with `regime_switch` per bar
+# the same seed and chunk size always produce the same candles
+class SyntheticMarket:
+    models = ['gbm', 'jump', 'regime']
+
+    model = 'gbm'
+    seed = 0
+    period = 300
+    price = 100.0
+    drift = 0.0
+    volatility = 0.002
+    jump_intensity = 0.001
+    jump_mean = 0.0
+    jump_std = 0.03
+    regime_volatilities = (0.001, 0.006)
+    regime_switch = 0.002
+    quote_volume = 10.0
+
+    rng = None
+    date = 0
+    regime = 0
+
+    def __init__(self, model='gbm', seed=0, period=300, price=100.0, volatility=0.002, drift=0.0, start=None):
+        if model not in self.models:
+            raise ValueError('Unknown synthetic model: ' + str(model))
+
+        self.model = model
+        self.seed = seed
+        self.period = period
+        self.price = price
+        self.volatility = volatility
+        self.drift = drift
+        self.rng = np.random.default_rng(seed)
+        self.regime = 0
+
+        start = createTimeStamp(start) if start is not None else 1483228800  # 2017-01-01 UTC
+        self.date = int(start) // period * period
+
+    def generate(self, bars):
+        candles = np.empty(bars, dtype=CANDLE_DTYPE)
+        sigma = self.bar_volatility(bars)
+        returns = (self.drift - 0.5 * sigma ** 2) + sigma * self.rng.standard_normal(bars)
+
+        if self.model == 'jump':
+            jumps = self.rng.poisson(self.jump_intensity, bars)
+            hit = jumps > 0
+            returns[hit] += jumps[hit] * self.jump_mean + np.sqrt(jumps[hit]) * self.jump_std * self.rng.standard_normal(np.count_nonzero(hit))
+
+        close = self.price * np.exp(np.cumsum(returns))
+        opening = np.empty(bars)
+        opening[0] = self.price
+        opening[1:] = close[:-1]
+
+        # wicks reach out by a half-normal fraction of the bar volatility
+        wick = np.abs(self.rng.standard_normal((2, bars))) * sigma * 0.5
+        high = np.maximum(opening, close) * np.exp(wick[0])
+        low = np.minimum(opening, close) * np.exp(-wick[1])
+
+        candles['date'] = self.date + np.arange(bars, dtype=np.int64) * self.period
+        candles['open'] = opening
+        candles['high'] = high
+        candles['low'] = low
+        candles['close'] = close
+        candles['weightedAverage'] = (high + low + close) / 3
+        candles['quoteVolume'] = self.quote_volume * self.rng.lognormal(0.0, 0.5, bars) * (1 + np.abs(returns) / sigma)
+        candles['volume'] = candles['quoteVolume'] * candles['weightedAverage']
+
+        self.price = close[-1] if bars else self.price
+        self.date += bars * self.period
+        return candles
+
+    def chunks(self, bars, chunk_size=1000000):
+        while bars > 0:
+            size = min(bars, chunk_size)
+            yield self.generate(size)
+            bars -= size
+
+    def records(self, bars):
+        return to_records(self.generate(bars))
+
+    def bar_volatility(self, bars):
+        if self.model != 'regime':
+            return np.full(bars, float(self.volatility))
+
+        # regimes last a geometric number of bars and alternate between the two volatilities
+        lengths = []
+        covered = 0
+        while covered < bars:
+            run = self.rng.geometric(self.regime_switch, max(16, int((bars - covered) * self.regime_switch * 2)))
+            lengths.append(run)
+            covered += int(run.sum())
+        lengths = np.concatenate(lengths)
+        states = (self.regime + np.arange(len(lengths))) % 2
+        sigma = np.repeat(np.asarray(self.regime_volatilities, dtype=np.float64)[states], lengths)[:bars]
+
+        # continue the regime the last bar was in with the next chunk
+        self.regime = int((self.regime + np.searchsorted(np.cumsum(lengths), bars, side='right')) % 2)
+        return sigma
+
+    def to_store(self, store, currency_pair, bars, chunk_size=1000000):
+        assert isinstance(store, CandleStore)
+        candles = np.concatenate(list(self.chunks(bars, chunk_size)))
+        return store.write(currency_pair, self.period, candles)
+
+
+# Poloniex stand-in serving synthetic candles, so BacktestDataSource and LiveDataSource run on generated data.
+# every pair gets its own market, seeded from the pair name, generated once for the whole history
+class SyntheticPoloniex(Poloniex):
+    model = 'gbm'
+    seed = 0
+    bars = 0
+    start = None
+    balances = None
+    markets = None
+
+    def __init__(self, model='gbm', seed=0, bars=8928, start=None, balances=None):
+        super().__init__('', '')
+        self.model = model
+        self.seed = seed
+        self.bars = bars
+        self.start = start
+        self.balances = balances if balances is not None else {}
+        self.markets = {}
+
+    def candles(self, currency_pair, period):
+        key = (currency_pair, period)
+        if key not in self.markets:
+            seed = [self.seed, zlib.crc32(currency_pair.encode())]
+            self.markets[key] = SyntheticMarket(self.model, seed, period, start=self.start).generate(self.bars)
+        return self.markets[key]
+
+    def returnChartData(self, currencyPair, period=300, start=None, end=None, columns=False):
+        candles = self.candles(currencyPair, period)
+        first = 0 if start is None else np.searchsorted(candles['date'], createTimeStamp(start), side='left')
+        last = len(candles) if end is None else np.searchsorted(candles['date'], createTimeStamp(end), side='right')
+        return candles[first:last].copy() if columns else to_records(candles[first:last])
+
+    def returnBalances(self):
+        return dict((currency, str(balance)) for currency, balance in self.balances.items())
+
+    def returnTicker(self):
+        ticker = {}
+        for (currency_pair, period), candles in self.markets.items():
+            close = str(candles['close'][-1])
+            ticker[currency_pair] = {'last': close, 'highestBid': close, 'lowestAsk': close}
+        return ticker
+
+
+# unix time of a UTC date given as YYYY-MM-DD or YYYY-MM-DD HH:MM
+def parse_date(text):
+    for format in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return createTimeStamp(datetime.strptime(text, format))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError('Not a YYYY-MM-DD[ HH:MM] date: ' + text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the candle store with synthetic candles.')
+    parser.add_argument('pairs', nargs='+', help='currency pairs, e.g. USDT_BTC')
+    parser.add_argument('--bars', type=int, default=105120,
+                        help='candles per pair without --start (default: one year of 5 minute bars)')
+    parser.add_argument('--start', type=parse_date, help='UTC date of the first candle, YYYY-MM-DD[ HH:MM]')
+    parser.add_argument('--end', type=parse_date,
+                        help='UTC date of the last candle (default: the last closed one, so offline backtests find it)')
+    parser.add_argument('--model', choices=SyntheticMarket.models, default='gbm')
+    parser.add_argument('--volatility', type=float, default=SyntheticMarket.volatility, help='log return std per bar')
+    parser.add_argument('--period', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--store', default='candles')
+    args = parser.parse_args()
+
+    end = (args.end if args.end is not None else HistoryDownloader.last_closed(args.period)) // args.period * args.period
+    start = end - (args.bars - 1) * args.period if args.start is None else -(-args.start // args.period) * args.period
+    if start > end:
+        parser.error('--start is after --end')
+    bars = (end - start) // args.period + 1
+
+    store = CandleStore(args.store)
+    for pair in args.pairs:
+        market = SyntheticMarket(args.model, [args.seed, zlib.crc32(pair.encode())], args.period, volatility=args.volatility,
+                                 start=datetime.utcfromtimestamp(start))
+        print(pair + ': ' + str(market.to_store(store, pair, bars)) + ' candles stored')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,9 @@ import copy
 import math
 from enum import Enum
 
-from trading.model.data_source import IDataSource
+from trading.esssencial.exporter import exporter
+from trading.esssencial.journal import journal, DECISION
+from trading.model.data_source import IDataSource, CANDLE, CHANGES
 
 
 class TradeResult(Enum):
@@ -13,10 +15,22 @@ class TradeResult(Enum):
 
 class ITradeAlgorithm:
     data_source = None
+    depends_on = CHANGES    # the data source changes that can alter the decision
+    evaluated = None        # what they were at the last evaluation, None evaluates the next update
+    skipped = 0
+    persisted = ('winning_trades', 'losing_trades')   # attributes a restart continues from, see snapshot()
+
+    # candles the decision reads per (field, timeframe in minutes), e.g. {('close', 60): 720} for 30 days of hourly
+    # closes. timeframe None is the data source's own candles. the data source keeps that much plus lookback_margin
+    lookback = {}
+    lookback_margin = 0.1
 
     def __init__(self, data_source):
         assert isinstance(data_source, IDataSource)
         self.data_source = data_source
+        bars = self.bars(data_source.update_interval, self.lookback)
+        if bars:
+            data_source.lookback = bars
 
         cp_split = data_source.currency.currency_pair.split('_')
         self.symbol_main = cp_split[0]
@@ -25,6 +39,15 @@ class ITradeAlgorithm:
     def update(self):
         return False
 
+    # candles of `update_interval` minutes covering the lookback, 0 without one
+    @classmethod
+    def bars(cls, update_interval, lookback=None, margin=None):
+        lookback = cls.lookback if lookback is None else lookback
+        margin = cls.lookback_margin if margin is None else margin
+        needed = [count if timeframe is None else math.ceil(count * timeframe / float(update_interval))
+                  for (field, timeframe), count in lookback.items()]
+        return int(math.ceil(max(needed) * (1 + margin))) if needed else 0
+
     def crossover(self, series1, series2):
         return self.data_source.crossover(series1, series2)
 
@@ -34,14 +57,61 @@ class ITradeAlgorithm:
     def security(self, period, value, num_periods=2):
         return self.data_source.security(period, value, num_periods)
 
+    # an order that fails leaves the data unchanged, the next update has to try again
     def buy(self, alt):
+        self.evaluated = None
         return self.data_source.buy(alt)
 
     def sell(self, alt):
+        self.evaluated = None
         return self.data_source.sell(alt)
 
+    # the strategy's state and its data source's, to continue from after a restart instead of starting over
+    def snapshot(self):
+        return {'strategy': type(self).__name__, 'source': self.data_source.snapshot(),
+                'attributes': dict((name, getattr(self, name)) for name in self.persisted)}
+
+    # False when the snapshot belongs to another strategy, pair or candle period and nothing was restored
+    def restore(self, snapshot):
+        if snapshot['strategy'] != type(self).__name__ or not self.data_source.restore(snapshot['source']):
+            return False
+        for name, value in snapshot['attributes'].items():
+            if name in self.persisted:
+                setattr(self, name, value)
+        return True
+
+    # True when nothing the strategy depends on changed since its last evaluation, which then is skipped
+    def unchanged(self):
+        state = self.data_source.state
+        if state is None:
+            return False
+        current = tuple(state[change] for change in self.depends_on)
+        if current == self.evaluated:
+            self.skipped += 1
+            exporter.inc('evaluations_skipped_total', (('pair', self.data_source.currency.currency_pair), ('strategy', type(self).__name__)))
+            return True
+        self.evaluated = current
+        return False
+
+    # relative distance from the current price to the nearest price at which the strategy would act, 0 when it
+    # acts at the current price and None when the strategy cannot tell. used to poll quiet pairs less often
+    def trigger_distance(self):
+        return None
+
+    # journal what this update decided (buy, sell or hold) and the indicator values it was based on
+    def record_decision(self, action, **indicators):
+        if not journal.enabled:
+            return
+        candle = self.data_source.last_candle()
+        journal.record(DECISION, {'pair': self.data_source.currency.currency_pair, 'strategy': type(self).__name__,
+                                  'date': candle['date'] if candle is not None else 0,
+                                  'action': action, 'bid': self.data_source.highest_bid,
+                                  'ask': self.data_source.lowest_ask, 'indicators': indicators})
+
 
 class SniperBacktest(ITradeAlgorithm):
+    depends_on = (CANDLE,)    # buy_orders and sell_orders count candles
+    persisted = ITradeAlgorithm.persisted + ('first_update', 'current_order', 'initial_alt', 'buy_orders', 'sell_orders')
     first_update = True
     current_order = None
     period = 0
@@ -53,8 +123,9 @@ class SniperBacktest(ITradeAlgorithm):
     sell_orders = 0
 
     def __init__(self, data_source, period):
-        super().__init__(data_source)
         self.period = period
+        self.lookback = {('close', period): 2, ('open', period): 2} if period else {}
+        super().__init__(data_source)
         self.initial_alt = self.data_source.alt_balance
 
     def update(self):
@@ -71,12 +142,16 @@ class SniperBacktest(ITradeAlgorithm):
             if self.data_source.alt_balance != self.initial_alt:
                 self.data_source.orders = self.data_source.orders[1:]
             return False
+        if self.unchanged():
+            return True
 
         buy_profit_percent = (self.current_order.rate / self.data_source.lowest_ask) - 1 if self.current_order is not None else 0
         sell_profit_percent = (self.data_source.highest_bid / self.current_order.rate) - 1 if self.current_order is not None else 0
 
         long_condition = self.crossover(self.security(self.period, 'close'), self.security(self.period, 'open')) and self.buy_orders < 100
         short_condition = self.crossunder(self.security(self.period, 'close'), self.security(self.period, 'open')) and self.sell_orders < 100
+        self.record_decision('buy' if long_condition else 'sell' if short_condition else 'hold',
+                             buy_orders=self.buy_orders, sell_orders=self.sell_orders)
 
         if long_condition:
             if self.buy(self.data_source.currency.ann_order_size) is not None:
@@ -96,6 +171,8 @@ class SniperBacktest(ITradeAlgorithm):
 
 
 class MACD(ITradeAlgorithm):
+    lookback = {('close', 60): 24 * 30}
+    persisted = ITradeAlgorithm.persisted + ('current_order', 'initial_alt')
     current_order = None
     period = 0
     winning_trades = 0
@@ -109,6 +186,8 @@ class MACD(ITradeAlgorithm):
     def update(self):
         if not self.data_source.update():
             return False
+        if self.unchanged():
+            return True
 
         if len(self.data_source.orders):
             self.current_order = self.data_source.orders[0]
@@ -131,6 +210,8 @@ class MACD(ITradeAlgorithm):
 
         long_condition = macd[1] < ema9[1] and macd[0] > ema9[0] and (self.current_order is None or self.current_order.is_sell()) and buy_profit_percent >= 0
         short_condition = macd[1] > ema9[1] and macd[0] < ema9[0] and (self.current_order is None or self.current_order.is_buy()) and sell_profit_percent >= 0
+        self.record_decision('buy' if long_condition else 'sell' if short_condition else 'hold',
+                             macd=macd[:2], signal=ema9[:2])
 
         if long_condition:
             if self.buy(self.data_source.currency.ann_order_size) is not None:
@@ -144,11 +225,18 @@ class MACD(ITradeAlgorithm):
 
         return True
 
+# buys below and sells above the band of the ema24 and ema48 of the weighted average. it only records its signals,
+# EmaBandStrategy places the orders
 class SimpleStrategy(ITradeAlgorithm):
+    lookback = {('weightedAverage', None): 96}     # ema48 starts from the sma of the 48 candles before the last 48
+    persisted = ITradeAlgorithm.persisted + ('current_order', 'initial_alt', 'ema24', 'ema48')
+    places_orders = False
     current_order = None
     period = 0
     winning_trades = 0
     losing_trades = 0
+    ema24 = None
+    ema48 = None
 
     def __init__(self, data_source, period):
         super().__init__(data_source)
@@ -158,6 +246,8 @@ class SimpleStrategy(ITradeAlgorithm):
     def update(self):
         if not self.data_source.update():
             return False
+        if self.unchanged():
+            return True
 
         if len(self.data_source.orders):
             self.current_order = self.data_source.orders[0]
@@ -165,29 +255,48 @@ class SimpleStrategy(ITradeAlgorithm):
         buy_profit_percent = (self.current_order.rate / self.data_source.lowest_ask) - 1 if self.current_order is not None else 0
         sell_profit_percent = (self.data_source.highest_bid / self.current_order.rate) - 1 if self.current_order is not None else 0
 
-        ma = []
-        for data in self.data_source.data:
-            ma.append(data['weightedAverage'])
+        ma = self.data_source.column('weightedAverage')
 
         ema24 = self.data_source.ema(ma, 24)
         ema48 = self.data_source.ema(ma, 48)
+        self.ema24 = ema24
+        self.ema48 = ema48
 
         can_sell = self.data_source.highest_bid > max(ema24, ema48) and (self.current_order is None or self.current_order.is_buy())
         can_buy = self.data_source.lowest_ask < min(ema24, ema48) and (self.current_order is None or self.current_order.is_sell())
+        self.record_decision('buy' if can_buy else 'sell' if can_sell else 'hold', ema24=ema24, ema48=ema48)
 
         if can_buy:
-            #if self.buy(self.data_source.currency.ann_order_size) is not None:
+            if not self.places_orders or self.buy(self.data_source.currency.ann_order_size) is not None:
                 self.winning_trades += buy_profit_percent >= 0
                 self.losing_trades += buy_profit_percent < 0
 
         elif can_sell:
-            #if self.sell(self.data_source.currency.ann_order_size) is not None:
+            if not self.places_orders or self.sell(self.data_source.currency.ann_order_size) is not None:
                 self.winning_trades += sell_profit_percent >= 0
                 self.losing_trades += sell_profit_percent < 0
         return True
 
+    # sells above the upper and buys below the lower of the two emas, nothing happens inside the band
+    def trigger_distance(self):
+        if self.ema24 is None or math.isnan(self.ema24 + self.ema48) or not self.data_source.highest_bid or not self.data_source.lowest_ask:
+            return None
+        distances = []
+        if self.current_order is None or self.current_order.is_buy():
+            distances.append(max(self.ema24, self.ema48) / self.data_source.highest_bid - 1)
+        if self.current_order is None or self.current_order.is_sell():
+            distances.append(1 - min(self.ema24, self.ema48) / self.data_source.lowest_ask)
+        return max(0.0, min(distances)) if distances else None
+
+
+# SimpleStrategy with its orders: ann_order_size units at the band signals. VectorBacktest has its vectorized twin
+class EmaBandStrategy(SimpleStrategy):
+    places_orders = True
+
 
 class MyTradeAlgorithm(ITradeAlgorithm):
+    lookback = {('weightedAverage', None): 96}
+    persisted = ITradeAlgorithm.persisted + ('combined_buy', 'combined_sell', 'last_trade_type')
     # combined_order = None
     combined_buy = None
     combined_sell = None
@@ -203,6 +312,8 @@ class MyTradeAlgorithm(ITradeAlgorithm):
     def update(self):
         if not self.data_source.update():
             return False
+        if self.unchanged():
+            return True
 
         self.update_trade_history()
 
@@ -213,6 +324,8 @@ class MyTradeAlgorithm(ITradeAlgorithm):
 
         long_condition = long_condition and (self.combined_sell is None or buy_profit_percent >= self.data_source.currency.min_buy_profit)
         short_condition = short_condition and (self.combined_buy is None or sell_profit_percent >= self.data_source.currency.min_sell_profit)
+        self.record_decision('sell' if short_condition else 'buy' if long_condition else 'hold',
+                             buy_profit=buy_profit_percent, sell_profit=sell_profit_percent)
 
         # SHORT
         if short_condition:
@@ -267,9 +380,7 @@ class MyTradeAlgorithm(ITradeAlgorithm):
         can_buy = False
         can_sell = False
 
-        ma = []
-        for data in self.data_source.data:
-            ma.append(data['weightedAverage'])
+        ma = self.data_source.column('weightedAverage')
 
         # calculate the 9 and 12 hour ema's
         emaf = self.data_source.ema(ma, 24)
@@ -303,6 +414,9 @@ class MyTradeAlgorithm(ITradeAlgorithm):
 
 
 class ANN(ITradeAlgorithm):
+    depends_on = (CANDLE,)    # the confirmation ticks count candles
+    lookback = {('ohlc4', None): 12 * 48}
+    persisted = ITradeAlgorithm.persisted + ('current_order', 'last_trade_type', 'initial_alt', 'sell_ticks', 'buy_ticks')
     current_order = None
     last_trade_type = TradeResult.none
     usdt_highest_bid = 0.0
@@ -324,6 +438,8 @@ class ANN(ITradeAlgorithm):
 
         if not self.data_source.update():
             return False
+        if self.unchanged():
+            return True
 
         if len(self.data_source.orders):
             self.current_order = self.data_source.orders[0]
@@ -335,6 +451,9 @@ class ANN(ITradeAlgorithm):
 
         long_condition = (activation > self.data_source.currency.ann_threshold)  # and buy_profit_percent >= 0
         short_condition = (activation < -self.data_source.currency.ann_threshold)  # and sell_profit_percent >= 0
+        self.record_decision('sell' if short_condition and self.sell_ticks >= confirmation_ticks else
+                             'buy' if long_condition and self.buy_ticks >= confirmation_ticks else 'hold',
+                             activation=activation, buy_ticks=self.buy_ticks, sell_ticks=self.sell_ticks)
 
 
         # SHORT
@@ -359,8 +478,7 @@ class ANN(ITradeAlgorithm):
         return True
 
     def ohlc(self):
-        period = 300
-        offset = 12 * 48
+        offset = self.bars(self.data_source.update_interval, margin=0)
         data = self.data_source.data[-offset:]
         values = []
 
@@ -1,26 +1,113 @@
+import argparse
+import os
 import threading
 from threading import Timer
 import random
 import time
+from time import perf_counter
 
 from datetime import datetime, timedelta
 
 from configparser import ConfigParser
 
-from trading.esssencial.logger import log
+from trading.esssencial.logger import log, writer
 from trading.esssencial.api import Poloniex
-from trading.model.order import Order
+from trading.esssencial.exporter import exporter
+from trading.esssencial.instrumentation import instrumentation
+from trading.esssencial.journal import journal
+from trading.esssencial.snapshot import save_snapshot, load_snapshot
+from trading.model.performance import Performance
+from trading.model.monte_carlo import MonteCarlo
+from trading.model.vector_backtest import VectorBacktest
 from trading.model.trade_currency import TradeCurrency
+from trading.model.account_dispatcher import AccountDispatcher
+from trading.model.candle_store import CandleStore
+from trading.model.prefetch import Prefetcher
+from trading.model.scheduler import AdaptiveScheduler
+from trading.model.downloader import HistoryDownloader
+from trading.esssencial.budget import RateBudget
+from trading.tools.profiler import BacktestProfiler
+from trading.tools.replay import ReplayExchange, ReplayAccount, ReplayPrefetcher, Replay, compare_decisions
 from trading.model.data_source import BacktestDataSource,LiveDataSource
-from trading import ITradeAlgorithm, ANN, SniperBacktest, MACD, MyTradeAlgorithm, SimpleStrategy
+from trading import ITradeAlgorithm, ANN, SniperBacktest, MACD, MyTradeAlgorithm, SimpleStrategy, EmaBandStrategy
 
 api_key = ''
 api_secret = ''
 
 update_interval = 0
 
+# (seconds) the live pairs share one refresh of balances, open orders and trade history this long
+account_max_age = 60.0
+
+# (seconds) live updates run this long after each candle close and the bulk of their data is fetched prefetch_lead
+# seconds before it, 0 disables the prefetch and runs every pair update_interval after its last update
+prefetch_lead = 20.0
+prefetch_settle = 2.0
+prefetcher = None
+
+# (calls per minute) live pairs are polled more often near a trigger and less often far from one while all of them
+# together stay within this many api calls, 0 polls every pair each update_interval
+request_budget = 0.0
+min_poll_interval = 30.0
+max_poll_interval = 1800.0
+scheduler = None
+
+# every live cycle saves its pair's candles, trades and strategy state here and a restart continues from them,
+# an empty path disables it
+state_dir = 'state'
+account = None
+# (minutes, newest trade) of the last saved account snapshot, the pairs share it so it is only written again
+# once a refresh found newer trades
+account_saved = None
+
+# (seconds) how often config.cfg is checked for changes while trading live, changed pair settings are swapped into
+# the running pairs and added or removed pairs are started or stopped. 0 disables
+config_check_interval = 10.0
+config_stamp = None
+
+# latency histograms of the live loop, summarized to the log every instrumentation_summary seconds
+instrumentation_enabled = False
+instrumentation_summary = 0
+
+# prometheus metrics: served on 127.0.0.1:metrics_port and/or rewritten to metrics_file, 0/empty disables each
+metrics_port = 0
+metrics_file = ''
+metrics_interval = 15
+
+# binary event journal of ticks, decisions, orders and fills, an empty path disables it
+journal_path = ''
+journal_fsync = 'interval'
+journal_fsync_interval = 1.0
+
+# finished backtests are kept here and extended with the candles that closed since the last run, as long as they
+# ran with the same strategy, candle period and starting balances. --fresh starts them over
+backtest_dir = 'backtests'
+
+# offline backtests read candles from the local store only and never create a Poloniex client
+offline_backtest = False
+candle_store_dir = 'candles'
+
+# history downloads: chunks fetched at the same time, public calls per second and candles per chunk
+download_workers = 4
+download_rate = 6.0
+download_chunk = 5000
+
+# number of perturbed candle histories run per pair in MONTECARLO mode
+monte_carlo_paths = 10000
+
+# the strategies --strategy chooses from, by class name, and the ones BACKTEST and MONTECARLO run without it.
+# MONTECARLO needs a strategy with a vectorized twin
+strategies = dict((cls.__name__, cls) for cls in (SimpleStrategy, EmaBandStrategy, MyTradeAlgorithm, MACD, ANN, SniperBacktest))
+backtest_strategy = 'SimpleStrategy'
+monte_carlo_strategy = 'EmaBandStrategy'
+
 trade_currencies = []
 
+# the running live pairs by currency pair, an update_loop whose algorithm is no longer here stops
+live_algorithms = {}
+poloniex = None
+offset = 60 * 24 * 2  # 2 Days Offset
+
 lock = threading.Lock()
 
 main_percent = 'main_percent'
@@ -35,6 +122,8 @@ initial_buy_rate = 'initial_buy_rate'
 initial_sell_rate = 'initial_sell_rate'
 ann_order_size = 'ann_order_size'
 ann_threshold = 'ann_threshold'
+backtest_main_balance = 'backtest_main_balance'
+backtest_alt_balance = 'backtest_alt_balance'
 
 
 def load_defaults(cfg, currency):
@@ -50,7 +139,9 @@ def load_defaults(cfg, currency):
                            initial_buy_rate=float(cfg[currency][initial_buy_rate]),
                            initial_sell_rate=float(cfg[currency][initial_sell_rate]),
                            ann_order_size=float(cfg[currency][ann_order_size]),
-                           ann_threshold=float(cfg[currency][ann_threshold]))
+                           ann_threshold=float(cfg[currency][ann_threshold]),
+                           backtest_main_balance=float(cfg[currency].get(backtest_main_balance, 0)),
+                           backtest_alt_balance=float(cfg[currency].get(backtest_alt_balance, 0)))
     return dft_tc
 
 
@@ -73,116 +164,427 @@ def load_custom(cfg, dft_tc, pair):
         tc.initial_sell_rate = float(cfg[pair][initial_sell_rate] if initial_sell_rate in cfg[pair] else tc.initial_sell_rate)
         tc.ann_order_size = float(cfg[pair][ann_order_size] if ann_order_size in cfg[pair] else tc.ann_order_size)
         tc.ann_threshold = float(cfg[pair][ann_threshold] if ann_threshold in cfg[pair] else tc.ann_threshold)
+        tc.backtest_main_balance = float(cfg[pair][backtest_main_balance] if backtest_main_balance in cfg[pair] else tc.backtest_main_balance)
+        tc.backtest_alt_balance = float(cfg[pair][backtest_alt_balance] if backtest_alt_balance in cfg[pair] else tc.backtest_alt_balance)
 
     return tc
 
 
+# the pairs of [CURRENCY] with their settings, raises for a config that cannot be traded with
+def load_currencies(cfg):
+    btc_pairs = cfg['CURRENCY']['btc_pairs'].split(',') if 'btc_pairs' in cfg['CURRENCY'] else []
+    usdt_pairs = cfg['CURRENCY']['usdt_pairs'].split(',') if 'usdt_pairs' in cfg['CURRENCY'] else []
+
+    currencies = []
+    if btc_pairs:
+        dft_tc_btc = load_defaults(cfg, 'BTC')
+        currencies += [load_custom(cfg, dft_tc_btc, pair.strip()) for pair in btc_pairs]
+    if usdt_pairs:
+        dft_tc_usdt = load_defaults(cfg, 'USDT')
+        currencies += [load_custom(cfg, dft_tc_usdt, pair.strip()) for pair in usdt_pairs]
+
+    pairs = set()
+    for currency in currencies:
+        currency.validate()
+        if currency.currency_pair in pairs:
+            raise ValueError(currency.currency_pair + ' is listed twice')
+        pairs.add(currency.currency_pair)
+    return currencies
+
+
+# modification time and size of config.cfg, None while it does not exist
+def config_file_stamp():
+    try:
+        stat = os.stat('config.cfg')
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def load_config():
-    global api_key, api_secret, update_interval, trade_currencies
+    global api_key, api_secret, update_interval, account_max_age, trade_currencies, offline_backtest, candle_store_dir
+    global prefetch_lead, prefetch_settle, request_budget, min_poll_interval, max_poll_interval, state_dir
+    global instrumentation_enabled, instrumentation_summary, metrics_port, metrics_file, metrics_interval
+    global journal_path, journal_fsync, journal_fsync_interval
+    global download_workers, download_rate, download_chunk, config_check_interval, config_stamp
 
+    config_stamp = config_file_stamp()
     cfg = ConfigParser()
     cfg.read('config.cfg')
 
-    api_key = cfg['API']['key']
-    api_secret = cfg['API']['secret']
+    if 'LOG' in cfg:
+        writer.configure(max_bytes=int(float(cfg['LOG'].get('max_size', '10')) * 1024 * 1024),
+                         max_age=float(cfg['LOG'].get('max_age', '0')) * 60 * 60,
+                         backups=int(cfg['LOG'].get('backups', '5')))
 
-    update_interval = float(cfg['PROCESS']['update_interval']) * 60
+    if 'BACKTEST' in cfg:
+        offline_backtest = cfg['BACKTEST'].get('offline', '0') == '1'
+        candle_store_dir = cfg['BACKTEST'].get('candle_store', candle_store_dir)
+        download_workers = int(cfg['BACKTEST'].get('download_workers', '4'))
+        download_rate = float(cfg['BACKTEST'].get('download_rate', '6'))
+        download_chunk = int(cfg['BACKTEST'].get('download_chunk', '5000'))
 
-    btc_pairs = cfg['CURRENCY']['btc_pairs'].split(',') if 'btc_pairs' in cfg['CURRENCY'] else []
-    usdt_pairs = cfg['CURRENCY']['usdt_pairs'].split(',') if 'usdt_pairs' in cfg['CURRENCY'] else []
+    if 'JOURNAL' in cfg:
+        journal_path = cfg['JOURNAL'].get('path', '')
+        journal_fsync = cfg['JOURNAL'].get('fsync', journal_fsync)
+        journal_fsync_interval = float(cfg['JOURNAL'].get('fsync_interval', '1'))
 
-    dft_tc_btc = load_defaults(cfg, 'BTC')
-    dft_tc_usdt = load_defaults(cfg, 'USDT')
+    # an offline backtest runs on machines without keys
+    if 'API' in cfg:
+        api_key = cfg['API']['key']
+        api_secret = cfg['API']['secret']
 
-    for pair in btc_pairs:
-        trade_currencies.append(load_custom(cfg, dft_tc_btc, pair))
+    update_interval = float(cfg['PROCESS']['update_interval']) * 60
+    account_max_age = float(cfg['PROCESS'].get('account_max_age', '60'))
+    prefetch_lead = float(cfg['PROCESS'].get('prefetch_lead', '20'))
+    prefetch_settle = float(cfg['PROCESS'].get('prefetch_settle', '2'))
+    request_budget = float(cfg['PROCESS'].get('request_budget', '0'))
+    min_poll_interval = float(cfg['PROCESS'].get('min_poll_interval', '0.5')) * 60
+    max_poll_interval = float(cfg['PROCESS'].get('max_poll_interval', '30')) * 60
+    state_dir = cfg['PROCESS'].get('state_dir', state_dir)
+    config_check_interval = float(cfg['PROCESS'].get('config_check_interval', '10'))
+    instrumentation_enabled = cfg['PROCESS'].get('instrumentation', '0') == '1'
+    instrumentation_summary = float(cfg['PROCESS'].get('instrumentation_summary', '15')) * 60
+    metrics_port = int(cfg['PROCESS'].get('metrics_port', '0'))
+    metrics_file = cfg['PROCESS'].get('metrics_file', '')
+    metrics_interval = float(cfg['PROCESS'].get('metrics_interval', '15'))
+
+    trade_currencies = load_currencies(cfg)
+
+
+# re-reads the pairs of config.cfg while trading live: pairs whose settings changed trade with the new ones from
+# their next update on, new pairs are started and removed ones stopped. the other pairs and everything they
+# fetched are left alone, and a config that cannot be read or fails validation leaves all of them running as they are
+def reload_config():
+    global trade_currencies
+    try:
+        cfg = ConfigParser()
+        cfg.read('config.cfg')
+        currencies = load_currencies(cfg)
+    except Exception as e:
+        log('Keeping the running config, config.cfg is invalid: ' + str(e.args), True)
+        return
+
+    wanted = dict((currency.currency_pair, currency) for currency in currencies)
+    with lock:
+        for pair in list(live_algorithms):
+            if pair not in wanted:
+                stop_pair(pair)
+            elif vars(wanted[pair]) != vars(live_algorithms[pair].data_source.currency):
+                live_algorithms[pair].data_source.swap_currency(wanted[pair])
+                log('Reloaded the settings of ' + pair, True)
+        trade_currencies = currencies
+        started = [currency for currency in currencies if currency.currency_pair not in live_algorithms]
+
+    for currency in started:
+        start_pair(currency)
+
+
+def config_loop():
+    global config_stamp
+    stamp = config_file_stamp()
+    if stamp != config_stamp:
+        config_stamp = stamp
+        reload_config()
+
+    loop = Timer(config_check_interval, config_loop)
+    loop.start()
+
+
+def start_pair(currency):
+    source = LiveDataSource(currency, poloniex, None, offset, update_interval / 60, account)
+    algorithm = SimpleStrategy(source, offset)
+    if state_dir:
+        restore_state(algorithm, currency.currency_pair)
+    with lock:
+        if prefetcher is not None:
+            prefetcher.add(source)
+        live_algorithms[currency.currency_pair] = algorithm
+    log('Started ' + currency.currency_pair, True)
+    update_loop(algorithm)
 
-    for pair in usdt_pairs:
-        trade_currencies.append(load_custom(cfg, dft_tc_usdt, pair))
 
+# its pending update_loop finds the pair gone and ends. call with the lock held
+def stop_pair(pair):
+    algorithm = live_algorithms.pop(pair)
+    if prefetcher is not None:
+        prefetcher.remove(algorithm.data_source)
+    if scheduler is not None:
+        scheduler.remove(pair)
+    log('Stopped ' + pair, True)
 
-def update_loop(algorithm):
+
+def update_loop(algorithm, due=None):
     with lock:
         assert isinstance(algorithm, ITradeAlgorithm)
+        pair = algorithm.data_source.currency.currency_pair
+        if live_algorithms.get(pair) is not algorithm:
+            return
+        if due is not None:
+            exporter.set('cycle_lag_seconds', (('pair', pair),), max(0.0, time.time() - due))
         try:
-            algorithm.update()
+            with instrumentation.span('cycle', pair):
+                algorithm.update()
+            # a cycle that placed an order decided before it, the order and the fill wait are timed as 'order'
+            decided_at = algorithm.data_source.decided_at or perf_counter()
+            if instrumentation.enabled and algorithm.data_source.updated_at:
+                instrumentation.observe('decision', pair, decided_at - algorithm.data_source.updated_at)
+            if prefetcher is not None and due is not None:
+                latency = prefetcher.since_close() - (perf_counter() - decided_at)
+                exporter.set('close_to_decision_seconds', (('pair', pair),), latency)
+                if instrumentation.enabled:
+                    instrumentation.observe('close_decision', pair, latency)
             try_again = False
         except Exception as e:
             log('An error occurred: ' + str(e.args), True)
             try_again = True
 
+        exporter.inc('cycles_total', (('pair', pair), ('result', 'error' if try_again else 'ok')))
+        if state_dir and not try_again:
+            save_state(algorithm)
         if try_again:
-            loop = Timer(random.randint(1, 10), update_loop, [algorithm])
-            loop.start()
+            delay = random.randint(1, 10)
+            exporter.inc('retry_wait_seconds_total', (('pair', pair),), delay)
+        elif scheduler is not None:
+            delay = scheduler.delay(algorithm)
+        elif prefetcher is not None:
+            delay = prefetcher.until_update()
         else:
-            loop = Timer(update_interval + random.randint(1, 10), update_loop, [algorithm])
-            loop.start()
+            delay = update_interval + random.randint(1, 10)
 
+        loop = Timer(delay, update_loop, [algorithm, time.time() + delay])
+        loop.start()
 
-def main():
+
+def state_path(name):
+    return os.path.join(state_dir, name + '.pickle')
+
+
+def save_state(algorithm):
+    global account_saved
     try:
-        load_config()
+        save_snapshot(algorithm.snapshot(), state_path(algorithm.data_source.currency.currency_pair))
+        if account is not None:
+            snapshot = account.snapshot()
+            saved = (snapshot['minutes'], snapshot['cursor'])
+            if saved != account_saved:
+                save_snapshot(snapshot, state_path('account'))
+                account_saved = saved
+    except Exception as e:
+        log('Saving the state failed: ' + str(e.args))
+
+
+# a snapshot that cannot be read or does not fit is ignored, the pair then starts from scratch
+def restore_state(target, name):
+    try:
+        snapshot = load_snapshot(state_path(name))
+        if snapshot is not None and target.restore(snapshot):
+            log('Restored the state of ' + name)
+    except Exception as e:
+        log('Restoring the state of ' + name + ' failed: ' + str(e.args))
+
+
+# what a backtest ran with, a saved one is only extended while all of it is unchanged
+def backtest_settings(strategy_class, currency):
+    return {'strategy': strategy_class.__name__, 'pair': currency.currency_pair, 'update_interval': update_interval / 60,
+            'offline': offline_backtest,
+            'balances': (currency.backtest_main_balance, currency.backtest_alt_balance) if offline_backtest else None}
 
-        template = "{0:20}{1:>15}\t\t\t{2:33}"
-        print('initializing')
-        poloniex = Poloniex(api_key, api_secret)
 
-        offset = 60 * 24 * 2 #2 Days Offset
-        start = datetime.now() - timedelta(days=31)
+def save_backtest(algorithm, settings, path):
+    save_snapshot({'settings': settings, 'algorithm': algorithm}, path)
 
-        #MODE: 'BACKTEST' 'LIVE'
-        mode = 'BACKTEST'
 
+# the saved backtest when it ran with `settings`, None when there is none or it does not fit
+def load_backtest(path, settings):
+    try:
+        snapshot = load_snapshot(path)
+    except Exception as e:
+        print('Starting over, ' + path + ' cannot be read: ' + str(e.args))
+        return None
+    if snapshot is None:
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('settings') != settings:
+        print('Starting over, ' + path + ' was run with other settings')
+        return None
+    return snapshot['algorithm']
+
+
+def prefetch_loop():
+    with lock:
+        with instrumentation.span('prefetch', 'all'):
+            prefetcher.prefetch()
+
+        loop = Timer(prefetcher.until_prefetch(), prefetch_loop)
+        loop.start()
+
+
+def run(mode, strategy=None, fresh=False):
+    global prefetcher, scheduler, account, poloniex
+    try:
+        load_config()
+        if journal_path:
+            journal.open(journal_path, journal_fsync, journal_fsync_interval)
+
+        template = "{0:20}{1:>15}\t\t\t{2:33}"
+        print('initializing')
+        store = CandleStore(candle_store_dir)
+        poloniex = None if offline_backtest else Poloniex(api_key, api_secret)
+        downloader = None if poloniex is None else \
+            HistoryDownloader(poloniex, store, download_workers, RateBudget(download_rate), download_chunk)
+        account = None if poloniex is None else AccountDispatcher(poloniex, account_max_age)
+
+        start = datetime.utcnow() - timedelta(days=31)
+
+        if mode == 'LIVE':
+            assert poloniex is not None, 'LIVE mode needs the API, set offline = 0'
+            if instrumentation_enabled and not instrumentation.enabled:
+                instrumentation.enabled = True
+                instrumentation.start_summary(instrumentation_summary)
+            if (metrics_port or metrics_file) and exporter.timer is None:
+                exporter.start(metrics_interval, metrics_port, metrics_file)
+            if prefetch_lead and prefetcher is None:
+                prefetcher = Prefetcher(poloniex, update_interval, prefetch_lead, prefetch_settle, account)
+                Timer(prefetcher.until_prefetch(), prefetch_loop).start()
+            if request_budget and scheduler is None:
+                scheduler = AdaptiveScheduler(update_interval, request_budget, min_poll_interval, max_poll_interval,
+                                              prefetcher=prefetcher)
+            if state_dir:
+                restore_state(account, 'account')
+            for currency in trade_currencies:
+                start_pair(currency)
+                time.sleep(10)
+            if config_check_interval:
+                Timer(config_check_interval, config_loop).start()
+
+        total_profit = 0
         for currency in trade_currencies:
-            total_profit = 0
-
-            if mode == 'LIVE':
-                for currency in trade_currencies:
-                    source = LiveDataSource(currency, poloniex, start, offset, update_interval / 60)
-                    algorithm = SimpleStrategy(source, offset)
-                    update_loop(algorithm)
-                    time.sleep(10)
             if mode == 'BACKTEST':
-                print('\n\nBackTest Mode - Gathering Data for ' + currency.currency_pair)
-                source = BacktestDataSource(currency, poloniex, start, offset, update_interval / 60)
-                algorithm = SimpleStrategy(source, offset)
+                snapshot_path = os.path.join(backtest_dir, currency.currency_pair + '.pickle')
+                strategy_class = strategies[strategy or backtest_strategy]
+                settings = backtest_settings(strategy_class, currency)
+                algorithm = None if fresh else load_backtest(snapshot_path, settings)
+                if algorithm is None:
+                    print('\n\nBackTest Mode - Gathering Data for ' + currency.currency_pair)
+                    source = BacktestDataSource(currency, poloniex, start, offset, update_interval / 60, store, downloader,
+                                                strategy_class.bars(update_interval / 60))
+                    algorithm = strategy_class(source, offset)
+                else:
+                    source = algorithm.data_source
+                    source.currency = currency
+                    new_candles = source.load_new(store) if poloniex is None else source.fetch_new(poloniex, store)
+                    print('\n\nBackTest Mode - Extending ' + currency.currency_pair + ' with ' + str(new_candles) + ' new candles')
 
                 #source.plot_result()
 
                 print('Updating... ' + currency.currency_pair)
-                print(template.format('Initial Balances:', '$' + "{0:.2f}".format(source.main_balance), str(source.alt_balance)))
+                print(template.format('Initial Balances:', '$' + "{0:.2f}".format(source.main_balance_init), str(source.alt_balance_init)))
+                while algorithm.update():
+                    continue
+                save_backtest(algorithm, settings, snapshot_path)
+                performance = Performance.from_source(source)
+                total_profit += performance.profit
+
+                print(template.format('Final Balances:', '$' + "{0:.2f}".format(source.main_balance), str(source.alt_balance)))
+                print(template.format('Difference:', '$' + "{0:.2f}".format(performance.main_profit), str(performance.alt_profit)))
+                print(template.format('Total Moved:', '$' + "{0:.2f}".format(performance.traded), str(performance.fills) + ' fills'))
+                print(template.format('Fees:', '$' + "{0:.2f}".format(performance.fees), ''))
+                print(template.format('Winning Trades:', str(performance.winning), 'of the filled round trips'))
+                print(template.format('Losing  Trades:', str(performance.losing), ''))
+                print(template.format('Win Rate:', '%' + "{0:.2f}".format(performance.win_rate * 100), ''))
+                print(template.format('Return:', '%' + "{0:.2f}".format(performance.total_return * 100), ''))
+                print(template.format('Sharpe / Sortino:', "{0:.2f}".format(performance.sharpe), "{0:.2f}".format(performance.sortino)))
+                print(template.format('Max Drawdown:', '%' + "{0:.2f}".format(performance.max_drawdown * 100), ''))
+                print(template.format('Exposure / Turnover:', '%' + "{0:.2f}".format(performance.exposure * 100), "{0:.2f}".format(performance.turnover)))
+                print(template.format('Profit:', '$' + "{0:.2f}".format(performance.profit), ''))
+                print(template.format('Total Profit:', '$' + "{0:.2f}".format(total_profit), ''))
+
+            if mode == 'MONTECARLO':
+                # refused before any download when the strategy has no vectorized twin
+                name = strategy or monte_carlo_strategy
+                vector = VectorBacktest(name)
+                print('\n\nMonte Carlo Mode - Gathering Data for ' + currency.currency_pair + ' (' + name + ')')
+                source = BacktestDataSource(currency, poloniex, start, offset, update_interval / 60, store, downloader)
+                # the paths run the twin, which has to trade like the real strategy on the real candles
+                algorithm = strategies[name](source, offset)
                 while algorithm.update():
                     continue
-                total_main = 0
-                total_alt = 0
-                total_fee = 0
-                total_trades = algorithm.winning_trades + algorithm.losing_trades
-                accuracy = (abs(algorithm.winning_trades - algorithm.losing_trades) / total_trades) * 100 if total_trades > 0 else 0
-                for order in algorithm.data_source.orders:
-                    assert isinstance(order, Order)
-                    total_main += abs(order.total)
-                    total_alt += abs(order.amount)
-                    total_fee += order.fee
-
-                main_profit = algorithm.data_source.main_balance - algorithm.data_source.main_balance_init
-                alt_profit = algorithm.data_source.alt_balance - algorithm.data_source.alt_balance_init
-                highest_bid = float(poloniex.returnTicker()[currency.currency_pair]['highestBid'])
-                profit = (alt_profit * highest_bid) + main_profit
-                total_profit += profit
-
-                print(template.format('Final Balances:', '$' + "{0:.2f}".format(algorithm.data_source.main_balance), str(algorithm.data_source.alt_balance)))
-                print(template.format('Difference:', '$' + "{0:.2f}".format(main_profit), str(alt_profit)))
-                print(template.format('Total Moved:', '$' + "{0:.2f}".format(total_main), str(total_alt)))
-                print(template.format('Accuracy: ' , '%' + "{0:.2f}".format(accuracy), str(total_alt)))
-                print(template.format('Fees:' , '$' + "{0:.2f}".format(total_fee), str(total_alt)))
-                print(template.format('Winning Trades:' , str(algorithm.winning_trades), str(total_alt)))
-                print(template.format('Losing  Trades:' , str(algorithm.losing_trades), str(total_alt)))
-                print(template.format('Profit:' , '$' + "{0:.2f}".format(profit), str(total_alt)))
-                print(template.format('Total Profit:', '$' + "{0:.2f}".format(profit), str(total_profit)))
+                vector.check(source)
+
+                monte_carlo = MonteCarlo(source.backtest_data, currency, source.main_balance_init, source.alt_balance_init,
+                                         name, update_interval)
+                summary = monte_carlo.run(monte_carlo_paths).summary()
+
+                print(template.format('Paths:', str(summary['paths']), ''))
+                print(template.format('Profitable:', '%' + "{0:.2f}".format(summary['profitable'] * 100), ''))
+                for percentile in sorted(summary['profit']):
+                    print(template.format('P' + str(percentile) + ' Profit:', '$' + "{0:.2f}".format(summary['profit'][percentile]),
+                                          'drawdown %' + "{0:.2f}".format(summary['max_drawdown'][percentile] * 100)))
 
     except KeyboardInterrupt:
         quit()
 
 
+# re-run a recorded live session through LiveDataSource and SimpleStrategy and check that it decides the same
+def replay(path, output):
+    load_config()
+    template = "{0:20}{1:>15}\t\t\t{2:33}"
+    exchange = ReplayExchange.from_file(path)
+    currencies = dict((currency.currency_pair, currency) for currency in trade_currencies)
+
+    start = datetime.utcnow() - timedelta(days=31)
+    account = ReplayAccount(exchange) if exchange.account_wide() else None
+    # fetches the ticker wherever the session did, so it also replays sessions without prefetching
+    prefetcher = ReplayPrefetcher(exchange, update_interval, prefetch_lead, prefetch_settle, account)
+    algorithms = {}
+    for pair in exchange.pairs():
+        if pair in currencies:
+            source = LiveDataSource(currencies[pair], exchange, start, offset, update_interval / 60, account)
+            prefetcher.add(source)
+            algorithms[pair] = SimpleStrategy(source, offset)
+
+    if os.path.exists(output):
+        os.remove(output)
+    journal.open(output, 'never')
+    journal.clock = lambda: exchange.clock
+    result = Replay(exchange, algorithms, prefetcher).run()
+    journal.close()
+
+    print(template.format('Responses:', str(exchange.position) + '/' + str(len(exchange.responses)), ''))
+    print(template.format('Cycles:', str(result.cycles), str(result.errors) + ' failed'))
+    print(template.format('Elapsed:', "{0:.2f}".format(result.elapsed) + 's', ''))
+    if not path.endswith('.jsonl'):
+        different, extra = compare_decisions(path, output)
+        print(template.format('Decisions:', 'identical' if not different and not extra else
+                              str(len(different)) + ' differ', '' if not extra else "{0:+d}".format(extra) + ' replayed'))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='JungleTrade trading bot')
+    parser.add_argument('--mode', choices=['BACKTEST', 'LIVE', 'MONTECARLO', 'REPLAY'], default='BACKTEST')
+    parser.add_argument('--strategy', choices=sorted(strategies),
+                        help='strategy of BACKTEST and MONTECARLO mode (default: ' + backtest_strategy + ' and ' + monte_carlo_strategy + ')')
+    parser.add_argument('--fresh', action='store_true', help='start BACKTEST mode over instead of extending the saved backtests')
+    parser.add_argument('--profile', nargs='?', const='deterministic', choices=BacktestProfiler.modes,
+                        help='profile a backtest run (default: deterministic)')
+    parser.add_argument('--profile-dir', default='profile', help='where the profile reports are written')
+    parser.add_argument('--replay', help='journal or .jsonl response capture to replay in REPLAY mode')
+    parser.add_argument('--replay-output', help='journal of the replayed session (default: <replay>.replay)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.mode == 'REPLAY':
+        if not args.replay:
+            raise SystemExit('REPLAY mode needs --replay')
+        replay(args.replay, args.replay_output or args.replay + '.replay')
+    elif args.profile and args.mode != 'LIVE':
+        with BacktestProfiler(args.profile, args.profile_dir):
+            run(args.mode, args.strategy, args.fresh)
+    else:
+        run(args.mode, args.strategy, args.fresh)
+
+
 if __name__ == '__main__':
     main()